@@ -1,6 +1,102 @@
 from django.apps import AppConfig
+from django.core import checks
+from django.db.backends.signals import connection_created
+from django.db.models.signals import m2m_changed, post_delete, post_save
 
 
 class ApiConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "api"
+
+    def ready(self):
+        from recipes.models import (Ingredient, IngredientAmount, Profile,
+                                    ProfileFavorite, Recipe, RecipeTag, Tag)
+        from recipes.signals import ingredients_loaded
+
+        from .checks import check_shared_cache
+        from .cookable_index import cookable_index
+        from .filters import invalidate_tag_slugs
+        from .ingredient_index import ingredient_index
+        from .paginators import profile_counts, recipe_counts
+        from .querystats import install_query_counter
+        from .recipe_sets import favorite_ids, shopping_cart_ids
+        from .response_cache import recipe_response_cache
+        from .search import remove_from_search_index, update_search_index
+        from .views import ingredient_catalog, tag_catalog
+
+        for sender, handler, uid in (
+            (Ingredient, ingredient_index.invalidate, "ingredient_index"),
+            (Ingredient, ingredient_catalog.invalidate, "ingredient_catalog"),
+            (Tag, tag_catalog.invalidate, "tag_catalog"),
+            (Tag, invalidate_tag_slugs, "tag_slugs"),
+            (Tag, recipe_response_cache.invalidate, "tag_response_cache"),
+            (
+                Ingredient, recipe_response_cache.invalidate,
+                "ingredient_response_cache",
+            ),
+            (
+                Recipe, recipe_response_cache.recipe_changed,
+                "recipe_response_cache",
+            ),
+            (
+                RecipeTag, recipe_response_cache.recipe_tag_changed,
+                "recipe_tag_response_cache",
+            ),
+            (
+                IngredientAmount,
+                recipe_response_cache.ingredient_amount_changed,
+                "ingredient_amount_response_cache",
+            ),
+            (ProfileFavorite, favorite_ids.row_changed, "favorite_ids"),
+            (Recipe, recipe_counts.invalidate, "recipe_counts"),
+            (RecipeTag, recipe_counts.invalidate, "recipe_tag_counts"),
+            (Profile, profile_counts.invalidate, "profile_counts"),
+            (Recipe, cookable_index.recipe_changed, "recipe_cookable_index"),
+            (
+                IngredientAmount, cookable_index.ingredient_amount_changed,
+                "ingredient_amount_cookable_index",
+            ),
+        ):
+            post_save.connect(
+                handler, sender=sender, dispatch_uid=f"{uid}_save"
+            )
+            post_delete.connect(
+                handler, sender=sender, dispatch_uid=f"{uid}_delete"
+            )
+        post_save.connect(
+            update_search_index, sender=Recipe,
+            dispatch_uid="recipe_search_index_save",
+        )
+        post_delete.connect(
+            remove_from_search_index, sender=Recipe,
+            dispatch_uid="recipe_search_index_delete",
+        )
+        post_save.connect(
+            recipe_response_cache.author_changed, sender=Profile,
+            dispatch_uid="author_response_cache_save",
+        )
+        m2m_changed.connect(
+            recipe_response_cache.invalidate, sender=Recipe.tags.through,
+            dispatch_uid="recipe_tags_response_cache",
+        )
+        m2m_changed.connect(
+            favorite_ids.relation_changed, sender=ProfileFavorite,
+            dispatch_uid="favorite_ids_relation",
+        )
+        m2m_changed.connect(
+            shopping_cart_ids.relation_changed,
+            sender=Profile.shopping_cart.through,
+            dispatch_uid="shopping_cart_ids_relation",
+        )
+        ingredients_loaded.connect(
+            ingredient_index.invalidate,
+            dispatch_uid="ingredient_index_loaded",
+        )
+        ingredients_loaded.connect(
+            ingredient_catalog.invalidate,
+            dispatch_uid="ingredient_catalog_loaded",
+        )
+        connection_created.connect(
+            install_query_counter, dispatch_uid="query_counter"
+        )
+        checks.register(check_shared_cache)
@@ -0,0 +1,120 @@
+import gzip
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+
+from .db_routing import use_primary
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+class CatalogResponseCache:
+    """Готовые к отдаче ответы справочников (теги, ингредиенты).
+
+    Для текущей версии справочника JSON рендерится один раз и сразу
+    сжимается gzip и, если установлен пакет brotli, brotli. Версия
+    хранится в кеше и меняется при сохранении или удалении записи,
+    поэтому при общем кеше (Memcached) сбрасывается во всех процессах
+    сразу. Версия и ответы живут CATALOG_CACHE_TIMEOUT секунд: с кешем
+    в памяти процесса изменения из других процессов (load_ingredients,
+    соседние воркеры) видны не позже этого срока.
+    """
+
+    def __init__(self, name, get_data):
+        self.name = name
+        self.get_data = get_data
+
+    @property
+    def version_key(self):
+        return f"catalog:{self.name}:version"
+
+    def invalidate(self, **kwargs):
+        # После коммита: иначе параллельный запрос успеет закешировать
+        # справочник без изменений под новой версией.
+        transaction.on_commit(
+            lambda: cache.set(
+                self.version_key, uuid.uuid4().hex,
+                settings.CATALOG_CACHE_TIMEOUT,
+            )
+        )
+
+    def get_version(self):
+        version = cache.get(self.version_key)
+        if version is None:
+            version = uuid.uuid4().hex
+            if not cache.add(
+                self.version_key, version, settings.CATALOG_CACHE_TIMEOUT
+            ):
+                version = cache.get(self.version_key)
+        return version
+
+    def render(self):
+        body = JSONRenderer().render(self.get_data())
+        blobs = {
+            # Слабый: один тег на все кодировки, тела которых различаются.
+            "etag": 'W/"{0}"'.format(hashlib.sha256(body).hexdigest()[:32]),
+            "identity": body,
+            "gzip": gzip.compress(body, compresslevel=9),
+        }
+        if brotli is not None:
+            blobs["br"] = brotli.compress(body)
+        return blobs
+
+    def get_key(self):
+        return f"catalog:{self.name}:{self.get_version()}"
+
+    def get_blobs(self):
+        key = self.get_key()
+        blobs = cache.get(key)
+        if blobs is None:
+            with use_primary():
+                blobs = self.render()
+            cache.set(key, blobs, settings.CATALOG_CACHE_TIMEOUT)
+        return blobs
+
+    @staticmethod
+    def choose_encoding(request, blobs):
+        accepted = {
+            encoding.split(";")[0].strip()
+            for encoding in request.META.get(
+                "HTTP_ACCEPT_ENCODING", ""
+            ).split(",")
+        }
+        for encoding in ("br", "gzip"):
+            if encoding in accepted and encoding in blobs:
+                return encoding
+        return "identity"
+
+    def response(self, request):
+        blobs = self.get_blobs()
+        etag = blobs["etag"]
+        # If-None-Match сравнивает теги без учёта слабости (RFC 7232).
+        if_none_match = {
+            tag.strip().removeprefix("W/")
+            for tag in request.META.get("HTTP_IF_NONE_MATCH", "").split(",")
+        }
+        if (
+            etag.removeprefix("W/") in if_none_match
+            or "*" in if_none_match
+        ):
+            response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            encoding = self.choose_encoding(request, blobs)
+            response = HttpResponse(
+                blobs[encoding], content_type="application/json"
+            )
+            if encoding != "identity":
+                response["Content-Encoding"] = encoding
+        response["ETag"] = etag
+        patch_vary_headers(response, ("Accept-Encoding",))
+        return response
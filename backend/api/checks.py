@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.core.checks import Warning
+
+PROCESS_LOCAL_CACHES = ("django.core.cache.backends.locmem.LocMemCache",)
+
+
+def check_shared_cache(app_configs, **kwargs):
+    """Кеш должен быть общим для процессов, кроме режима разработки.
+
+    Через него процессы узнают об изменениях, сделанных в других
+    процессах: версии справочников и ответов, журнал индекса рецептов.
+    """
+    backend = settings.CACHES["default"]["BACKEND"]
+    if settings.DEBUG or backend not in PROCESS_LOCAL_CACHES:
+        return []
+    return [
+        Warning(
+            "Кеш по умолчанию хранится в памяти процесса: изменения из "
+            "других воркеров и команд manage.py доходят только по "
+            "истечении таймаутов.",
+            hint=(
+                "Задайте общий кеш в CACHE_BACKEND и CACHE_LOCATION, "
+                "например Memcached (PyMemcacheCache)."
+            ),
+            id="api.W001",
+        )
+    ]
@@ -8,3 +8,24 @@ MAX_HEX_COLOR_LENGTH = 7
 MIN_COOKING_TIME = 1
 MIN_AMOUNT = 1
 USERNAME_REGEX = r"^[\w.@+-]+$"
+STREAM_CHUNK_SIZE = 8192
+ITERATOR_CHUNK_SIZE = 2000
+PDF_FONT_SIZE = 12
+PDF_LINE_HEIGHT = 18
+PDF_MARGIN = 50
+CARD_IMAGE_SIZE = (600, 400)
+DETAIL_IMAGE_SIZE = (1200, 800)
+IMAGE_QUALITY = 82
+IMAGE_WORKER_INTERVAL = 5
+IMAGE_WORKER_BATCH_SIZE = 20
+FEED_BACKFILL_LIMIT = 100
+COOKABLE_INDEX_MAX_PENDING = 1000
+COOKABLE_INDEX_CHANGE_TIMEOUT = 24 * 60 * 60
+COOKABLE_INDEX_CHANGE_LAG = 10
+COOKABLE_INDEX_PRUNE_INTERVAL = 10 * 60
+MAX_TAG_MASK_ID = 62
+TAG_SLUGS_RELOAD_INTERVAL = 10
+RECIPE_IDS_IN_LIMIT = 1000
+BENCHMARK_USERNAME_PREFIX = "bench_"
+BENCHMARK_PASSWORD = "benchmark-password"
+LOAD_TEST_USERNAME_PREFIX = "load-"
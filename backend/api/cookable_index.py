@@ -0,0 +1,281 @@
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections, transaction
+from django.db.models import Max
+from django.utils import timezone
+from recipes.models import IngredientAmount, RecipeChange
+
+from .constants import (COOKABLE_INDEX_CHANGE_LAG,
+                        COOKABLE_INDEX_CHANGE_TIMEOUT,
+                        COOKABLE_INDEX_MAX_PENDING,
+                        COOKABLE_INDEX_PRUNE_INTERVAL)
+from .db_routing import use_primary
+
+logger = logging.getLogger(__name__)
+
+
+def bit_positions(mask):
+    """Номера установленных битов mask по возрастанию."""
+    bits = format(mask, "b")[::-1]
+    position = bits.find("1")
+    while position != -1:
+        yield position
+        position = bits.find("1", position + 1)
+
+
+class RecipeBitsets:
+    """Битовые множества рецептов по ингредиентам на момент sequence."""
+
+    def __init__(self, sequence):
+        self.sequence = sequence
+        self.synced_at = self.pruned_at = time.monotonic()
+        self.positions = {}
+        self.recipe_ids = []
+        self.ingredients = {}
+        self.postings = {}
+
+    def set_recipe(self, recipe_id, ingredient_ids):
+        position = self.positions.get(recipe_id)
+        if position is None:
+            if not ingredient_ids:
+                return
+            position = len(self.recipe_ids)
+            self.positions[recipe_id] = position
+            self.recipe_ids.append(recipe_id)
+
+        bit = 1 << position
+        for ingredient_id in self.ingredients.pop(recipe_id, ()):
+            self.postings[ingredient_id] &= ~bit
+        if ingredient_ids:
+            self.ingredients[recipe_id] = frozenset(ingredient_ids)
+            for ingredient_id in ingredient_ids:
+                self.postings[ingredient_id] = (
+                    self.postings.get(ingredient_id, 0) | bit
+                )
+
+    def load(self, recipe_ids=None):
+        amounts = IngredientAmount.objects.all()
+        if recipe_ids is not None:
+            amounts = amounts.filter(recipe_id__in=recipe_ids)
+        ingredients = {recipe_id: [] for recipe_id in recipe_ids or ()}
+        for recipe_id, ingredient_id in amounts.values_list(
+            "recipe_id", "ingredient_id"
+        ).order_by("recipe_id").iterator():
+            ingredients.setdefault(recipe_id, []).append(ingredient_id)
+        for recipe_id, ingredient_ids in ingredients.items():
+            self.set_recipe(recipe_id, ingredient_ids)
+
+
+class ChangeBatch:
+    """Изменённые рецепты транзакции, записываемые одним INSERT."""
+
+    def __init__(self, connection):
+        # Список on_commit-функций соединения Django заменяет новым
+        # после коммита или отката, и пакет устаревает. Пакет внешнего
+        # savepoint не пополняется из вложенного: откат savepoint
+        # не должен уносить изменения, записанные до него.
+        self.hooks = connection.run_on_commit
+        self.savepoint_ids = list(connection.savepoint_ids)
+        self.recipe_ids = {}
+
+    def is_open(self, connection):
+        return (
+            self.hooks is connection.run_on_commit
+            and self.savepoint_ids == connection.savepoint_ids
+        )
+
+    def __call__(self):
+        self.hooks = None
+        RecipeChange.objects.bulk_create(
+            RecipeChange(recipe_id=recipe_id) for recipe_id in self.recipe_ids
+        )
+
+
+class CookableIndex:
+    """Обратный индекс «ингредиент → рецепты» в памяти процесса.
+
+    Рецепты пронумерованы, для каждого ингредиента хранится битовое
+    множество номеров рецептов (int). Число имеющихся ингредиентов
+    каждого рецепта считается побитовым сложением этих множеств,
+    без обхода IngredientAmount.
+
+    Изменённые рецепты записываются в журнал RecipeChange; перед
+    поиском процесс дочитывает журнал и перечитывает из базы только
+    эти рецепты. Целиком индекс строится в фоновом потоке: при старте
+    процесса (warm) и когда журнала не хватает, — а поиск тем временем
+    отвечает по прежнему индексу.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._bitsets = None
+        self._local = threading.local()
+
+    def record_change(self, recipe_id):
+        """Записывает изменение рецепта в журнал после коммита.
+
+        Повторы в одной транзакции пишутся один раз: удаление рецепта
+        иначе добавило бы запись на каждый его ингредиент.
+        """
+        connection = connections[DEFAULT_DB_ALIAS]
+        if not connection.in_atomic_block:
+            RecipeChange.objects.create(recipe_id=recipe_id)
+            return
+        batch = getattr(self._local, "batch", None)
+        if batch is None or not batch.is_open(connection):
+            batch = self._local.batch = ChangeBatch(connection)
+            transaction.on_commit(batch)
+        batch.recipe_ids[recipe_id] = None
+
+    def invalidate(self):
+        """Перестроить индекс во всех процессах (после массовой загрузки)."""
+        self.record_change(None)
+
+    def recipe_changed(self, instance, **kwargs):
+        self.record_change(instance.pk)
+
+    def ingredient_amount_changed(self, instance, **kwargs):
+        self.record_change(instance.recipe_id)
+
+    def build(self):
+        """Строит индекс заново и удаляет устаревшие записи журнала."""
+        with use_primary():
+            sequence = RecipeChange.objects.aggregate(
+                sequence=Max("id")
+            )["sequence"] or 0
+            bitsets = RecipeBitsets(sequence)
+            bitsets.load()
+        with self._lock:
+            if self._bitsets is None or self._bitsets.sequence <= sequence:
+                self._bitsets = bitsets
+        self.prune(bitsets)
+
+    @staticmethod
+    def prune(bitsets):
+        """Удаляет применённые записи журнала старше его срока.
+
+        Индексы других процессов, отставшие на этот срок, всё равно
+        строятся заново, поэтому эти записи не нужны никому.
+        """
+        RecipeChange.objects.filter(
+            id__lte=bitsets.sequence,
+            created__lt=timezone.now() - timedelta(
+                seconds=COOKABLE_INDEX_CHANGE_TIMEOUT
+            ),
+        ).delete()
+        bitsets.pruned_at = time.monotonic()
+
+    def _build_in_background(self):
+        if not self._build_lock.acquire(blocking=False):
+            return
+        try:
+            self.build()
+        except DatabaseError:
+            logger.exception("Не удалось построить индекс рецептов.")
+        finally:
+            self._build_lock.release()
+            connections.close_all()
+
+    def warm(self):
+        """Запускает построение индекса в фоновом потоке."""
+        threading.Thread(
+            target=self._build_in_background, name="cookable-index",
+            daemon=True,
+        ).start()
+
+    def _sync(self, bitsets):
+        """Дочитывает журнал; False — индекс нужно строить заново.
+
+        Записи журнала, удалённые по COOKABLE_INDEX_CHANGE_TIMEOUT,
+        индекс, не обновлявшийся столько же, не дочитает.
+        """
+        if (
+            time.monotonic() - bitsets.synced_at
+            > COOKABLE_INDEX_CHANGE_TIMEOUT
+        ):
+            return False
+        changes = list(
+            RecipeChange.objects.filter(
+                id__gt=bitsets.sequence
+            ).order_by("id").values_list(
+                "id", "recipe_id", "created"
+            )[:COOKABLE_INDEX_MAX_PENDING + 1]
+        )
+        if len(changes) > COOKABLE_INDEX_MAX_PENDING or any(
+            recipe_id is None for _, recipe_id, _ in changes
+        ):
+            return False
+        bitsets.load({recipe_id for _, recipe_id, _ in changes})
+        bitsets.synced_at = time.monotonic()
+        # Пропущенный номер может принадлежать записи, которая ещё не
+        # видна: записи после него перечитываются, пока пропуску нет
+        # COOKABLE_INDEX_CHANGE_LAG секунд.
+        settled = timezone.now() - timedelta(
+            seconds=COOKABLE_INDEX_CHANGE_LAG
+        )
+        for change_id, _, created in changes:
+            if change_id != bitsets.sequence + 1 and created > settled:
+                break
+            bitsets.sequence = change_id
+        if (
+            time.monotonic() - bitsets.pruned_at
+            > COOKABLE_INDEX_PRUNE_INTERVAL
+        ):
+            self.prune(bitsets)
+        return True
+
+    def search(self, ingredient_ids):
+        """Рецепты, где есть хотя бы один из ingredient_ids.
+
+        Возвращает список (recipe_id, имеющихся, всего ингредиентов),
+        упорядоченный по доле имеющихся, затем по числу недостающих.
+        """
+        if self._bitsets is None:
+            # Индекс ещё строится после старта процесса: ждём его.
+            with self._build_lock:
+                if self._bitsets is None:
+                    self.build()
+        with self._lock:
+            bitsets = self._bitsets
+            with use_primary():
+                synced = self._sync(bitsets)
+            planes = []
+            candidates = 0
+            for ingredient_id in set(ingredient_ids):
+                carry = bitsets.postings.get(ingredient_id, 0)
+                candidates |= carry
+                for number, plane in enumerate(planes):
+                    if not carry:
+                        break
+                    planes[number], carry = plane ^ carry, plane & carry
+                if carry:
+                    planes.append(carry)
+
+            plane_bits = [format(plane, "b")[::-1] for plane in planes]
+            matches = []
+            for position in bit_positions(candidates):
+                available = sum(
+                    1 << number
+                    for number, bits in enumerate(plane_bits)
+                    if position < len(bits) and bits[position] == "1"
+                )
+                recipe_id = bitsets.recipe_ids[position]
+                matches.append(
+                    (recipe_id, available, len(bitsets.ingredients[recipe_id]))
+                )
+        if not synced:
+            self.warm()
+
+        matches.sort(
+            key=lambda match: (
+                -match[1] / match[2], match[2] - match[1], -match[0]
+            )
+        )
+        return matches
+
+
+cookable_index = CookableIndex()
@@ -0,0 +1,100 @@
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections
+
+# Алиас базы для чтений текущего запроса; None — основная база.
+read_database = ContextVar("read_database", default=None)
+PIN_COOKIE = "primary_pin"
+# Недоступные реплики: алиас -> time.monotonic(), до которого
+# реплика не выбирается.
+unavailable_until = {}
+
+
+def pin_to_primary(response, user_id):
+    """Чтения пользователя идут в основную базу REPLICA_PIN_SECONDS.
+
+    Так после своей записи он видит её, даже если реплика отстаёт.
+    Метка — подписанная cookie: её получает любой процесс, куда
+    придёт следующий запрос, а срок проверяется по подписи.
+    """
+    response.set_signed_cookie(
+        PIN_COOKIE, user_id, salt=PIN_COOKIE,
+        max_age=settings.REPLICA_PIN_SECONDS, httponly=True, samesite="Lax",
+    )
+
+
+def is_pinned(request, user_id):
+    return user_id is not None and request.get_signed_cookie(
+        PIN_COOKIE, None, salt=PIN_COOKIE,
+        max_age=settings.REPLICA_PIN_SECONDS,
+    ) == str(user_id)
+
+
+def mark_unavailable(alias):
+    unavailable_until[alias] = (
+        time.monotonic() + settings.REPLICA_RETRY_SECONDS
+    )
+
+
+def choose_replica():
+    """Случайная доступная реплика или None, если таких нет."""
+    now = time.monotonic()
+    replicas = [
+        alias for alias in settings.DATABASE_REPLICAS
+        if unavailable_until.get(alias, 0) <= now
+    ]
+    random.shuffle(replicas)
+    for alias in replicas:
+        try:
+            connections[alias].ensure_connection()
+        except OperationalError:
+            mark_unavailable(alias)
+        else:
+            return alias
+    return None
+
+
+@contextmanager
+def use_database(alias):
+    token = read_database.set(alias)
+    try:
+        yield
+    finally:
+        read_database.reset(token)
+
+
+def use_primary():
+    """Чтения внутри блока идут в основную базу.
+
+    Так заполняются общие кеши и индексы: данные отстающей реплики
+    остались бы в них и после того, как она догонит основную базу.
+    """
+    return use_database(None)
+
+
+class ReplicaRouter:
+    """Чтения — в базу из read_database, запись — в основную."""
+
+    def db_for_read(self, model, **hints):
+        alias = read_database.get()
+        # Чтения внутри транзакции должны видеть её изменения.
+        if alias is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        # Без явного ответа Django записал бы объект, прочитанный
+        # с реплики, обратно в неё.
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
@@ -0,0 +1,176 @@
+from collections import defaultdict
+
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.functional import cached_property
+from recipes.models import IngredientAmount, Recipe, Tag
+from rest_framework import serializers
+
+from .serializers import IngredientAmountReadSerializer, RecipeReadSerializer
+
+SIMPLE_FIELDS = (
+    serializers.BooleanField,
+    serializers.CharField,
+    serializers.IntegerField,
+    serializers.ReadOnlyField,
+)
+IMAGE_VARIANTS = (
+    ("card", "image_card"),
+    ("detail", "image_detail"),
+    ("webp", "image_webp"),
+)
+
+
+def column_getter(column):
+    return lambda row, context: row[column]
+
+
+def compile_fields(serializer, prefix="", special=None):
+    """План полей serializer: [(имя, функция(row, context))] и колонки.
+
+    Простые поля читаются из строки values() по колонке prefix +
+    source, поля из special — своими функциями. Поле другого типа —
+    ошибка: иначе ответ молча разошёлся бы с сериализатором.
+    """
+    special = special or {}
+    plan = []
+    columns = []
+    for field in serializer._readable_fields:
+        name = field.field_name
+        if name in special:
+            plan.append((name, special[name]))
+        elif isinstance(field, SIMPLE_FIELDS) and field.source != "*":
+            column = prefix + "__".join(field.source_attrs)
+            columns.append(column)
+            plan.append((name, column_getter(column)))
+        else:
+            raise ImproperlyConfigured(
+                "Быстрый сериализатор рецептов не умеет поле "
+                f"{type(serializer).__name__}.{name}."
+            )
+    return plan, columns
+
+
+def build(plan, row, context):
+    return {name: get(row, context) for name, get in plan}
+
+
+class FastRecipeListSerializer:
+    """Список рецептов из строк values() без дерева полей DRF.
+
+    План полей один раз строится по RecipeReadSerializer, поэтому
+    JSON совпадает с ним байт в байт. Теги и ингредиенты страницы
+    читаются двумя запросами — теми же, что делает prefetch. Контекст
+    — как у RecipeViewSet: request, following_ids, favorite_ids
+    и shopping_cart_ids.
+    """
+
+    @cached_property
+    def plan(self):
+        serializer = RecipeReadSerializer(context={})
+        fields = serializer.fields
+
+        tag_plan, tag_columns = compile_fields(fields["tags"].child)
+        ingredient_plan, ingredient_columns = compile_fields(
+            IngredientAmountReadSerializer()
+        )
+        author_plan, author_columns = compile_fields(
+            fields["author"], "author__",
+            {
+                "is_subscribed": lambda row, context: (
+                    row["author__id"] in context["following_ids"]
+                ),
+            },
+        )
+        recipe_plan, recipe_columns = compile_fields(
+            serializer,
+            special={
+                "tags": lambda row, context: context["tags"][row["id"]],
+                "author": lambda row, context: build(
+                    author_plan, row, context
+                ),
+                "ingredients": lambda row, context: (
+                    context["ingredients"][row["id"]]
+                ),
+                "is_favorited": lambda row, context: (
+                    row["id"] in context["favorite_ids"]
+                ),
+                "is_in_shopping_cart": lambda row, context: (
+                    row["id"] in context["shopping_cart_ids"]
+                ),
+                "image": self.get_image,
+                "image_variants": self.get_image_variants,
+            },
+        )
+        return {
+            "recipe": recipe_plan,
+            # pub_date и id нужны курсорной пагинации.
+            "columns": list(dict.fromkeys((
+                "id", "pub_date", "image", "image_variants_source",
+                *(column for _, column in IMAGE_VARIANTS),
+                *recipe_columns, "author__id", *author_columns,
+            ))),
+            "tag": tag_plan,
+            "tag_columns": tag_columns,
+            "ingredient": ingredient_plan,
+            "ingredient_columns": ingredient_columns,
+        }
+
+    @cached_property
+    def storages(self):
+        return {
+            column: Recipe._meta.get_field(column).storage
+            for column in ("image", *(column for _, column in IMAGE_VARIANTS))
+        }
+
+    def get_url(self, column, name, context):
+        url = self.storages[column].url(name)
+        request = context.get("request")
+        return request.build_absolute_uri(url) if request else url
+
+    def get_image(self, row, context):
+        if not row["image"]:
+            return None
+        return self.get_url("image", row["image"], context)
+
+    def get_image_variants(self, row, context):
+        if not (row["image"] and row["image_variants_source"] == row["image"]):
+            return None
+        variants = {}
+        for name, column in IMAGE_VARIANTS:
+            if not row[column]:
+                return None
+            variants[name] = self.get_url(column, row[column], context)
+        return variants
+
+    def get_queryset(self, queryset):
+        """Строки рецептов для пагинации вместо экземпляров модели."""
+        return queryset.prefetch_related(None).values(*self.plan["columns"])
+
+    def load_related(self, recipe_ids):
+        """Теги и ингредиенты рецептов, собранные по плану."""
+        plan = self.plan
+        tags = defaultdict(list)
+        ingredients = defaultdict(list)
+        if not recipe_ids:
+            return {"tags": tags, "ingredients": ingredients}
+        for row in Tag.objects.filter(recipe__in=recipe_ids).values(
+            "recipe__id", *plan["tag_columns"]
+        ):
+            tags[row["recipe__id"]].append(build(plan["tag"], row, None))
+        for row in IngredientAmount.objects.filter(
+            recipe__in=recipe_ids
+        ).values("recipe_id", *plan["ingredient_columns"]):
+            ingredients[row["recipe_id"]].append(
+                build(plan["ingredient"], row, None)
+            )
+        return {"tags": tags, "ingredients": ingredients}
+
+    def serialize(self, rows, context, related=None):
+        if related is None:
+            related = self.load_related([row["id"] for row in rows])
+        context = {**context, **related}
+        recipe_plan = self.plan["recipe"]
+        return [build(recipe_plan, row, context) for row in rows]
+
+
+fast_recipe_list_serializer = FastRecipeListSerializer()
@@ -1,50 +1,130 @@
+from collections import defaultdict
+
 import django_filters
-from django.db.models import Q
-from django.db.models.query import EmptyQuerySet
-from recipes.models import Recipe, Tag
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Exists, F, OuterRef, Q
+from recipes.models import Recipe, RecipeTag, Tag, tag_mask
 from rest_framework import filters
 
+from .constants import (MAX_TAG_MASK_ID, RECIPE_IDS_IN_LIMIT,
+                        TAG_SLUGS_RELOAD_INTERVAL)
+from .recipe_sets import favorite_ids, shopping_cart_ids
+from .search import search_recipes
+
+TAG_SLUGS_KEY = "tags:slug_ids"
+TAG_SLUGS_RELOAD_KEY = "tags:slug_ids:reloaded"
+
+
+def load_tag_ids_by_slug():
+    tag_ids = defaultdict(list)
+    for slug, tag_id in Tag.objects.values_list("slug", "id"):
+        tag_ids[slug].append(tag_id)
+    return dict(tag_ids)
+
+
+def get_tag_ids_by_slug(slugs=()):
+    """Словарь {slug: [id тегов]} из кеша на CATALOG_CACHE_TIMEOUT.
+
+    Если в нём нет какого-то из slugs — например, тег создан в другом
+    процессе, — словарь перечитывается из базы, но не чаще раза в
+    TAG_SLUGS_RELOAD_INTERVAL: запросы с несуществующими slug иначе
+    читали бы таблицу тегов каждый раз.
+    """
+    tag_ids = cache.get(TAG_SLUGS_KEY)
+    if tag_ids is None or (
+        not tag_ids.keys() >= set(slugs)
+        and cache.add(TAG_SLUGS_RELOAD_KEY, True, TAG_SLUGS_RELOAD_INTERVAL)
+    ):
+        tag_ids = load_tag_ids_by_slug()
+        cache.set(TAG_SLUGS_KEY, tag_ids, settings.CATALOG_CACHE_TIMEOUT)
+    return tag_ids
+
+
+def invalidate_tag_slugs(**kwargs):
+    cache.delete(TAG_SLUGS_KEY)
+
+
+class TagSlugField(django_filters.fields.MultipleChoiceField):
+
+    def valid_value(self, value):
+        # Без choices: их пришлось бы читать при каждой сборке формы,
+        # даже если фильтр по тегам не передан.
+        return value in get_tag_ids_by_slug([value])
 
-def get_tag_choices():
-    choices = [
-        (tag, tag) for tag in Tag.objects.values_list(
-            "slug", flat=True
-        ).distinct()
-    ]
-    return choices
+
+class TagSlugFilter(django_filters.MultipleChoiceFilter):
+    field_class = TagSlugField
 
 
 class RecipeFilterSet(django_filters.FilterSet):
 
-    tags = django_filters.ModelMultipleChoiceFilter(
-        queryset=Tag.objects.all(),
-        field_name="tags__slug",
-        to_field_name="slug"
-    )
+    tags = TagSlugFilter(method="get_tags")
     is_favorited = django_filters.NumberFilter(
         field_name="is_favorited", method="get_is_favorited"
     )
     is_in_shopping_cart = django_filters.NumberFilter(
         field_name="is_in_shopping_cart", method="get_is_in_shopping_cart"
     )
+    search = django_filters.CharFilter(method="get_search")
 
-    def get_is_favorited(self, queryset, name, value):
-        user_id = self.request.user.id
-        if not user_id:
-            return EmptyQuerySet()
-        if value:
-            return queryset.filter(is_favorited=user_id)
+    def get_tags(self, queryset, name, value):
+        """Рецепты с любым из тегов по маске Recipe.tag_mask, без JOIN.
 
-        return queryset.filter(~Q(is_favorited=user_id))
+        Теги, не попавшие в маску, проверяются подзапросом EXISTS.
+        """
+        tag_ids_by_slug = get_tag_ids_by_slug(value)
+        tag_ids = {
+            tag_id
+            for slug in value
+            for tag_id in tag_ids_by_slug.get(slug, ())
+        }
+        overflow = [
+            tag_id for tag_id in tag_ids if tag_id > MAX_TAG_MASK_ID
+        ]
+
+        condition = Q()
+        mask = tag_mask(tag_ids)
+        if mask:
+            queryset = queryset.alias(tag_match=F("tag_mask").bitand(mask))
+            condition |= Q(tag_match__gt=0)
+        if overflow:
+            queryset = queryset.alias(
+                has_overflow_tag=Exists(
+                    RecipeTag.objects.filter(
+                        recipe=OuterRef("pk"), tag_id__in=overflow
+                    )
+                )
+            )
+            condition |= Q(has_overflow_tag=True)
+        return queryset.filter(condition)
+
+    def get_is_favorited(self, queryset, name, value):
+        return self.filter_by_ids(queryset, favorite_ids, value)
 
     def get_is_in_shopping_cart(self, queryset, name, value):
+        return self.filter_by_ids(queryset, shopping_cart_ids, value)
+
+    def get_search(self, queryset, name, value):
+        return search_recipes(queryset, value)
+
+    def filter_by_ids(self, queryset, user_recipe_ids, value):
+        """Фильтр по кешированному множеству id вместо JOIN по связи.
+
+        Для больших множеств вместо длинного IN используется
+        EXISTS / NOT EXISTS по таблице связи.
+        """
         user_id = self.request.user.id
         if not user_id:
-            return EmptyQuerySet()
+            return queryset.none()
+        recipe_ids = user_recipe_ids.get(user_id)
+        if len(recipe_ids) > RECIPE_IDS_IN_LIMIT:
+            exists = user_recipe_ids.exists(user_id)
+            return queryset.filter(exists if value else ~exists)
         if value:
-            return queryset.filter(is_in_shopping_cart=user_id)
+            return queryset.filter(pk__in=recipe_ids)
 
-        return queryset.filter(~Q(is_in_shopping_cart=user_id))
+        return queryset.exclude(pk__in=recipe_ids)
 
     class Meta:
         model = Recipe
@@ -53,7 +133,8 @@ class RecipeFilterSet(django_filters.FilterSet):
             "is_in_shopping_cart",
             "author",
             "tags",
-            "name"
+            "name",
+            "search",
         )
 
 
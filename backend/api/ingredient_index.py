@@ -0,0 +1,107 @@
+import threading
+import time
+import uuid
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from recipes.models import Ingredient
+
+from .db_routing import use_primary
+
+VERSION_KEY = "ingredients:index:version"
+
+
+def fold(value):
+    """Приводит строку к виду для поиска: без регистра, «ё» как «е»."""
+    return value.casefold().replace("ё", "е")
+
+
+class IngredientIndex:
+    """Префиксный индекс ингредиентов в памяти процесса.
+
+    Хранит отсортированный по свёрнутому названию список и ищет
+    префикс бинарным поиском. Изменение Ingredient после фиксации
+    меняет версию индекса в общем кеше, и каждый процесс перестраивает
+    свою копию при следующем поиске. Без общего кеша изменения из
+    других процессов подхватываются по истечении INGREDIENT_INDEX_TTL
+    секунд.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys = None
+        self._entries = None
+        self._built_at = 0
+        self._version = None
+
+    def invalidate(self, **kwargs):
+        transaction.on_commit(
+            lambda: cache.set(VERSION_KEY, uuid.uuid4().hex, None)
+        )
+
+    @staticmethod
+    def get_version():
+        version = cache.get(VERSION_KEY)
+        if version is None:
+            version = uuid.uuid4().hex
+            if not cache.add(VERSION_KEY, version, None):
+                version = cache.get(VERSION_KEY)
+        return version
+
+    def _is_stale(self, version):
+        return (
+            self._entries is None
+            or version != self._version
+            or time.monotonic() - self._built_at
+            > settings.INGREDIENT_INDEX_TTL
+        )
+
+    def _build(self, version):
+        rows = sorted(
+            (fold(name), ingredient_id, name, measurement_unit)
+            for ingredient_id, name, measurement_unit
+            in Ingredient.objects.values_list(
+                "id", "name", "measurement_unit"
+            ).iterator()
+        )
+        self._keys = [row[0] for row in rows]
+        self._entries = [
+            {"id": ingredient_id, "name": name, "measurement_unit": unit}
+            for _, ingredient_id, name, unit in rows
+        ]
+        self._built_at = time.monotonic()
+        self._version = version
+
+    def _get(self):
+        # Версия читается до чтения из базы: изменение, зафиксированное
+        # во время построения, сменит её и вызовет повторное построение.
+        version = self.get_version()
+        with self._lock:
+            if self._is_stale(version):
+                with use_primary():
+                    self._build(version)
+            return self._keys, self._entries
+
+    def search(self, query):
+        """Сначала ингредиенты, начинающиеся с query, затем содержащие его."""
+        query = fold(query.strip())
+        keys, entries = self._get()
+        if not query:
+            return list(entries)
+
+        start = bisect_left(keys, query)
+        end = start
+        while end < len(keys) and keys[end].startswith(query):
+            end += 1
+
+        prefix_matches = entries[start:end]
+        substring_matches = [
+            entry for key, entry in zip(keys, entries)
+            if query in key and not key.startswith(query)
+        ]
+        return prefix_matches + substring_matches
+
+
+ingredient_index = IngredientIndex()
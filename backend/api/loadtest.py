@@ -0,0 +1,547 @@
+import asyncio
+import json
+import math
+import random
+import re
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter, defaultdict, namedtuple
+from contextlib import contextmanager
+from http import HTTPStatus
+
+import requests
+
+VARIABLE_RE = re.compile(r"{{(\w+)}}")
+LOCAL_RE = re.compile(
+    r"""const (\w+) = _\.get\(responseData, ["']([\w.]+)["']\)"""
+)
+SET_RE = re.compile(
+    r"""collectionVariables\.set\(["'](\w+)["'],\s*([\w.\[\]]+?)"""
+    r"""(?:\.slice\((\d+),\s*(\d+)\))?\)"""
+)
+STATUS_RE = re.compile(r"""to\.be\.eql\(["']([A-Za-z ]+)["']\)""")
+PATH_RE = re.compile(r"\[(\d+)\]|(\w+)")
+STATUS_CODES = {status.phrase: status.value for status in HTTPStatus}
+SERVER_START_TIMEOUT = 30
+
+PostmanRequest = namedtuple(
+    "PostmanRequest", "name route method url headers body captures status"
+)
+Capture = namedtuple("Capture", "path start end")
+Scenario = namedtuple(
+    "Scenario", "name weight requests new_identity", defaults=(False,)
+)
+
+# Подготовка виртуального пользователя: три аккаунта, токены,
+# справочники и два рецепта второго пользователя, как в начале коллекции.
+SETUP = (
+    "create_first_user",
+    "create_second_user",
+    "create_third_user",
+    "get_token_for_first_user",
+    "get_token_for_second_user",
+    "get_tag_list // User",
+    "get_ingredients_list // User",
+    "create_first_recipe // Second User",
+    "create_second_recipe // Second User",
+)
+SCENARIOS = (
+    Scenario("browse", 50, (
+        "get_tag_list // No Auth",
+        "get_recipes_list // No Auth",
+        "get_recipes_list // User",
+        "get_recipes_list_with_two_tags_param // User",
+        "get_recipe_detail // User",
+        "get_ingredients_list_with_name_filter // User",
+    )),
+    Scenario("favorite", 15, (
+        "add_to_favorite // User",
+        "get_recipes_list_with_is_favorited_param // User",
+        "remove_from_favorite // User",
+    )),
+    Scenario("shopping_cart", 10, (
+        "add_to_shopping_cart // User",
+        "get_recipes_list_with_is_in_shopping_cart_param // User",
+        "download_shopping_cart // User",
+        "remove_from_shopping_cart // User",
+    )),
+    Scenario("subscribe", 10, (
+        "create_subscription // User",
+        "get_subscription_list_with_recipes_limit_param // User",
+        "delete_first_subscription // User",
+    )),
+    Scenario("author", 10, (
+        "create_third_recipe // Second User",
+        "update_recipe // Second User",
+        "delete_third_recipe // Second User",
+    )),
+    Scenario("register", 5, (
+        "create_first_user",
+        "get_token_for_first_user",
+        "users_me // User",
+    ), new_identity=True),
+)
+TEARDOWN = (
+    "delete_first_recipe // Second User",
+    "delete_second_recipe // Second User",
+)
+
+
+class LoadTestError(Exception):
+    pass
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[max(0, math.ceil(fraction * len(values)) - 1)]
+
+
+def lookup(data, capture):
+    for index, key in PATH_RE.findall(capture.path):
+        data = data[int(index)] if index else data[key]
+    if capture.start is not None:
+        data = data[int(capture.start):int(capture.end)]
+    return data
+
+
+def parse_tests(script):
+    """Переменные, которые тест сохраняет из ответа, и ожидаемый статус.
+
+    Разбираются только конструкции, которые встречаются в коллекции:
+    _.get(responseData, "path") и responseData[0].field.
+    """
+    local_paths = dict(LOCAL_RE.findall(script))
+    captures = {}
+    for variable, value, start, end in SET_RE.findall(script):
+        if value in local_paths:
+            path = local_paths[value]
+        elif value.startswith("responseData"):
+            path = value[len("responseData"):]
+        else:
+            continue
+        captures[variable] = Capture(path, start or None, end or None)
+    statuses = STATUS_RE.findall(script)
+    return captures, STATUS_CODES.get(statuses[0]) if statuses else None
+
+
+def auth_headers(auth):
+    if not auth:
+        return {}
+    if auth["type"] == "apikey":
+        options = {
+            option["key"]: option["value"] for option in auth["apikey"]
+        }
+        return {options["key"]: options["value"]}
+    if auth["type"] == "bearer":
+        options = {
+            option["key"]: option["value"] for option in auth["bearer"]
+        }
+        return {"Authorization": f"Bearer {options['token']}"}
+    return {}
+
+
+class PostmanCollection:
+    """Запросы Postman-коллекции по имени.
+
+    Авторизация запроса без своей наследуется от ближайшей папки,
+    как в Postman.
+    """
+
+    def __init__(self, path):
+        with open(path, encoding="utf-8") as file:
+            data = json.load(file)
+        self.variables = {
+            variable["key"]: variable["value"]
+            for variable in data.get("variable", ())
+        }
+        self.requests = {}
+        self.collect(data["item"], data.get("auth"))
+
+    def collect(self, items, auth):
+        for item in items:
+            if "item" in item:
+                self.collect(item["item"], item.get("auth") or auth)
+                continue
+            request = item["request"]
+            item_auth = request.get("auth") or auth
+            url = request["url"]
+            if isinstance(url, dict):
+                url = url["raw"]
+            body = request.get("body") or {}
+            captures, status = parse_tests("\n".join(
+                line
+                for event in item.get("event", ())
+                if event["listen"] == "test"
+                for line in event["script"]["exec"]
+            ))
+            headers = {
+                header["key"]: header["value"]
+                for header in request.get("header", ())
+                if not header.get("disabled")
+            }
+            headers.update(auth_headers(item_auth))
+            name = item["name"].strip()
+            self.requests[name] = PostmanRequest(
+                name=name,
+                route=f"{request['method']} "
+                      f"{url.replace('{{baseUrl}}', '')}",
+                method=request["method"],
+                url=url,
+                headers=headers,
+                body=body.get("raw") if body.get("mode") == "raw" else None,
+                captures=captures,
+                status=status,
+            )
+
+    def __getitem__(self, name):
+        try:
+            return self.requests[name]
+        except KeyError:
+            raise LoadTestError(f"В коллекции нет запроса «{name}».")
+
+
+class LoadStats:
+    """Время ответа, статусы и ошибки по маршрутам, общие для потоков."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.routes = defaultdict(
+            lambda: {"latencies": [], "errors": 0, "statuses": Counter()}
+        )
+        self.scenarios = Counter()
+
+    def add(self, route, elapsed, status, ok):
+        with self.lock:
+            stats = self.routes[route]
+            stats["latencies"].append(elapsed)
+            stats["statuses"][status or "error"] += 1
+            if not ok:
+                stats["errors"] += 1
+
+    def add_scenario(self, name):
+        with self.lock:
+            self.scenarios[name] += 1
+
+    @staticmethod
+    def describe(latencies, errors, statuses, elapsed):
+        latencies = [value * 1000 for value in latencies]
+        count = len(latencies)
+        return {
+            "requests": count,
+            "rps": round(count / elapsed, 2),
+            "p50_ms": round(percentile(latencies, 0.5), 2),
+            "p95_ms": round(percentile(latencies, 0.95), 2),
+            "p99_ms": round(percentile(latencies, 0.99), 2),
+            "errors": errors,
+            "error_rate": round(errors / count, 4),
+            "statuses": {
+                str(status): number for status, number in statuses.items()
+            },
+        }
+
+    def summary(self, elapsed):
+        return {
+            route: self.describe(
+                stats["latencies"], stats["errors"], stats["statuses"],
+                elapsed,
+            )
+            for route, stats in sorted(self.routes.items())
+        }
+
+    def total(self, elapsed):
+        return self.describe(
+            [
+                value for stats in self.routes.values()
+                for value in stats["latencies"]
+            ],
+            sum(stats["errors"] for stats in self.routes.values()),
+            sum(
+                (stats["statuses"] for stats in self.routes.values()),
+                Counter(),
+            ),
+            elapsed,
+        )
+
+
+class VirtualUser:
+    """Один пользователь нагрузки: свой набор аккаунтов и переменных.
+
+    Сценарии выбираются случайно с учётом весов и выполняются
+    последовательно, переменные из ответов (id, токены)
+    сохраняются, как в тестах коллекции.
+    """
+
+    def __init__(self, number, collection, base_url, scenarios, stats,
+                 username_prefix, seed, timeout, think_time):
+        self.number = number
+        self.collection = collection
+        self.scenarios = scenarios
+        self.stats = stats
+        self.username_prefix = username_prefix
+        self.rng = random.Random(seed * 1000 + number)
+        self.timeout = timeout
+        self.think_time = think_time
+        self.session = requests.Session()
+        self.variables = dict(collection.variables, baseUrl=base_url)
+        self.accounts = 0
+        self.new_identity()
+
+    def new_identity(self):
+        for prefix, email_key, username_key in (
+            ("first", "email", "username"),
+            ("second", "secondUserEmail", "secondUserUsername"),
+            ("third", "thirdUserEmail", "thirdUserUsername"),
+        ):
+            username = (
+                f"{self.username_prefix}{self.number}-{prefix}{self.accounts}"
+            )
+            self.variables[username_key] = json.dumps(username)
+            self.variables[email_key] = json.dumps(f"{username}@example.com")
+        self.accounts += 1
+
+    def render(self, template):
+        def replace(match):
+            try:
+                return str(self.variables[match.group(1)])
+            except KeyError:
+                raise LoadTestError(
+                    f"Не задана переменная коллекции {match.group(1)}."
+                )
+        return VARIABLE_RE.sub(replace, template)
+
+    def send(self, name, record=True):
+        request = self.collection[name]
+        url = self.render(request.url)
+        headers = {
+            key: self.render(value) for key, value in request.headers.items()
+        }
+        body = None
+        if request.body is not None:
+            body = self.render(request.body).encode()
+            headers.setdefault("Content-Type", "application/json")
+
+        start = time.perf_counter()
+        try:
+            response = self.session.request(
+                request.method, url, data=body, headers=headers,
+                timeout=self.timeout,
+            )
+            status = response.status_code
+        except requests.RequestException:
+            response, status = None, None
+        elapsed = time.perf_counter() - start
+
+        ok = status is not None and (
+            status == request.status if request.status else status < 400
+        )
+        if record:
+            self.stats.add(request.route, elapsed, status, ok)
+        if ok and request.captures:
+            data = response.json()
+            for variable, capture in request.captures.items():
+                self.variables[variable] = lookup(data, capture)
+        return ok, status
+
+    def setup(self):
+        for name in SETUP:
+            ok, status = self.send(name, record=False)
+            if not ok:
+                raise LoadTestError(
+                    f"Подготовка пользователя {self.number}: «{name}» "
+                    f"вернул {status or 'ошибку соединения'}."
+                )
+
+    def teardown(self):
+        for name in TEARDOWN:
+            self.send(name, record=False)
+
+    def run(self, start_at, deadline):
+        time.sleep(max(0, start_at - time.monotonic()))
+        self.setup()
+        weights = [scenario.weight for scenario in self.scenarios]
+        while time.monotonic() < deadline:
+            scenario = self.rng.choices(self.scenarios, weights)[0]
+            if scenario.new_identity:
+                self.new_identity()
+            # Следующие шаги зависят от переменных предыдущих:
+            # после ошибки сценарий прерывается.
+            if all(self.send(name)[0] for name in scenario.requests):
+                self.stats.add_scenario(scenario.name)
+            else:
+                self.stats.add_scenario(f"{scenario.name} (прерван)")
+            if self.think_time:
+                time.sleep(self.rng.uniform(0, 2 * self.think_time))
+        self.teardown()
+
+
+def run_load(collection, base_url, users, duration, ramp_up, scenarios,
+             username_prefix, seed=1, timeout=10, think_time=0):
+    """Запускает users виртуальных пользователей на duration секунд.
+
+    Пользователи стартуют равномерно в течение ramp_up секунд.
+    Возвращает статистику и ошибки подготовки пользователей.
+    """
+    stats = LoadStats()
+    errors = []
+    start = time.monotonic()
+    deadline = start + ramp_up + duration
+
+    def run(user):
+        try:
+            user.run(start + ramp_up * user.number / users, deadline)
+        except LoadTestError as error:
+            errors.append(str(error))
+
+    threads = [
+        threading.Thread(
+            target=run,
+            args=(VirtualUser(
+                number, collection, base_url, scenarios, stats,
+                username_prefix, seed, timeout, think_time,
+            ),),
+            daemon=True,
+        )
+        for number in range(users)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return stats, errors
+
+
+def server_command(kind, address, workers=2, threads=1):
+    if kind == "runserver":
+        return [
+            sys.executable, "manage.py", "runserver", "--noreload", address,
+        ]
+    command = [
+        sys.executable, "-m", "gunicorn", "--bind", address,
+        "--workers", str(workers),
+    ]
+    if kind == "uvicorn":
+        return [
+            *command, "--worker-class", "uvicorn.workers.UvicornWorker",
+            "foodgram.asgi:application",
+        ]
+    return [*command, "--threads", str(threads), "foodgram.wsgi:application"]
+
+
+@contextmanager
+def running_server(kind, port, cwd, workers=2, threads=1, verbose=False):
+    """Локальный сервер на время блока: runserver, gunicorn (WSGI)
+    или gunicorn с воркерами uvicorn (ASGI).
+
+    Блок начинается, когда сервер ответил на запрос к /api/.
+    """
+    address = f"127.0.0.1:{port}"
+    output = None if verbose else subprocess.DEVNULL
+    process = subprocess.Popen(
+        server_command(kind, address, workers, threads),
+        cwd=cwd, stdout=output, stderr=output,
+    )
+    base_url = f"http://{address}"
+    try:
+        deadline = time.monotonic() + SERVER_START_TIMEOUT
+        while True:
+            if process.poll() is not None:
+                raise LoadTestError(
+                    f"Сервер завершился с кодом {process.returncode}."
+                )
+            if time.monotonic() > deadline:
+                raise LoadTestError("Сервер не ответил за отведённое время.")
+            try:
+                requests.get(f"{base_url}/api/", timeout=SERVER_START_TIMEOUT)
+                break
+            except requests.RequestException:
+                time.sleep(0.2)
+        yield base_url
+    finally:
+        process.terminate()
+        process.wait()
+
+
+async def fetch(reader, writer, payload):
+    """Один HTTP/1.1-запрос: (статус, закрыл ли сервер соединение)."""
+    writer.write(payload)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length, chunked, close = 0, False, False
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        name, value = name.strip().lower(), value.strip().lower()
+        if name == "content-length":
+            length = int(value)
+        elif name == "transfer-encoding":
+            chunked = value == "chunked"
+        elif name == "connection":
+            close = value == "close"
+    if not chunked:
+        await reader.readexactly(length)
+        return status, close
+    while True:
+        size = int((await reader.readline()).split(b";")[0], 16)
+        await reader.readexactly(size + 2)
+        if not size:
+            return status, close
+
+
+async def hammer(host, port, targets, concurrency, duration, timeout=10):
+    """concurrency соединений шлют GET по кругу targets duration секунд.
+
+    targets — пары (маршрут для отчёта, путь с параметрами, заголовки).
+    Клиент на asyncio сам держит тысячи запросов в секунду, поэтому
+    не упирается в GIL, как потоки с requests.
+    """
+    stats = LoadStats()
+    payloads = [
+        (
+            route,
+            (
+                f"GET {path} HTTP/1.1\r\nHost: {host}:{port}\r\n"
+                + "".join(
+                    f"{name}: {value}\r\n" for name, value in headers.items()
+                )
+                + "\r\n"
+            ).encode(),
+        )
+        for route, path, headers in targets
+    ]
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + duration
+
+    async def connection(number):
+        reader = writer = None
+        index = number
+        while loop.time() < deadline:
+            route, payload = payloads[index % len(payloads)]
+            index += 1
+            start = time.perf_counter()
+            try:
+                if writer is None:
+                    reader, writer = await asyncio.open_connection(host, port)
+                status, close = await asyncio.wait_for(
+                    fetch(reader, writer, payload), timeout
+                )
+            except (OSError, ValueError, IndexError,
+                    asyncio.IncompleteReadError, asyncio.TimeoutError):
+                status, close = None, True
+            stats.add(
+                route, time.perf_counter() - start, status,
+                status is not None and status < 400,
+            )
+            if close and writer is not None:
+                writer.close()
+                writer = None
+        if writer is not None:
+            writer.close()
+
+    await asyncio.gather(
+        *(connection(number) for number in range(concurrency))
+    )
+    return stats
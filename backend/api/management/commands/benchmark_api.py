@@ -0,0 +1,511 @@
+import base64
+import json
+import logging
+import time
+import tracemalloc
+from collections import namedtuple
+from datetime import datetime, timezone
+from statistics import mean
+
+from api.constants import BENCHMARK_PASSWORD, BENCHMARK_USERNAME_PREFIX
+from api.loadtest import percentile
+from api.querystats import capture_queries
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test.utils import override_settings
+from django.urls import URLPattern, reverse
+from recipes.models import (FeedEntry, Ingredient, IngredientAmount, Profile,
+                            ProfileFavorite, Recipe, Tag)
+from rest_framework.test import APIClient
+
+DUMMY_CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}
+}
+SIGNUP_PREFIX = f"{BENCHMARK_USERNAME_PREFIX}signup_"
+MEMORY_NOISE_KB = 32
+# PNG 1×1 для создания рецепта.
+PIXEL = "data:image/png;base64," + base64.b64encode(bytes.fromhex(
+    "89504e470d0a1a0a0000000d4948445200000001000000010806000000"
+    "1f15c4890000000d49444154789c6360606060000000050001a5f64540"
+    "0000000049454e44ae426082"
+)).decode()
+
+# Маршруты api.urls, которые не замеряются, и почему.
+SKIPPED_ROUTES = {
+    "user-activation": "нужны uid и токен из письма",
+    "user-resend-activation": "отправляет письмо",
+    "user-reset-password": "отправляет письмо",
+    "user-reset-password-confirm": "нужны uid и токен из письма",
+    "user-reset-username": "отправляет письмо",
+    "user-reset-username-confirm": "нужны uid и токен из письма",
+    "user-set-username": "меняет логин пользователя",
+    "api-root": "служебная страница DRF",
+}
+
+Step = namedtuple(
+    "Step", "label route method url data keep anonymous",
+    defaults=(None, None, False),
+)
+
+
+def route_names(patterns):
+    """Имена всех маршрутов URLconf, включая вложенные."""
+    for pattern in patterns:
+        if isinstance(pattern, URLPattern):
+            if pattern.name:
+                yield pattern.name
+        else:
+            yield from route_names(pattern.url_patterns)
+
+
+class Command(BaseCommand):
+    help = (
+        "Замеряет каждый маршрут api.urls на текущей базе: время ответа "
+        "(p50, p95), число SQL-запросов и пик выделенной памяти. "
+        "Результаты можно сохранить в JSON (--output) и сравнить "
+        "с сохранёнными ранее (--baseline). Базу удобно заполнить "
+        "командой seed_benchmark_data."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--repeat", type=int, default=20,
+            help="сколько раз замерить каждый маршрут",
+        )
+        parser.add_argument(
+            "--warmup", type=int, default=2,
+            help="сколько прогонов сделать до замеров",
+        )
+        parser.add_argument(
+            "--user", type=int,
+            help="id пользователя, от имени которого идут запросы; по "
+                 "умолчанию первый пользователь из seed_benchmark_data",
+        )
+        parser.add_argument(
+            "--route", action="append", dest="routes",
+            help="замерить только маршруты, в названии которых есть "
+                 "эта строка (можно указать несколько раз)",
+        )
+        parser.add_argument(
+            "--with-cache", action="store_true",
+            help="использовать настроенный кеш; по умолчанию кеш "
+                 "отключён и замеряется путь без попаданий",
+        )
+        parser.add_argument(
+            "--output", help="файл, куда сохранить результаты в JSON",
+        )
+        parser.add_argument(
+            "--baseline", help="JSON прежнего прогона для сравнения",
+        )
+        parser.add_argument(
+            "--tolerance", type=float, default=0.2,
+            help="допустимый рост p50 и памяти относительно baseline",
+        )
+        parser.add_argument(
+            "--min-delta-ms", type=float, default=1.0,
+            help="рост p50 меньше этого не считается регрессией",
+        )
+
+    def get_profile(self, user):
+        if user is not None:
+            return Profile.objects.filter(pk=user).first()
+        return Profile.objects.filter(
+            username__startswith=BENCHMARK_USERNAME_PREFIX
+        ).exclude(
+            username__startswith=SIGNUP_PREFIX
+        ).order_by("id").first() or Profile.objects.annotate(
+            favorites_count=Count("favorite_recipes")
+        ).order_by("-favorites_count").first()
+
+    def get_steps(self, profile):
+        author = Profile.objects.exclude(pk=profile.pk).exclude(
+            followers=profile
+        ).annotate(recipes_count=Count("recipes")).order_by(
+            "-recipes_count"
+        ).first()
+        recipe = Recipe.objects.filter(author__followers=profile).first() or (
+            Recipe.objects.first()
+        )
+        toggled = Recipe.objects.exclude(is_favorited=profile).exclude(
+            is_in_shopping_cart=profile
+        ).first()
+        tag = Tag.objects.order_by("id").first()
+        ingredients = list(
+            IngredientAmount.objects.filter(recipe=recipe).values_list(
+                "ingredient_id", flat=True
+            )
+        )
+        if not (author and recipe and toggled and tag and ingredients):
+            raise CommandError(
+                "Мало данных для замеров, заполните базу командой "
+                "seed_benchmark_data."
+            )
+        word = recipe.name.split()[0]
+        recipe_data = {
+            "ingredients": [
+                {"id": ingredient_id, "amount": 10}
+                for ingredient_id in ingredients
+            ],
+            "tags": [tag.id],
+            "image": PIXEL,
+            "name": "Рецепт для замеров",
+            "text": "Создан командой benchmark_api.",
+            "cooking_time": 10,
+        }
+
+        def url(route, query="", **kwargs):
+            return reverse(route, kwargs=kwargs) + query
+
+        steps = [
+            Step("GET users", "user-list", "get", url("user-list")),
+            Step("GET users/me", "user-me", "get", url("user-me")),
+            Step(
+                "GET users/{id}", "user-detail", "get",
+                url("user-detail", id=author.id),
+            ),
+            Step(
+                "GET users/subscriptions?recipes_limit=3",
+                "user-subscriptions", "get",
+                url("user-subscriptions", "?recipes_limit=3"),
+            ),
+            Step(
+                "POST users/{id}/subscribe", "user-subscribe", "post",
+                url("user-subscribe", id=author.id),
+            ),
+            Step(
+                "DELETE users/{id}/subscribe", "user-subscribe", "delete",
+                url("user-subscribe", id=author.id),
+            ),
+            Step(
+                "POST users", "user-list", "post", url("user-list"),
+                lambda state: {
+                    "email": f"{SIGNUP_PREFIX}{state['iteration']}"
+                             "@example.com",
+                    "username": f"{SIGNUP_PREFIX}{state['iteration']}",
+                    "first_name": "Пользователь",
+                    "last_name": "Новый",
+                    "password": BENCHMARK_PASSWORD,
+                },
+            ),
+            Step("GET tags", "tag-list", "get", url("tag-list")),
+            Step(
+                "GET tags/{id}", "tag-detail", "get",
+                url("tag-detail", pk=tag.id),
+            ),
+            Step(
+                "GET ingredients", "ingredient-list", "get",
+                url("ingredient-list"),
+            ),
+            Step(
+                "GET ingredients?name=", "ingredient-list", "get",
+                url("ingredient-list", "?name=" + word[:2]),
+            ),
+            Step(
+                "GET ingredients/{id}", "ingredient-detail", "get",
+                url("ingredient-detail", pk=ingredients[0]),
+            ),
+            Step("GET recipes", "recipe-list", "get", url("recipe-list")),
+            Step(
+                "GET recipes (аноним)", "recipe-list", "get",
+                url("recipe-list"), anonymous=True,
+            ),
+            Step(
+                "GET recipes?tags=", "recipe-list", "get",
+                url("recipe-list", "?tags=" + tag.slug),
+            ),
+            Step(
+                "GET recipes?author=", "recipe-list", "get",
+                url("recipe-list", f"?author={author.id}"),
+            ),
+            Step(
+                "GET recipes?is_favorited=1", "recipe-list", "get",
+                url("recipe-list", "?is_favorited=1"),
+            ),
+            Step(
+                "GET recipes?is_in_shopping_cart=1", "recipe-list", "get",
+                url("recipe-list", "?is_in_shopping_cart=1"),
+            ),
+            Step(
+                "GET recipes?search=", "recipe-list", "get",
+                url("recipe-list", "?search=" + word),
+            ),
+            Step(
+                "GET recipes/{id}", "recipe-detail", "get",
+                url("recipe-detail", pk=recipe.id),
+            ),
+            Step("GET recipes/feed", "recipe-feed", "get", url("recipe-feed")),
+            Step(
+                "GET recipes/cookable", "recipe-cookable", "get",
+                url(
+                    "recipe-cookable",
+                    "?ingredients=" + ",".join(map(str, ingredients[:5])),
+                ),
+            ),
+            Step(
+                "GET recipes/download_shopping_cart",
+                "recipe-download-shopping-cart", "get",
+                url("recipe-download-shopping-cart"),
+            ),
+            Step(
+                "POST recipes/{id}/favorite", "recipe-favorite", "post",
+                url("recipe-favorite", pk=toggled.id),
+            ),
+            Step(
+                "DELETE recipes/{id}/favorite", "recipe-favorite", "delete",
+                url("recipe-favorite", pk=toggled.id),
+            ),
+            Step(
+                "POST recipes/{id}/shopping_cart", "recipe-shopping-cart",
+                "post", url("recipe-shopping-cart", pk=toggled.id),
+            ),
+            Step(
+                "DELETE recipes/{id}/shopping_cart", "recipe-shopping-cart",
+                "delete", url("recipe-shopping-cart", pk=toggled.id),
+            ),
+            Step(
+                "POST recipes", "recipe-list", "post", url("recipe-list"),
+                recipe_data, keep="recipe",
+            ),
+            Step(
+                "PATCH recipes/{id}", "recipe-detail", "patch",
+                url("recipe-list") + "{recipe}/", recipe_data,
+            ),
+            Step(
+                "DELETE recipes/{id}", "recipe-detail", "delete",
+                url("recipe-list") + "{recipe}/",
+            ),
+            Step(
+                "POST users/set_password", "user-set-password", "post",
+                url("user-set-password"),
+                {
+                    "current_password": BENCHMARK_PASSWORD,
+                    "new_password": BENCHMARK_PASSWORD,
+                },
+            ),
+        ]
+        if profile.check_password(BENCHMARK_PASSWORD):
+            steps += [
+                Step(
+                    "POST auth/token/login", "login", "post", url("login"),
+                    {"email": profile.email, "password": BENCHMARK_PASSWORD},
+                    anonymous=True,
+                ),
+                Step(
+                    "POST auth/token/logout", "logout", "post",
+                    url("logout"),
+                ),
+            ]
+        return steps
+
+    def check_coverage(self, steps):
+        from api.urls import urlpatterns
+
+        covered = {step.route for step in steps}
+        for name in sorted(
+            set(route_names(urlpatterns)) - covered - set(SKIPPED_ROUTES)
+        ):
+            self.stderr.write(f"Маршрут {name} не замеряется.")
+
+    def request(self, clients, step, state):
+        client = clients[step.anonymous]
+        data = step.data(state) if callable(step.data) else step.data
+        kwargs = {} if step.method == "get" else {"format": "json"}
+        with capture_queries() as stats:
+            start = time.perf_counter()
+            response = getattr(client, step.method)(
+                step.url.format(**state), data, **kwargs
+            )
+            if response.streaming:
+                body = b"".join(response.streaming_content)
+            else:
+                body = response.content
+            elapsed = time.perf_counter() - start
+        if step.keep and response.status_code == 201:
+            state[step.keep] = response.json()["id"]
+        return elapsed, stats.count, response.status_code, len(body)
+
+    def run_steps(self, clients, steps, iteration, memory=False):
+        state = {"iteration": iteration}
+        for step in steps:
+            if memory:
+                tracemalloc.start()
+            elapsed, queries, status, size = self.request(
+                clients, step, state
+            )
+            peak = None
+            if memory:
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            yield step, elapsed, queries, status, size, peak
+
+    def measure(self, clients, steps, repeat, warmup):
+        samples = {
+            step.label: {"times": [], "queries": [], "statuses": set()}
+            for step in steps
+        }
+        results = {}
+        for iteration in range(warmup + repeat):
+            for step, elapsed, queries, status, size, _ in self.run_steps(
+                clients, steps, iteration
+            ):
+                if iteration < warmup:
+                    continue
+                sample = samples[step.label]
+                sample["times"].append(elapsed * 1000)
+                sample["queries"].append(queries)
+                sample["statuses"].add(status)
+                results[step.label] = {"route": step.route, "bytes": size}
+
+        for step, _, _, _, _, peak in self.run_steps(
+            clients, steps, warmup + repeat, memory=True
+        ):
+            sample = samples[step.label]
+            times = sample["times"]
+            results[step.label].update(
+                method=step.method.upper(),
+                status=sorted(sample["statuses"]),
+                p50_ms=round(percentile(times, 0.5), 3),
+                p95_ms=round(percentile(times, 0.95), 3),
+                mean_ms=round(mean(times), 3),
+                min_ms=round(min(times), 3),
+                queries=max(sample["queries"]),
+                peak_kb=round(peak / 1024, 1),
+            )
+        return results
+
+    def get_dataset(self):
+        return {
+            "users": Profile.objects.count(),
+            "recipes": Recipe.objects.count(),
+            "ingredients": Ingredient.objects.count(),
+            "recipe_ingredients": IngredientAmount.objects.count(),
+            "follows": Profile.following.through.objects.count(),
+            "favorites": ProfileFavorite.objects.count(),
+            "cart": Profile.shopping_cart.through.objects.count(),
+            "feed": FeedEntry.objects.count(),
+        }
+
+    def report(self, results):
+        for label, result in results.items():
+            errors = [status for status in result["status"] if status >= 400]
+            line = (
+                f"{label:<42} p50 {result['p50_ms']:>8.2f} мс  "
+                f"p95 {result['p95_ms']:>8.2f} мс  "
+                f"запросов {result['queries']:>3}  "
+                f"память {result['peak_kb']:>8.1f} КБ"
+            )
+            if errors:
+                self.stderr.write(f"{line}  ответ {errors}")
+            else:
+                self.stdout.write(line)
+
+    def compare(self, run, baseline, tolerance, min_delta_ms, partial):
+        """Печатает изменения и возвращает список регрессий."""
+        if run["dataset"] != baseline.get("dataset"):
+            self.stderr.write(
+                "Наборы данных различаются, сравнение приблизительное: "
+                f"{baseline.get('dataset')} и {run['dataset']}."
+            )
+        regressions = []
+        previous = baseline.get("results", {})
+        for label, result in run["results"].items():
+            base = previous.get(label)
+            if base is None:
+                self.stdout.write(f"{label}: нет в baseline")
+                continue
+            problems = []
+            if result["queries"] > base["queries"]:
+                problems.append(
+                    f"запросов {base['queries']} → {result['queries']}"
+                )
+            if (
+                result["p50_ms"] > base["p50_ms"] * (1 + tolerance)
+                and result["p50_ms"] - base["p50_ms"] > min_delta_ms
+            ):
+                problems.append(
+                    f"p50 {base['p50_ms']:.2f} → {result['p50_ms']:.2f} мс"
+                )
+            if (
+                result["peak_kb"] > base["peak_kb"] * (1 + tolerance)
+                and result["peak_kb"] - base["peak_kb"] > MEMORY_NOISE_KB
+            ):
+                problems.append(
+                    f"память {base['peak_kb']:.1f} → "
+                    f"{result['peak_kb']:.1f} КБ"
+                )
+            change = result["p50_ms"] / base["p50_ms"] - 1
+            if problems:
+                regressions.append(label)
+                self.stderr.write(
+                    f"{label}: {change:+.0%}, " + ", ".join(problems)
+                )
+            else:
+                self.stdout.write(f"{label}: {change:+.0%}")
+        if not partial:
+            for label in previous.keys() - run["results"].keys():
+                self.stdout.write(f"{label}: есть только в baseline")
+        return regressions
+
+    def handle(self, *args, repeat=20, warmup=2, user=None, routes=None,
+               with_cache=False, output=None, baseline=None, tolerance=0.2,
+               min_delta_ms=1.0, **options):
+        if repeat < 1:
+            raise CommandError("--repeat должен быть больше нуля.")
+        profile = self.get_profile(user)
+        if profile is None:
+            raise CommandError(
+                "Нет пользователя для замеров, заполните базу командой "
+                "seed_benchmark_data."
+            )
+        if baseline:
+            with open(baseline, encoding="utf-8") as file:
+                baseline = json.load(file)
+
+        steps = self.get_steps(profile)
+        self.check_coverage(steps)
+        if routes:
+            steps = [
+                step for step in steps
+                if any(route in step.label for route in routes)
+            ]
+
+        clients = {False: APIClient(), True: APIClient()}
+        clients[False].force_authenticate(profile)
+        Profile.objects.filter(username__startswith=SIGNUP_PREFIX).delete()
+        query_logger = logging.getLogger("api.queries")
+        log_level = query_logger.level
+        query_logger.setLevel(logging.ERROR)
+        settings_override = {"ALLOWED_HOSTS": ["*"]}
+        if not with_cache:
+            settings_override["CACHES"] = DUMMY_CACHES
+        try:
+            with override_settings(**settings_override):
+                results = self.measure(clients, steps, repeat, warmup)
+        finally:
+            query_logger.setLevel(log_level)
+            Profile.objects.filter(
+                username__startswith=SIGNUP_PREFIX
+            ).delete()
+
+        run = {
+            "created": datetime.now(timezone.utc).isoformat(),
+            "database": connection.vendor,
+            "user": profile.pk,
+            "repeat": repeat,
+            "cache": with_cache,
+            "dataset": self.get_dataset(),
+            "results": results,
+        }
+        self.report(results)
+        if output:
+            with open(output, "w", encoding="utf-8") as file:
+                json.dump(run, file, ensure_ascii=False, indent=2)
+            self.stdout.write(f"Результаты сохранены в {output}.")
+        if baseline:
+            regressions = self.compare(
+                run, baseline, tolerance, min_delta_ms, bool(routes)
+            )
+            if regressions:
+                raise CommandError(f"Регрессий: {len(regressions)}.")
+            self.stdout.write(self.style.SUCCESS("Регрессий нет."))
@@ -0,0 +1,199 @@
+import asyncio
+import json
+from datetime import datetime, timezone
+
+from api.constants import BENCHMARK_USERNAME_PREFIX
+from api.loadtest import LoadTestError, hammer, running_server
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from recipes.models import Profile, Recipe
+from rest_framework.authtoken.models import Token
+
+ANONYMOUS_TARGETS = (
+    ("GET /api/recipes/", "/api/recipes/"),
+    ("GET /api/recipes/?limit=20", "/api/recipes/?limit=20"),
+    ("GET /api/recipes/{id}/", "/api/recipes/{recipe_id}/"),
+    ("GET /api/tags/", "/api/tags/"),
+    ("GET /api/ingredients/", "/api/ingredients/"),
+)
+USER_TARGETS = (
+    ("GET /api/recipes/ (user)", "/api/recipes/"),
+    ("GET /api/recipes/{id}/ (user)", "/api/recipes/{recipe_id}/"),
+    (
+        "GET /api/users/subscriptions/ (user)",
+        "/api/users/subscriptions/?recipes_limit=3",
+    ),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает пропускную способность эндпоинтов чтения под WSGI "
+        "(gunicorn, синхронные воркеры) и ASGI (gunicorn с воркерами "
+        "uvicorn) при нескольких уровнях "
+        "конкурентности. Сервера запускаются по очереди на одной базе "
+        "с одинаковым числом воркеров."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--servers", nargs="+", choices=("gunicorn", "uvicorn"),
+            default=["gunicorn", "uvicorn"],
+        )
+        parser.add_argument(
+            "--concurrency", nargs="+", type=int, default=[16, 64, 256],
+            help="число одновременных соединений, по замеру на значение",
+        )
+        parser.add_argument(
+            "--duration", type=float, default=10,
+            help="длительность замера, секунд",
+        )
+        parser.add_argument(
+            "--warmup", type=float, default=2,
+            help="прогрев перед замером, секунд: заполняет кеши воркеров",
+        )
+        parser.add_argument("--workers", type=int, default=2)
+        parser.add_argument(
+            "--threads", type=int, default=1,
+            help="потоков в воркере gunicorn под WSGI",
+        )
+        parser.add_argument("--port", type=int, default=8000)
+        parser.add_argument(
+            "--user",
+            help="пользователь для авторизованных запросов; по умолчанию "
+                 f"первый {BENCHMARK_USERNAME_PREFIX}* из seed_benchmark_data",
+        )
+        parser.add_argument(
+            "--output", help="файл, куда сохранить результаты в JSON",
+        )
+
+    def get_user(self, username):
+        users = Profile.objects.order_by("id")
+        if username:
+            users = users.filter(username=username)
+        else:
+            users = users.filter(
+                username__startswith=BENCHMARK_USERNAME_PREFIX
+            )
+        user = users.first()
+        if username and user is None:
+            raise CommandError(f"Пользователь {username} не найден.")
+        return user
+
+    def get_targets(self, token):
+        recipe_id = Recipe.objects.order_by(
+            "-pub_date", "-id"
+        ).values_list("id", flat=True).first()
+        if recipe_id is None:
+            raise CommandError(
+                "В базе нет рецептов: сначала запустите seed_benchmark_data."
+            )
+        targets = [
+            (route, path.format(recipe_id=recipe_id), {})
+            for route, path in ANONYMOUS_TARGETS
+        ]
+        if token is not None:
+            targets += [
+                (
+                    route, path.format(recipe_id=recipe_id),
+                    {"Authorization": f"Token {token.key}"},
+                )
+                for route, path in USER_TARGETS
+            ]
+        return targets
+
+    def measure(self, port, targets, concurrency, duration, warmup):
+        if warmup:
+            asyncio.run(
+                hammer("127.0.0.1", port, targets, concurrency, warmup)
+            )
+        stats = asyncio.run(
+            hammer("127.0.0.1", port, targets, concurrency, duration)
+        )
+        return {
+            "total": stats.total(duration),
+            "routes": stats.summary(duration),
+        }
+
+    def report(self, server, concurrency, result):
+        total = result["total"]
+        line = (
+            f"{server:<9} c={concurrency:<5} {total['rps']:>9.1f} запросов/с"
+            f"  p50 {total['p50_ms']:>8.1f}  p95 {total['p95_ms']:>8.1f}"
+            f"  p99 {total['p99_ms']:>8.1f} мс"
+            f"  ошибок {total['error_rate']:>6.1%}"
+        )
+        (self.stderr if total["errors"] else self.stdout).write(line)
+        if self.verbosity > 1:
+            for route, stats in result["routes"].items():
+                self.stdout.write(
+                    f"    {route:<40} {stats['rps']:>8.1f}/с"
+                    f"  p50 {stats['p50_ms']:>8.1f}"
+                    f"  p99 {stats['p99_ms']:>8.1f} мс"
+                    f"  ошибок {stats['error_rate']:>6.1%}"
+                )
+
+    def handle(self, *args, servers=("gunicorn", "uvicorn"),
+               concurrency=(16, 64, 256), duration=10, warmup=2, workers=2,
+               threads=1, port=8000, user=None, output=None, **options):
+        self.verbosity = options.get("verbosity", 1)
+        if duration <= 0 or min(concurrency) < 1:
+            raise CommandError("Нужны --duration > 0 и --concurrency ≥ 1.")
+
+        profile = self.get_user(user)
+        token, created = None, False
+        if profile is None:
+            self.stderr.write(
+                "Нет пользователя для авторизованных запросов: замеряются "
+                "только анонимные."
+            )
+        else:
+            token, created = Token.objects.get_or_create(user=profile)
+        results = {}
+        try:
+            targets = self.get_targets(token)
+            for server in servers:
+                results[server] = {}
+                with running_server(
+                    server, port, settings.BASE_DIR, workers, threads,
+                    verbose=self.verbosity > 2,
+                ):
+                    for level in concurrency:
+                        result = self.measure(
+                            port, targets, level, duration, warmup
+                        )
+                        results[server][level] = result
+                        self.report(server, level, result)
+        except LoadTestError as error:
+            raise CommandError(str(error))
+        finally:
+            if created:
+                token.delete()
+
+        if len(results) > 1 and "gunicorn" in results:
+            for server, levels in results.items():
+                if server == "gunicorn":
+                    continue
+                for level, result in levels.items():
+                    baseline = results["gunicorn"][level]["total"]["rps"]
+                    ratio = result["total"]["rps"] / baseline if (
+                        baseline
+                    ) else float("inf")
+                    self.stdout.write(
+                        f"c={level}: {server} / gunicorn = {ratio:.2f}×"
+                    )
+
+        if output:
+            with open(output, "w", encoding="utf-8") as file:
+                json.dump(
+                    {
+                        "created": datetime.now(timezone.utc).isoformat(),
+                        "workers": workers,
+                        "threads": threads,
+                        "duration": duration,
+                        "targets": [route for route, _, _ in targets],
+                        "results": results,
+                    },
+                    file, ensure_ascii=False, indent=2,
+                )
+            self.stdout.write(f"Результаты сохранены в {output}.")
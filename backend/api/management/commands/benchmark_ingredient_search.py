@@ -0,0 +1,59 @@
+import time
+
+from api.ingredient_index import ingredient_index
+from api.serializers import IngredientSerializer
+from django.core.management.base import BaseCommand
+from recipes.models import Ingredient
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает поиск ингредиентов по префиксу через базу данных "
+        "и через индекс в памяти."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--repeat", type=int, default=200,
+            help="сколько раз выполнить каждый запрос",
+        )
+        parser.add_argument(
+            "queries", nargs="*",
+            help="строки поиска; по умолчанию префиксы первых названий",
+        )
+
+    def default_queries(self):
+        names = Ingredient.objects.values_list("name", flat=True)[:20]
+        return sorted({
+            name[:length] for name in names for length in (1, 2, 4)
+        })
+
+    def measure(self, search, queries, repeat):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for query in queries:
+                search(query)
+        return (time.perf_counter() - start) / (repeat * len(queries))
+
+    def handle(self, *args, queries=None, repeat=200, **options):
+        queries = queries or self.default_queries()
+        if not queries:
+            self.stderr.write("Нет ингредиентов для поиска.")
+            return
+
+        def search_db(query):
+            return IngredientSerializer(
+                Ingredient.objects.filter(name__istartswith=query), many=True
+            ).data
+
+        ingredient_index.invalidate()
+        ingredient_index.search("")
+
+        db_time = self.measure(search_db, queries, repeat)
+        index_time = self.measure(ingredient_index.search, queries, repeat)
+        self.stdout.write(
+            f"Запросов: {len(queries)}, повторов: {repeat}\n"
+            f"База данных: {db_time * 1000:.3f} мс/запрос\n"
+            f"Индекс:      {index_time * 1000:.3f} мс/запрос\n"
+            f"Ускорение:   {db_time / index_time:.1f}x"
+        )
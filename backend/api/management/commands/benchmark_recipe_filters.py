@@ -0,0 +1,80 @@
+import time
+from statistics import median
+from types import SimpleNamespace
+
+from api.filters import RecipeFilterSet
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count, Q
+from recipes.models import Profile, Recipe, Tag
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает прежние фильтры рецептов (JOIN по тегам, ~Q по "
+        "избранному и корзине) с текущими из RecipeFilterSet."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--repeat", type=int, default=20,
+            help="сколько раз выполнить каждый запрос",
+        )
+        parser.add_argument(
+            "--user", type=int,
+            help="id пользователя для фильтров избранного и корзины; "
+                 "по умолчанию пользователь с самым большим избранным",
+        )
+        parser.add_argument(
+            "--limit", type=int, default=6,
+            help="размер страницы",
+        )
+
+    def measure(self, queryset, repeat, limit):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            count = queryset.count()
+            list(queryset.values_list("id", flat=True)[:limit])
+            timings.append(time.perf_counter() - start)
+        return count, median(timings) * 1000
+
+    def handle(self, *args, repeat=20, user=None, limit=6, **options):
+        if user is None:
+            profile = Profile.objects.annotate(
+                favorites_count=Count("favorite_recipes")
+            ).order_by("-favorites_count").first()
+        else:
+            profile = Profile.objects.filter(pk=user).first()
+        if profile is None:
+            raise CommandError("Нет пользователя для проверки.")
+        slugs = list(Tag.objects.values_list("slug", flat=True)[:2])
+
+        recipes = Recipe.objects.order_by("-pub_date", "-id")
+        request = SimpleNamespace(user=profile)
+        cases = (
+            (
+                f"tags={','.join(slugs)}",
+                recipes.filter(tags__slug__in=slugs),
+                {"tags": slugs},
+            ),
+            (
+                "is_favorited=0",
+                recipes.filter(~Q(is_favorited=profile.id)),
+                {"is_favorited": 0},
+            ),
+            (
+                "is_in_shopping_cart=0",
+                recipes.filter(~Q(is_in_shopping_cart=profile.id)),
+                {"is_in_shopping_cart": 0},
+            ),
+        )
+        for name, legacy, data in cases:
+            current = RecipeFilterSet(
+                data, queryset=recipes, request=request
+            ).qs
+            legacy_count, legacy_ms = self.measure(legacy, repeat, limit)
+            current_count, current_ms = self.measure(current, repeat, limit)
+            self.stdout.write(
+                f"{name}: было {legacy_ms:.2f} мс ({legacy_count} строк), "
+                f"стало {current_ms:.2f} мс ({current_count} строк)"
+            )
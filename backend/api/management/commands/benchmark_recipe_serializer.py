@@ -0,0 +1,122 @@
+import time
+from statistics import median
+
+from api.fast_serializers import fast_recipe_list_serializer
+from api.serializers import RecipeReadSerializer
+from api.views import RecipeViewSet
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from recipes.models import Profile
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает RecipeReadSerializer и FastRecipeListSerializer "
+        "на страницах списка рецептов: стоимость одного рецепта только "
+        "сериализации и вместе с запросами и рендером JSON. Падает, если "
+        "JSON быстрого сериализатора отличается хотя бы байтом."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes", nargs="+", type=int, default=[6, 50, 500],
+            help="размеры страниц",
+        )
+        parser.add_argument(
+            "--repeat", type=int, default=20,
+            help="сколько раз повторить каждый замер",
+        )
+        parser.add_argument(
+            "--user", type=int,
+            help="id пользователя, от имени которого строится список; "
+                 "по умолчанию пользователь с самым большим избранным",
+        )
+
+    def get_view(self, user):
+        if user is None:
+            profile = Profile.objects.annotate(
+                favorites_count=Count("favorite_recipes")
+            ).order_by("-favorites_count").first()
+        else:
+            profile = Profile.objects.filter(pk=user).first()
+        if profile is None:
+            raise CommandError("Нет пользователя для проверки.")
+        request = Request(APIRequestFactory().get("/api/recipes/"))
+        request.user = profile
+        view = RecipeViewSet(
+            action="list", request=request, format_kwarg=None, kwargs={}
+        )
+        return view
+
+    @staticmethod
+    def measure(func, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = func()
+            timings.append(time.perf_counter() - start)
+        return result, median(timings)
+
+    def handle(self, *args, sizes=(6, 50, 500), repeat=20, user=None,
+               **options):
+        if repeat < 1 or min(sizes) < 1:
+            raise CommandError("Нужны --repeat ≥ 1 и --sizes ≥ 1.")
+        view = self.get_view(user)
+        context = view.get_serializer_context()
+        queryset = view.get_queryset()
+        rows_queryset = fast_recipe_list_serializer.get_queryset(queryset)
+        renderer = JSONRenderer()
+
+        for size in sizes:
+            recipes = list(queryset[:size])
+            if len(recipes) < size:
+                self.stderr.write(
+                    f"В базе {len(recipes)} рецептов, страница {size} "
+                    "пропущена: запустите seed_benchmark_data."
+                )
+                continue
+            rows = list(rows_queryset[:size])
+            related = fast_recipe_list_serializer.load_related(
+                [row["id"] for row in rows]
+            )
+
+            drf_data, drf = self.measure(
+                lambda: RecipeReadSerializer(
+                    recipes, many=True, context=context
+                ).data,
+                repeat,
+            )
+            fast_data, fast = self.measure(
+                lambda: fast_recipe_list_serializer.serialize(
+                    rows, context, related
+                ),
+                repeat,
+            )
+            if renderer.render(drf_data) != renderer.render(fast_data):
+                raise CommandError(
+                    f"Страница {size}: JSON быстрого сериализатора "
+                    "отличается от RecipeReadSerializer."
+                )
+            _, drf_total = self.measure(
+                lambda: renderer.render(RecipeReadSerializer(
+                    list(queryset[:size]), many=True, context=context
+                ).data),
+                repeat,
+            )
+            _, fast_total = self.measure(
+                lambda: renderer.render(fast_recipe_list_serializer.serialize(
+                    list(rows_queryset[:size]), context
+                )),
+                repeat,
+            )
+            self.stdout.write(
+                f"{size:>4} рецептов: сериализация {drf / size * 1e6:>7.1f}"
+                f" → {fast / size * 1e6:>6.1f} мкс/рецепт "
+                f"(×{drf / fast:.1f}); с запросами и JSON "
+                f"{drf_total / size * 1e6:>7.1f} → "
+                f"{fast_total / size * 1e6:>6.1f} мкс/рецепт "
+                f"(×{drf_total / fast_total:.1f})"
+            )
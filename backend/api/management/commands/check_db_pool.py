@@ -0,0 +1,154 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, close_old_connections, connections
+from recipes.models import Tag
+
+TERMINATE_TIMEOUT = 5
+
+
+class Command(BaseCommand):
+    help = (
+        "Проверяет пул соединений (DB_POOL_SIZE) на PostgreSQL: потоки "
+        "выполняют короткие запросы, как TagViewSet, и возвращают "
+        "соединение в пул после каждого, как в конце HTTP-запроса. "
+        "Затем свободные соединения пула обрываются на сервере "
+        "(pg_terminate_backend) и нагрузка повторяется: с "
+        "DB_CONN_HEALTH_CHECKS пул должен заменить их без ошибок."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database", default="default")
+        parser.add_argument(
+            "--threads", type=int, default=20,
+            help="число потоков; больше размера пула — будут ожидания",
+        )
+        parser.add_argument(
+            "--requests", type=int, default=50,
+            help="запросов на поток",
+        )
+        parser.add_argument(
+            "--skip-terminate", action="store_true",
+            help="не обрывать соединения пула",
+        )
+
+    def run(self, database, threads, requests):
+        errors = []
+
+        def work():
+            try:
+                for _ in range(requests):
+                    close_old_connections()
+                    try:
+                        list(Tag.objects.using(database))
+                    except DatabaseError as error:
+                        errors.append(str(error).strip())
+                    finally:
+                        close_old_connections()
+            finally:
+                connections[database].close()
+
+        workers = [threading.Thread(target=work) for _ in range(threads)]
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return time.perf_counter() - start, errors
+
+    def report(self, title, elapsed, total, errors, stats):
+        (self.stderr if errors else self.stdout).write(
+            f"{title}: {total} запросов за {elapsed:.2f} с, "
+            f"{total / elapsed:.0f} запросов/с, ошибок {len(errors)}."
+        )
+        for error in sorted(set(errors)):
+            self.stderr.write(f"    {error}")
+        self.stdout.write(
+            f"    соединений {stats['size']} из {stats['max_size']}, "
+            f"занято {stats['in_use']}, свободно {stats['idle']}; "
+            f"выдано {stats['requests']}: повторно {stats['reused']}, "
+            f"новых {stats['created']}"
+        )
+        self.stdout.write(
+            f"    ожиданий {stats['waits']} ({stats['wait_ms']:.0f} мс, "
+            f"максимум {stats['wait_max_ms']:.1f} мс), "
+            f"таймаутов {stats['timeouts']}; подключение в среднем "
+            f"{stats['connect_ms_avg']:.2f} мс, выдача "
+            f"{stats['acquire_ms_avg']:.2f} мс"
+        )
+        self.stdout.write(
+            f"    не прошли проверку {stats['health_check_failures']}, "
+            f"закрыто по простою {stats['expired']}, "
+            f"отброшено {stats['discarded']}"
+        )
+
+    def terminate_idle(self, connection, pool):
+        """Обрывает свободные соединения пула, возвращает их число."""
+        connection.ensure_connection()
+        with pool.condition:
+            pids = [idle.info.backend_pid for idle, _ in pool.idle]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT pg_terminate_backend(pid) FROM unnest(%s) AS pid",
+                [pids],
+            )
+            deadline = time.monotonic() + TERMINATE_TIMEOUT
+            while time.monotonic() < deadline:
+                cursor.execute(
+                    "SELECT count(*) FROM pg_stat_activity "
+                    "WHERE pid = ANY(%s)",
+                    [pids],
+                )
+                if not cursor.fetchone()[0]:
+                    break
+                time.sleep(0.05)
+        connection.close()
+        return len(pids)
+
+    def handle(self, *args, database="default", threads=20, requests=50,
+               skip_terminate=False, **options):
+        if threads < 1 or requests < 1:
+            raise CommandError("Нужны --threads ≥ 1 и --requests ≥ 1.")
+        connection = connections[database]
+        pool = getattr(connection, "pool", None)
+        if pool is None:
+            raise CommandError(
+                "Пул соединений не настроен: задайте DB_POOL_SIZE > 0."
+            )
+        total = threads * requests
+
+        elapsed, errors = self.run(database, threads, requests)
+        stats = pool.get_stats()
+        self.report("Нагрузка", elapsed, total, errors, stats)
+        if stats["size"] > stats["max_size"]:
+            raise CommandError("Пул открыл больше соединений, чем max_size.")
+        if errors:
+            raise CommandError("Запросы через пул завершились с ошибками.")
+        if skip_terminate:
+            return
+
+        failures = stats["health_check_failures"]
+        terminated = self.terminate_idle(connection, pool)
+        elapsed, errors = self.run(database, threads, requests)
+        stats = pool.get_stats()
+        self.report(
+            f"После обрыва {terminated} соединений", elapsed, total, errors,
+            stats,
+        )
+        if not pool.check:
+            self.stdout.write(
+                "Проверка соединений выключена: оборванные соединения "
+                "отбрасываются только после ошибки запроса. Задайте "
+                "DB_CONN_HEALTH_CHECKS, чтобы пул проверял их при выдаче."
+            )
+            return
+        if errors:
+            raise CommandError(
+                "Оборванные соединения дошли до запросов, хотя проверка "
+                "включена."
+            )
+        self.stdout.write(
+            f"Проверку не прошли {stats['health_check_failures'] - failures}"
+            f" из {terminated} оборванных соединений; ошибок нет."
+        )
@@ -0,0 +1,209 @@
+import json
+import secrets
+from contextlib import ExitStack
+from datetime import datetime, timezone
+
+from api.constants import LOAD_TEST_USERNAME_PREFIX
+from api.loadtest import (SCENARIOS, LoadTestError, PostmanCollection,
+                          run_load, running_server)
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from recipes.models import Profile
+
+DEFAULT_COLLECTION = (
+    settings.BASE_DIR.parent / "postman-collection"
+    / "diploma.postman_collection.json"
+)
+DEFAULT_WEIGHTS = ", ".join(
+    f"{scenario.name}={scenario.weight}" for scenario in SCENARIOS
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Нагрузочный тест по запросам Postman-коллекции: виртуальные "
+        "пользователи параллельно выполняют взвешенные сценарии "
+        "(просмотр, избранное, корзина и список покупок, подписки, "
+        "создание рецептов, регистрация) и получают отчёт по каждому "
+        "маршруту: запросы в секунду, p50/p95/p99 и доля ошибок."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--collection", default=str(DEFAULT_COLLECTION),
+            help="путь к Postman-коллекции",
+        )
+        parser.add_argument(
+            "--base-url",
+            help="адрес сервера; по умолчанию baseUrl из коллекции",
+        )
+        parser.add_argument(
+            "--users", type=int, default=10,
+            help="число одновременных виртуальных пользователей",
+        )
+        parser.add_argument(
+            "--duration", type=float, default=60,
+            help="длительность нагрузки после разгона, секунд",
+        )
+        parser.add_argument(
+            "--ramp-up", type=float, default=5,
+            help="за сколько секунд запустить всех пользователей",
+        )
+        parser.add_argument(
+            "--think-time", type=float, default=0,
+            help="средняя пауза между сценариями, секунд",
+        )
+        parser.add_argument(
+            "--weight", action="append", default=[], metavar="NAME=N",
+            help="вес сценария, можно указать несколько раз; "
+                 f"по умолчанию {DEFAULT_WEIGHTS}",
+        )
+        parser.add_argument("--seed", type=int, default=1)
+        parser.add_argument(
+            "--timeout", type=float, default=10,
+            help="таймаут одного запроса, секунд",
+        )
+        parser.add_argument(
+            "--start-server", choices=("runserver", "gunicorn", "uvicorn"),
+            help="запустить сервер на время теста: uvicorn — gunicorn "
+                 "с воркерами uvicorn (ASGI)",
+        )
+        parser.add_argument(
+            "--port", type=int, default=8000,
+            help="порт сервера для --start-server",
+        )
+        parser.add_argument(
+            "--workers", type=int, default=2,
+            help="число воркеров gunicorn и uvicorn",
+        )
+        parser.add_argument(
+            "--threads", type=int, default=1,
+            help="число потоков в воркере gunicorn",
+        )
+        parser.add_argument(
+            "--keep-data", action="store_true",
+            help="не удалять созданных тестом пользователей",
+        )
+        parser.add_argument(
+            "--output", help="файл, куда сохранить отчёт в JSON",
+        )
+
+    def get_scenarios(self, weights):
+        overrides = {}
+        for weight in weights:
+            name, _, value = weight.partition("=")
+            if not value.isdigit():
+                raise CommandError(f"Неверный вес сценария: {weight}.")
+            overrides[name] = int(value)
+        unknown = overrides.keys() - {scenario.name for scenario in SCENARIOS}
+        if unknown:
+            raise CommandError(
+                "Нет таких сценариев: " + ", ".join(sorted(unknown))
+            )
+        scenarios = [
+            scenario._replace(
+                weight=overrides.get(scenario.name, scenario.weight)
+            )
+            for scenario in SCENARIOS
+        ]
+        scenarios = [scenario for scenario in scenarios if scenario.weight]
+        if not scenarios:
+            raise CommandError("У всех сценариев нулевой вес.")
+        return scenarios
+
+    def report(self, routes, scenarios, elapsed):
+        total = sum(route["requests"] for route in routes.values())
+        errors = sum(route["errors"] for route in routes.values())
+        for route, stats in routes.items():
+            line = (
+                f"{route:<70} {stats['requests']:>6} "
+                f"{stats['rps']:>7.1f}/с  p50 {stats['p50_ms']:>8.1f}  "
+                f"p95 {stats['p95_ms']:>8.1f}  p99 {stats['p99_ms']:>8.1f} мс"
+                f"  ошибок {stats['error_rate']:>6.1%}"
+            )
+            if stats["errors"]:
+                statuses = ", ".join(
+                    f"{status}: {count}"
+                    for status, count in stats["statuses"].items()
+                )
+                self.stderr.write(f"{line}  ({statuses})")
+            else:
+                self.stdout.write(line)
+        self.stdout.write(
+            "Сценарии: " + ", ".join(
+                f"{name}={count}" for name, count in scenarios.most_common()
+            )
+        )
+        self.stdout.write(
+            f"Всего: {total} запросов за {elapsed:.0f} с, "
+            f"{total / elapsed:.1f} запросов/с, ошибок "
+            f"{errors / total if total else 0:.2%}."
+        )
+
+    def handle(self, *args, collection, base_url=None, users=10, duration=60,
+               ramp_up=5, think_time=0, weight=(), seed=1, timeout=10,
+               start_server=None, port=8000, workers=2, threads=1,
+               keep_data=False, output=None, **options):
+        self.verbosity = options.get("verbosity", 1)
+        if users < 1 or duration <= 0:
+            raise CommandError("Нужны --users ≥ 1 и --duration > 0.")
+        try:
+            postman = PostmanCollection(collection)
+        except OSError as error:
+            raise CommandError(f"Не удалось прочитать коллекцию: {error}")
+        scenarios = self.get_scenarios(weight)
+
+        username_prefix = f"{LOAD_TEST_USERNAME_PREFIX}{secrets.token_hex(3)}-"
+        try:
+            with ExitStack() as stack:
+                if start_server:
+                    base_url = stack.enter_context(running_server(
+                        start_server, port, settings.BASE_DIR, workers,
+                        threads, verbose=self.verbosity > 1,
+                    ))
+                base_url = base_url or postman.variables["baseUrl"]
+                self.stdout.write(
+                    f"{users} пользователей, {duration:.0f} с, "
+                    f"сервер {base_url}"
+                )
+                stats, errors = run_load(
+                    postman, base_url.rstrip("/"), users, duration, ramp_up,
+                    scenarios, username_prefix, seed, timeout, think_time,
+                )
+        except LoadTestError as error:
+            raise CommandError(str(error))
+        finally:
+            if not keep_data:
+                Profile.objects.filter(
+                    username__startswith=username_prefix
+                ).delete()
+
+        for error in errors:
+            self.stderr.write(error)
+        elapsed = ramp_up + duration
+        routes = stats.summary(elapsed)
+        if not routes:
+            raise CommandError("Ни один сценарий не выполнен.")
+        self.report(routes, stats.scenarios, elapsed)
+        if output:
+            with open(output, "w", encoding="utf-8") as file:
+                json.dump(
+                    {
+                        "created": datetime.now(timezone.utc).isoformat(),
+                        "base_url": base_url,
+                        "server": start_server,
+                        "workers": workers if start_server else None,
+                        "users": users,
+                        "duration": duration,
+                        "ramp_up": ramp_up,
+                        "weights": {
+                            scenario.name: scenario.weight
+                            for scenario in scenarios
+                        },
+                        "scenarios": dict(stats.scenarios),
+                        "setup_errors": errors,
+                        "routes": routes,
+                    },
+                    file, ensure_ascii=False, indent=2,
+                )
+            self.stdout.write(f"Отчёт сохранён в {output}.")
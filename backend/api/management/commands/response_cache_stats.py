@@ -0,0 +1,27 @@
+from api.response_cache import recipe_response_cache
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = (
+        "Показывает попадания и промахи кеша ответов рецептов "
+        "для анонимных запросов."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--reset", action="store_true",
+            help="обнулить счётчики после вывода",
+        )
+
+    def handle(self, *args, reset=False, **options):
+        hits, misses = recipe_response_cache.stats()
+        total = hits + misses
+        ratio = hits / total if total else 0
+        self.stdout.write(
+            f"Попаданий: {hits}, промахов: {misses}, доля попаданий: "
+            f"{ratio:.1%}"
+        )
+        if reset:
+            recipe_response_cache.reset_stats()
+            self.stdout.write(self.style.SUCCESS("Счётчики обнулены."))
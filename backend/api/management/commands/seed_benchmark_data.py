@@ -0,0 +1,374 @@
+import random
+from collections import defaultdict
+from datetime import datetime, timedelta
+from itertools import islice
+
+from api.constants import (BENCHMARK_PASSWORD, BENCHMARK_USERNAME_PREFIX,
+                           FEED_BACKFILL_LIMIT)
+from api.cookable_index import cookable_index
+from api.filters import invalidate_tag_slugs
+from api.ingredient_index import ingredient_index
+from api.response_cache import recipe_response_cache
+from api.search import rebuild_search_index
+from api.views import ingredient_catalog, tag_catalog
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from recipes.models import (FeedEntry, Ingredient, IngredientAmount, Profile,
+                            ProfileFavorite, Recipe, RecipeTag,
+                            ShoppingListItem, Tag, tag_mask)
+
+BATCH_SIZE = 2000
+
+SCALES = {
+    "small": {
+        "users": 50,
+        "recipes": 500,
+        "ingredients": 300,
+        "ingredients_per_recipe": 6,
+        "follows": 5,
+        "favorites": 20,
+        "cart": 5,
+    },
+    "medium": {
+        "users": 500,
+        "recipes": 10000,
+        "ingredients": 1000,
+        "ingredients_per_recipe": 8,
+        "follows": 20,
+        "favorites": 100,
+        "cart": 10,
+    },
+    "large": {
+        "users": 5000,
+        "recipes": 100000,
+        "ingredients": 2000,
+        "ingredients_per_recipe": 10,
+        "follows": 20,
+        "favorites": 300,
+        "cart": 20,
+    },
+}
+
+DEFAULT_TAGS = (
+    ("Завтрак", "#E26C2D", "breakfast"),
+    ("Обед", "#49B64E", "lunch"),
+    ("Ужин", "#8775D2", "dinner"),
+)
+DISHES = (
+    "суп", "салат", "омлет", "пирог", "рагу", "плов", "каша", "запеканка",
+    "паста", "котлеты", "блины", "суфле", "жаркое", "борщ", "соус",
+)
+STYLES = (
+    "по-домашнему", "на скорую руку", "по-летнему", "с пряностями",
+    "по-праздничному", "по-деревенски", "с зелёным луком", "в духовке",
+    "на сковороде", "по-бабушкиному",
+)
+
+
+def batched(objects, size=BATCH_SIZE):
+    objects = iter(objects)
+    while True:
+        batch = list(islice(objects, size))
+        if not batch:
+            return
+        yield batch
+
+
+class Command(BaseCommand):
+    help = (
+        "Заполняет базу воспроизводимым синтетическим набором данных "
+        "для замеров API: пользователи, рецепты, подписки, избранное, "
+        "корзины, ленты и списки покупок. Размер задаётся --scale, "
+        "отдельные параметры переопределяют его."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--scale", choices=SCALES, default="small",
+            help="готовый размер набора",
+        )
+        parser.add_argument(
+            "--seed", type=int, default=1,
+            help="зерно генератора: один seed — одинаковый набор",
+        )
+        parser.add_argument(
+            "--clear", action="store_true",
+            help="удалить прежний набор (пользователей "
+                 f"{BENCHMARK_USERNAME_PREFIX}*) перед загрузкой",
+        )
+        for name, help_text in (
+            ("users", "число пользователей"),
+            ("recipes", "число рецептов"),
+            ("ingredients", "размер справочника ингредиентов"),
+            ("ingredients_per_recipe", "ингредиентов в рецепте, в среднем"),
+            ("follows", "подписок у пользователя"),
+            ("favorites", "рецептов в избранном у пользователя"),
+            ("cart", "рецептов в корзине у пользователя"),
+        ):
+            parser.add_argument(
+                "--" + name.replace("_", "-"), type=int, dest=name,
+                help=help_text,
+            )
+
+    def handle(self, *args, scale="small", seed=1, clear=False, **options):
+        params = {
+            name: options.get(name) if options.get(name) is not None
+            else default
+            for name, default in SCALES[scale].items()
+        }
+        if params["users"] < 1 or params["recipes"] < 1:
+            raise CommandError("Нужен хотя бы один пользователь и рецепт.")
+
+        previous = Profile.objects.filter(
+            username__startswith=BENCHMARK_USERNAME_PREFIX
+        )
+        if previous.exists():
+            if not clear:
+                raise CommandError(
+                    "Набор для замеров уже загружен. Запустите с --clear, "
+                    "чтобы пересоздать его."
+                )
+            with transaction.atomic():
+                previous.delete()
+            self.stdout.write("Прежний набор удалён.")
+
+        rng = random.Random(seed)
+        with transaction.atomic():
+            tag_ids = self.get_tags()
+            ingredient_ids = self.get_ingredients(params["ingredients"])
+            user_ids = self.create_users(params["users"])
+            recipes = self.create_recipes(
+                rng, user_ids, tag_ids, ingredient_ids, params
+            )
+            recipe_ids = list(recipes)
+            follows = self.create_follows(rng, user_ids, params["follows"])
+            self.create_favorites(
+                rng, user_ids, recipe_ids, params["favorites"]
+            )
+            self.create_cart(rng, user_ids, recipe_ids, params["cart"])
+            self.create_feeds(follows, recipes)
+            ShoppingListItem.objects.rebuild(user_ids)
+            rebuild_search_index(recipe_ids)
+
+            for invalidate in (
+                recipe_response_cache.invalidate,
+                tag_catalog.invalidate,
+                ingredient_catalog.invalidate,
+                ingredient_index.invalidate,
+                invalidate_tag_slugs,
+                cookable_index.invalidate,
+            ):
+                invalidate()
+
+        self.stdout.write(self.style.SUCCESS(
+            "Загружено: " + ", ".join(
+                f"{name}={value}" for name, value in params.items()
+            ) + f", seed={seed}."
+        ))
+
+    def get_tags(self):
+        if not Tag.objects.exists():
+            Tag.objects.bulk_create(
+                Tag(name=name, color=color, slug=slug)
+                for name, color, slug in DEFAULT_TAGS
+            )
+        return list(Tag.objects.order_by("id").values_list("id", flat=True))
+
+    def get_ingredients(self, count):
+        """Первые count ингредиентов справочника, недостающие создаются."""
+        existing = Ingredient.objects.count()
+        if existing < count:
+            Ingredient.objects.bulk_create(
+                (
+                    Ingredient(name=f"ингредиент {number}",
+                               measurement_unit="г")
+                    for number in range(existing + 1, count + 1)
+                ),
+                batch_size=BATCH_SIZE,
+            )
+        return list(
+            Ingredient.objects.order_by("id").values_list(
+                "id", flat=True
+            )[:count]
+        )
+
+    def create_users(self, count):
+        password = make_password(BENCHMARK_PASSWORD)
+        Profile.objects.bulk_create(
+            (
+                Profile(
+                    username=f"{BENCHMARK_USERNAME_PREFIX}{number}",
+                    email=f"{BENCHMARK_USERNAME_PREFIX}{number}@example.com",
+                    first_name="Пользователь",
+                    last_name=str(number),
+                    password=password,
+                )
+                for number in range(count)
+            ),
+            batch_size=BATCH_SIZE,
+        )
+        return list(
+            Profile.objects.filter(
+                username__startswith=BENCHMARK_USERNAME_PREFIX
+            ).order_by("id").values_list("id", flat=True)
+        )
+
+    def create_recipes(self, rng, user_ids, tag_ids, ingredient_ids, params):
+        """Рецепты со случайными авторами, датами, тегами и ингредиентами.
+
+        Возвращает {id: (author_id, pub_date)} в порядке создания.
+        """
+        per_recipe = params["ingredients_per_recipe"]
+        start = timezone.make_aware(datetime(2024, 1, 1))
+        rows = []
+        for number in range(params["recipes"]):
+            recipe_tags = rng.sample(
+                tag_ids, rng.randint(1, min(3, len(tag_ids)))
+            )
+            recipe_ingredients = rng.sample(
+                ingredient_ids,
+                min(
+                    len(ingredient_ids),
+                    rng.randint(
+                        max(1, per_recipe - per_recipe // 2),
+                        per_recipe + per_recipe // 2,
+                    ),
+                ),
+            )
+            rows.append((
+                rng.choice(user_ids),
+                start + timedelta(seconds=rng.randrange(365 * 24 * 60 * 60)),
+                f"{rng.choice(DISHES).capitalize()} "
+                f"{rng.choice(STYLES)} №{number}",
+                recipe_tags,
+                recipe_ingredients,
+                rng.randint(5, 180),
+            ))
+
+        for batch in batched(rows):
+            Recipe.objects.bulk_create(
+                Recipe(
+                    author_id=author_id,
+                    name=name,
+                    text=f"{name}: смешать ингредиенты и готовить "
+                         f"{cooking_time} минут.",
+                    cooking_time=cooking_time,
+                    image="recipes/benchmark.png",
+                    image_variants_source="recipes/benchmark.png",
+                    tag_mask=tag_mask(recipe_tags),
+                )
+                for author_id, _, name, recipe_tags, _, cooking_time in batch
+            )
+        recipe_ids = list(
+            Recipe.objects.filter(author_id__in=user_ids).order_by(
+                "id"
+            ).values_list("id", flat=True)
+        )
+
+        # auto_now_add перезаписывает дату при вставке.
+        Recipe.objects.bulk_update(
+            (
+                Recipe(id=recipe_id, pub_date=row[1])
+                for recipe_id, row in zip(recipe_ids, rows)
+            ),
+            ["pub_date"],
+            batch_size=BATCH_SIZE // 2,
+        )
+        self.bulk_insert(
+            RecipeTag,
+            (
+                RecipeTag(recipe_id=recipe_id, tag_id=tag_id)
+                for recipe_id, row in zip(recipe_ids, rows)
+                for tag_id in row[3]
+            ),
+        )
+        self.bulk_insert(
+            IngredientAmount,
+            (
+                IngredientAmount(
+                    recipe_id=recipe_id,
+                    ingredient_id=ingredient_id,
+                    amount=rng.randint(1, 500),
+                )
+                for recipe_id, row in zip(recipe_ids, rows)
+                for ingredient_id in row[4]
+            ),
+        )
+        return {
+            recipe_id: (row[0], row[1])
+            for recipe_id, row in zip(recipe_ids, rows)
+        }
+
+    def create_follows(self, rng, user_ids, count):
+        follows = {
+            user_id: rng.sample(
+                [other for other in user_ids if other != user_id],
+                min(count, len(user_ids) - 1),
+            )
+            for user_id in user_ids
+        }
+        self.bulk_insert(
+            Profile.following.through,
+            (
+                Profile.following.through(
+                    from_profile_id=user_id, to_profile_id=author_id
+                )
+                for user_id, author_ids in follows.items()
+                for author_id in author_ids
+            ),
+        )
+        return follows
+
+    def create_favorites(self, rng, user_ids, recipe_ids, count):
+        self.bulk_insert(
+            ProfileFavorite,
+            (
+                ProfileFavorite(user_id=user_id, recipe_id=recipe_id)
+                for user_id in user_ids
+                for recipe_id in rng.sample(
+                    recipe_ids, min(count, len(recipe_ids))
+                )
+            ),
+        )
+
+    def create_cart(self, rng, user_ids, recipe_ids, count):
+        self.bulk_insert(
+            Profile.shopping_cart.through,
+            (
+                Profile.shopping_cart.through(
+                    profile_id=user_id, recipe_id=recipe_id
+                )
+                for user_id in user_ids
+                for recipe_id in rng.sample(
+                    recipe_ids, min(count, len(recipe_ids))
+                )
+            ),
+        )
+
+    def create_feeds(self, follows, recipes):
+        """Ленты, как после подписки: последние рецепты каждого автора."""
+        by_author = defaultdict(list)
+        for recipe_id, (author_id, pub_date) in recipes.items():
+            by_author[author_id].append((pub_date, recipe_id))
+        for author_id, author_recipes in by_author.items():
+            author_recipes.sort(reverse=True)
+            del author_recipes[FEED_BACKFILL_LIMIT:]
+
+        self.bulk_insert(
+            FeedEntry,
+            (
+                FeedEntry(
+                    user_id=user_id, recipe_id=recipe_id, pub_date=pub_date
+                )
+                for user_id, author_ids in follows.items()
+                for author_id in author_ids
+                for pub_date, recipe_id in by_author[author_id]
+            ),
+        )
+
+    @staticmethod
+    def bulk_insert(model, objects):
+        for batch in batched(objects):
+            model.objects.bulk_create(batch)
@@ -0,0 +1,82 @@
+import asyncio
+import logging
+
+from asgiref.sync import markcoroutinefunction
+from django.conf import settings
+from django.urls import reverse
+
+from .querystats import QueryBudgetExceeded, capture_queries, get_view_budget
+
+logger = logging.getLogger("api.queries")
+
+
+class QueryStatsMiddleware:
+    """Учёт числа и времени SQL-запросов для эндпоинтов api.urls.
+
+    Превышение бюджета действия пишется в лог, а при
+    QUERY_BUDGET_ENFORCE ещё и роняет запрос QueryBudgetExceeded.
+    Работает и под ASGI: синхронный middleware заставил бы Django
+    выполнять всю цепочку в одном общем потоке.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.api_prefix = None
+        if asyncio.iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def is_api_request(self, request):
+        if self.api_prefix is None:
+            self.api_prefix = reverse("api-root")
+        return request.path.startswith(self.api_prefix)
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        if not self.is_api_request(request):
+            return self.get_response(request)
+
+        with capture_queries() as stats:
+            response = self.get_response(request)
+        return self.process_stats(request, response, stats)
+
+    async def __acall__(self, request):
+        if not self.is_api_request(request):
+            return await self.get_response(request)
+
+        with capture_queries() as stats:
+            response = await self.get_response(request)
+        return self.process_stats(request, response, stats)
+
+    def process_stats(self, request, response, stats):
+        view, budget = None, None
+        match = request.resolver_match
+        if match is not None:
+            view, budget = get_view_budget(match.func, request.method)
+
+        response["X-DB-Query-Count"] = stats.count
+        response["X-DB-Query-Time"] = stats.duration_ms
+
+        exceeded = budget is not None and stats.count > budget
+        logger.log(
+            logging.WARNING if exceeded else logging.INFO,
+            "method=%s path=%s view=%s status=%s queries=%s "
+            "sql_ms=%s budget=%s",
+            request.method, request.path, view, response.status_code,
+            stats.count, stats.duration_ms, budget,
+            extra={
+                "view": view,
+                "queries": stats.count,
+                "sql_ms": stats.duration_ms,
+                "budget": budget,
+            },
+        )
+        if exceeded and settings.QUERY_BUDGET_ENFORCE:
+            raise QueryBudgetExceeded(
+                f"{view}: выполнено {stats.count} запросов "
+                f"при бюджете {budget}."
+            )
+        return response
@@ -1,5 +1,11 @@
+from django.conf import settings
+from django.db import OperationalError, connections
 from recipes.models import Ingredient
 from rest_framework import filters, mixins, viewsets
+from rest_framework.permissions import SAFE_METHODS
+
+from .db_routing import (choose_replica, is_pinned, mark_unavailable,
+                         pin_to_primary, read_database, use_database)
 
 
 class IngredientMixin:
@@ -19,3 +25,47 @@ class TagIngredientMixin(
     filter_backends = (filters.SearchFilter,)
     search_fields = ('^name',)
     pagination_class = None
+    query_budgets = {"list": 2, "retrieve": 2}
+
+
+class ReplicaReadMixin:
+    """Чтение GET- и HEAD-запросов с реплики (DATABASE_REPLICAS).
+
+    После успешной записи пользователь читает из основной базы
+    REPLICA_PIN_SECONDS. Если реплика не отвечает, она пропускается
+    REPLICA_RETRY_SECONDS, а запрос повторяется на другой реплике
+    или в основной базе. Пользователь по токену ищется в основной
+    базе, чтобы новый токен сразу работал.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        with use_database(None):
+            try:
+                return super().dispatch(request, *args, **kwargs)
+            except OperationalError:
+                replica = read_database.get()
+                if replica is None or not connections[
+                    replica
+                ].errors_occurred:
+                    raise
+                mark_unavailable(replica)
+                read_database.set(None)
+            return super().dispatch(request, *args, **kwargs)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if (
+            settings.DATABASE_REPLICAS and request.method in SAFE_METHODS
+            and not is_pinned(request, request.user.pk)
+        ):
+            read_database.set(choose_replica())
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        if (
+            settings.DATABASE_REPLICAS
+            and request.method not in SAFE_METHODS
+            and response.status_code < 400
+            and request.user.is_authenticated
+        ):
+            pin_to_primary(response, request.user.pk)
+        return super().finalize_response(request, response, *args, **kwargs)
@@ -1,5 +1,23 @@
+import binascii
+import hashlib
+import json
+import uuid
+from base64 import urlsafe_b64decode as b64decode
+from base64 import urlsafe_b64encode as b64encode
+from collections import OrderedDict
+from datetime import datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connections, transaction
+from django.db.models import Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.pagination import (LimitOffsetPagination,
                                        PageNumberPagination, _positive_int)
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 
 class CustomPagination(LimitOffsetPagination):
@@ -19,6 +37,311 @@ class CustomPagination(LimitOffsetPagination):
             return 0
 
 
-class PageNumberAsLimitOffset(PageNumberPagination):
+class CountVersion:
+    """Версия закешированных COUNT(*) выборок из одной таблицы.
+
+    Меняется после фиксации записи в таблицу, и старые счётчики больше
+    не читаются. С on_update=False версию меняют только создание
+    и удаление строк.
+    """
+
+    def __init__(self, label, on_update=True):
+        self.label = label
+        self.on_update = on_update
+
+    @property
+    def key(self):
+        return f"count:{self.label}:version"
+
+    def get(self):
+        version = cache.get(self.key)
+        if version is None:
+            version = uuid.uuid4().hex
+            if not cache.add(
+                self.key, version, settings.PAGINATION_COUNT_CACHE_TIMEOUT
+            ):
+                version = cache.get(self.key)
+        return version
+
+    def invalidate(self, created=None, **kwargs):
+        if created is False and not self.on_update:
+            return
+        transaction.on_commit(lambda: cache.set(
+            self.key, uuid.uuid4().hex,
+            settings.PAGINATION_COUNT_CACHE_TIMEOUT,
+        ))
+
+
+recipe_counts = CountVersion("recipes.recipe")
+# Профиль сохраняется при каждом входе, а число профилей от этого
+# не меняется.
+profile_counts = CountVersion("recipes.profile", on_update=False)
+COUNT_VERSIONS = {
+    version.label: version for version in (recipe_counts, profile_counts)
+}
+
+
+def load_estimate(connection, table):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT reltuples::bigint FROM pg_class WHERE relname = %s",
+            [table],
+        )
+        row = cursor.fetchone()
+    return row[0] if row and row[0] >= 0 else -1
+
+
+def estimate_count(queryset):
+    """Оценка числа строк таблицы по статистике планировщика PostgreSQL.
+
+    Оценка кешируется на PAGINATION_COUNT_ESTIMATE_TIMEOUT: статистика
+    меняется медленно, а запрос к pg_class не должен идти с каждой
+    страницей. Возвращает None, если запрос не охватывает всю таблицу
+    или база данных не PostgreSQL.
+    """
+    connection = connections[queryset.db]
+    query = queryset.query
+    if connection.vendor != "postgresql" or query.where or query.distinct:
+        return None
+    table = queryset.model._meta.db_table
+    estimate = cache.get_or_set(
+        f"count:{table}:estimate",
+        lambda: load_estimate(connection, table),
+        settings.PAGINATION_COUNT_ESTIMATE_TIMEOUT,
+    )
+    return estimate if estimate >= 0 else None
+
+
+class CachedCountMixin:
+    """Кеширует COUNT(*) пагинации на короткое время.
+
+    Ключ строится из версии таблицы (COUNT_VERSIONS), пути,
+    пользователя и нормализованных параметров фильтрации (без
+    параметров самой пагинации); выборки из таблиц без версии
+    не кешируются. Выборки по записям самого пользователя
+    (personal_params, свои рецепты) тоже: после его же записи счётчик
+    разошёлся бы со страницами. Для запросов по всей таблице больше
+    PAGINATION_COUNT_ESTIMATE_THRESHOLD строк вместо COUNT(*) берётся
+    оценка планировщика.
+    """
+
+    cache_count = True
+    pagination_params = ("page", "limit", "offset", "cursor", "count")
+    personal_params = ("is_favorited", "is_in_shopping_cart")
+
+    def get_count_cache_key(self, request, version):
+        params = sorted(
+            (key, sorted(request.query_params.getlist(key)))
+            for key in request.query_params
+            if key not in self.pagination_params
+        )
+        raw = json.dumps(
+            [version.get(), request.path, request.user.id, params]
+        )
+        return "count:" + hashlib.md5(raw.encode()).hexdigest()
+
+    def is_personal(self, request):
+        params = request.query_params
+        return request.user.is_authenticated and (
+            any(param in params for param in self.personal_params)
+            or str(request.user.id) in params.getlist("author")
+        )
+
+    def get_count(self, queryset):
+        version = COUNT_VERSIONS.get(queryset.model._meta.label_lower)
+        if (
+            not self.cache_count or version is None
+            or self.is_personal(self.request)
+        ):
+            return queryset.count()
+
+        estimate = estimate_count(queryset)
+        if (
+            estimate is not None
+            and estimate >= settings.PAGINATION_COUNT_ESTIMATE_THRESHOLD
+        ):
+            return estimate
+
+        return cache.get_or_set(
+            self.get_count_cache_key(self.request, version),
+            queryset.count,
+            settings.PAGINATION_COUNT_CACHE_TIMEOUT,
+        )
+
+
+class CountPaginator(Paginator):
+
+    def __init__(self, *args, get_count=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.get_count = get_count
+
+    @cached_property
+    def count(self):
+        if self.get_count is None:
+            return super().count
+        return self.get_count(self.object_list)
+
+
+class CachedCountLimitOffsetPagination(
+    CachedCountMixin, LimitOffsetPagination
+):
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        return super().paginate_queryset(queryset, request, view)
+
+
+class PageNumberAsLimitOffset(CachedCountMixin, PageNumberPagination):
     page_size_query_param = "limit"
     page_size = 6
+
+    def django_paginator_class(self, object_list, per_page):
+        return CountPaginator(
+            object_list, per_page,
+            get_count=self.get_count if self.cache_count else None,
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        return super().paginate_queryset(queryset, request, view)
+
+
+class PageNumberOrCursorPagination(PageNumberAsLimitOffset):
+    """Постраничная пагинация с необязательным режимом курсора.
+
+    Без параметра cursor работает как PageNumberAsLimitOffset. С ним
+    (в том числе пустым) страницы выбираются по ключу (pub_date, id)
+    без OFFSET, а COUNT(*) выполняется только при count=1. Курсор
+    не совмещается с параметрами ranked_params: их выдача упорядочена
+    по релевантности, а не по ключу курсора.
+    """
+
+    cursor_query_param = "cursor"
+    count_query_param = "count"
+    ranked_params = ("search",)
+    ordering = ("-pub_date", "-id")
+    invalid_cursor_message = "Некорректный курсор."
+    ranked_cursor_message = (
+        "Курсор нельзя совмещать с поиском: результаты поиска "
+        "упорядочены по релевантности. Используйте page."
+    )
+
+    def use_cursor(self, request):
+        return self.cursor_query_param in request.query_params
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_mode = self.use_cursor(request)
+        if not self.cursor_mode:
+            return super().paginate_queryset(queryset, request, view)
+
+        if any(
+            request.query_params.get(param) for param in self.ranked_params
+        ):
+            raise ValidationError(
+                {self.cursor_query_param: [self.ranked_cursor_message]}
+            )
+
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.count = None
+        if request.query_params.get(self.count_query_param) == "1":
+            self.count = self.get_count(queryset)
+
+        position, reverse = self.decode_cursor(request)
+        ordering = self.ordering
+        if reverse:
+            ordering = tuple(field.lstrip("-") for field in ordering)
+        if position is not None:
+            pub_date, pk = position
+            if reverse:
+                queryset = queryset.filter(
+                    Q(pub_date__gt=pub_date) | Q(pub_date=pub_date, pk__gt=pk)
+                )
+            else:
+                queryset = queryset.filter(
+                    Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, pk__lt=pk)
+                )
+
+        results = list(queryset.order_by(*ordering)[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+            self.has_next = position is not None
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = position is not None
+
+        self.page = results
+        return results
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            data = json.loads(b64decode(encoded.encode("ascii")))
+            position = (datetime.fromisoformat(data["p"]), int(data["i"]))
+            return position, bool(data.get("r"))
+        except (TypeError, ValueError, KeyError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, recipe, reverse):
+        if isinstance(recipe, dict):
+            pub_date, pk = recipe["pub_date"], recipe["id"]
+        else:
+            pub_date, pk = recipe.pub_date, recipe.pk
+        data = {"p": pub_date.isoformat(), "i": pk}
+        if reverse:
+            data["r"] = 1
+        encoded = b64encode(json.dumps(data).encode()).decode("ascii")
+        return replace_query_param(
+            self.base_url, self.cursor_query_param, encoded
+        )
+
+    def get_next_link(self):
+        if not self.cursor_mode:
+            return super().get_next_link()
+        if not (self.has_next and self.page):
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.cursor_mode:
+            return super().get_previous_link()
+        if not (self.has_previous and self.page):
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        if not self.cursor_mode:
+            return super().get_paginated_response(data)
+        response = OrderedDict()
+        if self.count is not None:
+            response["count"] = self.count
+        response["next"] = self.get_next_link()
+        response["previous"] = self.get_previous_link()
+        response["results"] = data
+        return Response(response)
+
+
+class FeedPagination(PageNumberOrCursorPagination):
+    """Ленту всегда листаем курсором по (pub_date, id) записи ленты.
+
+    Лента у каждого пользователя своя и меняется с каждым рецептом
+    его авторов, поэтому её счётчик не кешируется.
+    """
+
+    cache_count = False
+    ranked_params = ()
+
+    def use_cursor(self, request):
+        return True
+
+
+class RankedListPagination(PageNumberAsLimitOffset):
+    """Постраничная выдача уже упорядоченного списка в памяти."""
+
+    cache_count = False
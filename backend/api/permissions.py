@@ -7,7 +7,7 @@ class IsAuthorOrReadOnly(permissions.IsAuthenticatedOrReadOnly):
 
         return (
             request.method in permissions.SAFE_METHODS
-            or obj.author == request.user
+            or obj.author_id == request.user.id
         )
 
 
@@ -0,0 +1,91 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import connections
+
+current_stats = ContextVar("current_query_stats", default=None)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class QueryStats:
+    """Счётчик SQL-запросов и их суммарного времени."""
+
+    def __init__(self, parent=None):
+        self.count = 0
+        self.duration = 0.0
+        self.parent = parent
+
+    def add(self, duration):
+        stats = self
+        while stats is not None:
+            stats.count += 1
+            stats.duration += duration
+            stats = stats.parent
+
+    @property
+    def duration_ms(self):
+        return round(self.duration * 1000, 2)
+
+
+def count_query(execute, sql, params, many, context):
+    stats = current_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.add(time.perf_counter() - start)
+
+
+def install_query_counter(connection, **kwargs):
+    if count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_query)
+
+
+@contextmanager
+def capture_queries():
+    """Считает запросы текущего контекста.
+
+    Счётчик хранится в contextvar, поэтому учитываются и запросы,
+    выполненные в потоках sync_to_async (у них свои соединения).
+    Вложенные замеры учитывают запрос каждый.
+    """
+    for connection in connections.all():
+        install_query_counter(connection)
+    stats = QueryStats(current_stats.get())
+    token = current_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        current_stats.reset(token)
+
+
+@contextmanager
+def query_budget(budget):
+    """Вспомогательная функция для тестов: падает при превышении бюджета."""
+
+    with capture_queries() as stats:
+        yield stats
+    if stats.count > budget:
+        raise QueryBudgetExceeded(
+            f"Выполнено {stats.count} запросов при бюджете {budget}."
+        )
+
+
+def get_view_budget(view_func, method):
+    view_class = getattr(view_func, "cls", None)
+    if view_class is None:
+        return getattr(view_func, "__name__", None), None
+
+    actions = getattr(view_func, "actions", None) or {}
+    action = actions.get(method.lower())
+    if action is None:
+        return view_class.__name__, None
+
+    budgets = getattr(view_class, "query_budgets", {})
+    return f"{view_class.__name__}.{action}", budgets.get(action)
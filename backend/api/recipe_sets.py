@@ -0,0 +1,111 @@
+import uuid
+from array import array
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from recipes.models import Profile, ProfileFavorite
+
+from .db_routing import use_primary
+
+
+class UserRecipeIds:
+    """Множество id рецептов пользователя (избранное или корзина).
+
+    Загружается из базы одним запросом и хранится в кеше упакованным
+    массивом под ключом с версией пользователя. Любое изменение связей
+    после фиксации транзакции меняет версию, а не правит множество:
+    так параллельные записи не теряются, а загрузка, начатая до
+    изменения, попадает под старый ключ, который больше не читается.
+    Множество живёт USER_RECIPE_IDS_TIMEOUT секунд, что ограничивает
+    устаревание, если кеш не общий для процессов.
+    """
+
+    def __init__(self, name, through, user_field):
+        self.name = name
+        self.through = through
+        self.user_field = user_field
+
+    def get_version_key(self, user_id):
+        return f"user:{user_id}:{self.name}:version"
+
+    def get_version(self, user_id):
+        key = self.get_version_key(user_id)
+        version = cache.get(key)
+        if version is None:
+            version = uuid.uuid4().hex
+            if not cache.add(key, version, None):
+                version = cache.get(key)
+        return version
+
+    def get_key(self, user_id):
+        return f"user:{user_id}:{self.name}:{self.get_version(user_id)}"
+
+    @staticmethod
+    def pack(recipe_ids):
+        return array("q", sorted(recipe_ids)).tobytes()
+
+    @staticmethod
+    def unpack(data):
+        recipe_ids = array("q")
+        recipe_ids.frombytes(data)
+        return frozenset(recipe_ids)
+
+    def load(self, user_id):
+        return self.through.objects.filter(
+            **{self.user_field: user_id}
+        ).values_list("recipe_id", flat=True)
+
+    def exists(self, user_id):
+        """Подзапрос EXISTS по связи пользователя для фильтрации."""
+        return Exists(
+            self.through.objects.filter(
+                **{self.user_field: user_id, "recipe": OuterRef("pk")}
+            )
+        )
+
+    def get(self, user_id):
+        if not user_id:
+            return frozenset()
+        key = self.get_key(user_id)
+        data = cache.get(key)
+        if data is None:
+            with use_primary():
+                recipe_ids = frozenset(self.load(user_id))
+            cache.set(
+                key, self.pack(recipe_ids), settings.USER_RECIPE_IDS_TIMEOUT
+            )
+            return recipe_ids
+        return self.unpack(data)
+
+    def invalidate(self, user_ids):
+        versions = {
+            self.get_version_key(user_id): uuid.uuid4().hex
+            for user_id in user_ids
+        }
+        transaction.on_commit(lambda: cache.set_many(versions, None))
+
+    def relation_changed(self, instance, action, reverse, pk_set, **kwargs):
+        if reverse and action == "pre_clear":
+            # После очистки у рецепта уже не узнать его пользователей.
+            self.invalidate(
+                self.through.objects.filter(recipe=instance).values_list(
+                    f"{self.user_field}_id", flat=True
+                )
+            )
+        elif action not in ("post_add", "post_remove", "post_clear"):
+            return
+        elif not reverse:
+            self.invalidate([instance.pk])
+        elif pk_set:
+            self.invalidate(pk_set)
+
+    def row_changed(self, instance, **kwargs):
+        self.invalidate([getattr(instance, f"{self.user_field}_id")])
+
+
+favorite_ids = UserRecipeIds("favorites", ProfileFavorite, "user")
+shopping_cart_ids = UserRecipeIds(
+    "shopping_cart", Profile.shopping_cart.through, "profile"
+)
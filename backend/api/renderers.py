@@ -0,0 +1,153 @@
+import csv
+import io
+import json
+import os
+from abc import ABCMeta, abstractmethod
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+from rest_framework import renderers
+
+from .constants import (PDF_FONT_SIZE, PDF_LINE_HEIGHT, PDF_MARGIN,
+                        STREAM_CHUNK_SIZE)
+
+
+class ShoppingCartRenderer(renderers.BaseRenderer, metaclass=ABCMeta):
+    """Базовый рендерер списка покупок.
+
+    Сам список отдаётся потоково через stream(), render() нужен только
+    для ответов с ошибками (например, 401 без токена).
+    """
+
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, dict):
+            data = "\n".join(f"{key}: {value}" for key, value in data.items())
+        return str(data).encode("utf-8")
+
+    @abstractmethod
+    def stream(self, ingredients):
+        """Итератор частей файла по строкам ингредиентов."""
+
+
+class TextShoppingCartRenderer(ShoppingCartRenderer):
+    media_type = "text/plain"
+    format = "txt"
+
+    def stream(self, ingredients):
+        for ingredient in ingredients:
+            yield (
+                f"{ingredient['name']} ({ingredient['measurement_unit']}) "
+                f"— {ingredient['amount']}\n"
+            )
+
+
+class Echo:
+    """Псевдобуфер для csv.writer: возвращает строку вместо записи."""
+
+    def write(self, value):
+        return value
+
+
+class CSVShoppingCartRenderer(ShoppingCartRenderer):
+    media_type = "text/csv"
+    format = "csv"
+
+    def stream(self, ingredients):
+        writer = csv.writer(Echo())
+        yield writer.writerow(("name", "measurement_unit", "amount"))
+        for ingredient in ingredients:
+            yield writer.writerow((
+                ingredient["name"],
+                ingredient["measurement_unit"],
+                ingredient["amount"],
+            ))
+
+
+class JSONShoppingCartRenderer(ShoppingCartRenderer):
+    media_type = "application/json"
+    format = "json"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data, ensure_ascii=False).encode("utf-8")
+
+    def stream(self, ingredients):
+        separator = "["
+        for ingredient in ingredients:
+            item = {
+                "name": ingredient["name"],
+                "measurement_unit": ingredient["measurement_unit"],
+                "amount": ingredient["amount"],
+            }
+            yield separator + json.dumps(item, ensure_ascii=False)
+            separator = ","
+        yield "[]" if separator == "[" else "]"
+
+
+class PDFShoppingCartRenderer(ShoppingCartRenderer):
+    """PDF собирается в памяти целиком: формат требует таблицу
+    смещений в конце файла, поэтому отдаётся частями после сборки.
+
+    Встроенные шрифты PDF не содержат кириллицы, поэтому без
+    SHOPPING_CART_PDF_FONT рендерер падает, а не рисует пустой список.
+    """
+
+    media_type = "application/pdf"
+    format = "pdf"
+    charset = None
+    font_name = "ShoppingCartFont"
+
+    def get_font(self):
+        if self.font_name in pdfmetrics.getRegisteredFontNames():
+            return self.font_name
+        font_path = settings.SHOPPING_CART_PDF_FONT
+        if not os.path.exists(font_path):
+            raise ImproperlyConfigured(
+                f"Шрифт для PDF списка покупок не найден: {font_path}. "
+                "Задайте SHOPPING_CART_PDF_FONT."
+            )
+        pdfmetrics.registerFont(TTFont(self.font_name, font_path))
+        return self.font_name
+
+    def stream(self, ingredients):
+        # Шрифт проверяется до начала ответа, а не внутри генератора.
+        return self.generate(ingredients, self.get_font())
+
+    def generate(self, ingredients, font):
+        buffer = io.BytesIO()
+        pdf = canvas.Canvas(buffer, pagesize=A4)
+        width, height = A4
+        y = height - PDF_MARGIN
+        pdf.setFont(font, PDF_FONT_SIZE)
+        for ingredient in ingredients:
+            if y < PDF_MARGIN:
+                pdf.showPage()
+                pdf.setFont(font, PDF_FONT_SIZE)
+                y = height - PDF_MARGIN
+            pdf.drawString(
+                PDF_MARGIN, y,
+                f"{ingredient['name']} ({ingredient['measurement_unit']}) "
+                f"— {ingredient['amount']}"
+            )
+            y -= PDF_LINE_HEIGHT
+        pdf.save()
+
+        buffer.seek(0)
+        while True:
+            chunk = buffer.read(STREAM_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+
+SHOPPING_CART_RENDERERS = (
+    TextShoppingCartRenderer,
+    CSVShoppingCartRenderer,
+    JSONShoppingCartRenderer,
+    PDFShoppingCartRenderer,
+)
@@ -0,0 +1,190 @@
+import hashlib
+import json
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.response import Response
+
+from .db_routing import use_primary
+
+GLOBAL_VERSION_KEY = "recipes:response:version"
+LISTS_VERSION_KEY = "recipes:response:lists"
+CHANGES_KEY = "recipes:response:changes"
+HITS_KEY = "recipes:response:hits"
+MISSES_KEY = "recipes:response:misses"
+IGNORED_PROFILE_FIELDS = {"last_login", "password"}
+
+
+def recipe_key(recipe_id):
+    return f"recipes:response:recipe:{recipe_id}"
+
+
+def author_key(author_id):
+    return f"recipes:response:author:{author_id}"
+
+
+class RecipeResponseCache:
+    """Кеш ответов списка и страницы рецепта для анонимных запросов.
+
+    Ответ хранится вместе с версиями рецептов и авторов, из которых
+    он собран, и считается устаревшим, если любая из них сменилась.
+    Создание, удаление рецепта и смена его тегов меняют версию всех
+    списков, правка тегов и ингредиентов справочника — версию всего
+    кеша. Версии меняются после фиксации транзакции.
+
+    Версии меняют и другие процессы (image_worker, команды manage.py),
+    поэтому кеш должен быть общим (см. api.W001); с кешем в памяти
+    процесса их изменения видны только через RESPONSE_CACHE_TIMEOUT.
+    """
+
+    def get_versions(self, keys):
+        versions = cache.get_many(keys)
+        for key in keys:
+            if key not in versions:
+                version = uuid.uuid4().hex
+                if not cache.add(key, version, None):
+                    version = cache.get(key)
+                versions[key] = version
+        return versions
+
+    def bump(self, *keys):
+        def bump_versions():
+            # Счётчик меняется раньше версий: ответ, собранный до
+            # изменения, не будет сохранён с уже новыми версиями.
+            self.count(CHANGES_KEY)
+            cache.set_many(
+                {key: uuid.uuid4().hex for key in keys}, None
+            )
+        transaction.on_commit(bump_versions)
+
+    @staticmethod
+    def get_changes():
+        return cache.get(CHANGES_KEY, 0)
+
+    def invalidate(self, **kwargs):
+        self.bump(GLOBAL_VERSION_KEY)
+
+    def invalidate_recipe(self, recipe_id, lists=False):
+        keys = [recipe_key(recipe_id)]
+        if lists:
+            keys.append(LISTS_VERSION_KEY)
+        self.bump(*keys)
+
+    def recipe_changed(self, instance, **kwargs):
+        self.invalidate_recipe(instance.pk, lists=True)
+
+    def recipe_tag_changed(self, instance, **kwargs):
+        self.invalidate_recipe(instance.recipe_id, lists=True)
+
+    def ingredient_amount_changed(self, instance, **kwargs):
+        self.invalidate_recipe(instance.recipe_id)
+
+    def author_changed(self, instance, update_fields=None, **kwargs):
+        if update_fields and set(update_fields) <= IGNORED_PROFILE_FIELDS:
+            return
+        self.bump(author_key(instance.pk))
+
+    @staticmethod
+    def get_key(request, *prefix_versions):
+        params = sorted(
+            (key, sorted(request.GET.getlist(key))) for key in request.GET
+        )
+        raw = json.dumps([request.get_host(), request.path, params])
+        return "recipes:response:{0}:{1}".format(
+            ":".join(prefix_versions), hashlib.md5(raw.encode()).hexdigest()
+        )
+
+    @staticmethod
+    def get_dependencies(data):
+        recipes = data.get("results", [data]) if isinstance(
+            data, dict
+        ) else data
+        keys = []
+        for recipe in recipes:
+            keys.append(recipe_key(recipe["id"]))
+            keys.append(author_key(recipe["author"]["id"]))
+        return keys
+
+    def get(self, key):
+        entry = cache.get(key)
+        if entry is None:
+            return None
+        versions = cache.get_many(list(entry["versions"]))
+        if versions != entry["versions"]:
+            return None
+        return entry["data"]
+
+    def set(self, key, data, changes):
+        """Сохраняет ответ, если версии не менялись с начала рендера.
+
+        changes — значение get_changes() до рендера. Зависимости
+        известны только по готовым данным, поэтому их версии читаются
+        после рендера; если за это время что-то поменялось, данные
+        могут быть старше прочитанных версий и не сохраняются.
+        """
+        versions = self.get_versions(self.get_dependencies(data))
+        if self.get_changes() != changes:
+            return False
+        cache.set(
+            key,
+            {"data": data, "versions": versions},
+            settings.RESPONSE_CACHE_TIMEOUT,
+        )
+        return True
+
+    @staticmethod
+    def count(key):
+        if not cache.add(key, 1, None):
+            cache.incr(key)
+
+    def stats(self):
+        counters = cache.get_many((HITS_KEY, MISSES_KEY))
+        return counters.get(HITS_KEY, 0), counters.get(MISSES_KEY, 0)
+
+    def reset_stats(self):
+        cache.delete_many((HITS_KEY, MISSES_KEY))
+
+    def get_request_key(self, request, allowed_params, lists):
+        """Ключ ответа или None, если параметры вне allowed_params."""
+        if not set(request.GET) <= set(allowed_params):
+            return None
+        version_keys = [GLOBAL_VERSION_KEY]
+        if lists:
+            version_keys.append(LISTS_VERSION_KEY)
+        versions = self.get_versions(version_keys)
+        return self.get_key(
+            request, *(versions[version_key] for version_key in version_keys)
+        )
+
+    def response(self, request, render, allowed_params, lists=False):
+        """Ответ из кеша или результат render(), сохранённый в кеш.
+
+        Запросы авторизованных пользователей и запросы с параметрами
+        вне allowed_params кешем не обслуживаются.
+        """
+        if request.user.is_authenticated:
+            return render()
+        key = self.get_request_key(request, allowed_params, lists)
+        if key is None:
+            return render()
+
+        data = self.get(key)
+        if data is not None:
+            self.count(HITS_KEY)
+            response = Response(data)
+            response["X-Cache"] = "HIT"
+            return response
+
+        self.count(MISSES_KEY)
+        changes = self.get_changes()
+        with use_primary():
+            response = render()
+        if response.status_code == 200:
+            self.set(key, response.data, changes)
+        response["X-Cache"] = "MISS"
+        return response
+
+
+recipe_response_cache = RecipeResponseCache()
@@ -0,0 +1,125 @@
+import re
+
+from django.conf import settings
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector)
+from django.db import DEFAULT_DB_ALIAS, connections, router
+from django.db.models import F, TextField, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Lower, Replace
+from recipes.models import Recipe
+
+from .ingredient_index import fold
+
+FTS_TABLE = "recipes_recipe_fts"
+WORD_RE = re.compile(r"\w+")
+
+
+def folded(field):
+    return Replace(
+        Lower(field), Value("ё"), Value("е"), output_field=TextField()
+    )
+
+
+def recipe_search_vector():
+    return (
+        SearchVector(
+            folded("name"), weight="A", config=settings.SEARCH_CONFIG
+        )
+        + SearchVector(
+            folded("text"), weight="B", config=settings.SEARCH_CONFIG
+        )
+    )
+
+
+def update_search_index(instance, using=DEFAULT_DB_ALIAS, **kwargs):
+    """Обновляет поисковый индекс рецепта после сохранения.
+
+    В PostgreSQL это колонка search_vector с GIN-индексом, в SQLite —
+    таблица FTS5, созданная миграцией 0009.
+    """
+    connection = connections[using]
+    if connection.vendor == "postgresql":
+        Recipe.objects.using(using).filter(pk=instance.pk).update(
+            search_vector=recipe_search_vector()
+        )
+    elif connection.vendor == "sqlite":
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [instance.pk]
+            )
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, name, text) "
+                "VALUES (%s, %s, %s)",
+                [instance.pk, fold(instance.name), fold(instance.text)],
+            )
+
+
+def rebuild_search_index(recipe_ids):
+    """Переиндексирует рецепты пакетно, для массовой загрузки без сигналов."""
+    using = router.db_for_write(Recipe)
+    connection = connections[using]
+    recipes = Recipe.objects.using(using).filter(pk__in=recipe_ids)
+    if connection.vendor == "postgresql":
+        recipes.update(search_vector=recipe_search_vector())
+    elif connection.vendor == "sqlite":
+        rows = [
+            (recipe_id, fold(name), fold(text))
+            for recipe_id, name, text in recipes.values_list(
+                "id", "name", "text"
+            )
+        ]
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"DELETE FROM {FTS_TABLE} WHERE rowid = %s",
+                [(row[0],) for row in rows],
+            )
+            cursor.executemany(
+                f"INSERT INTO {FTS_TABLE} (rowid, name, text) "
+                "VALUES (%s, %s, %s)",
+                rows,
+            )
+
+
+def remove_from_search_index(instance, using=DEFAULT_DB_ALIAS, **kwargs):
+    connection = connections[using]
+    if connection.vendor == "sqlite":
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [instance.pk]
+            )
+
+
+def search_recipes(queryset, query):
+    """Рецепты, подходящие под запрос, по убыванию релевантности.
+
+    Совпадение в названии весит больше, чем в описании, «ё» и «е»
+    не различаются.
+    """
+    query = fold(query)
+    ordering = ("-search_rank", "-pub_date", "-id")
+    if connections[queryset.db].vendor == "postgresql":
+        search_query = SearchQuery(
+            query, config=settings.SEARCH_CONFIG, search_type="websearch"
+        )
+        return queryset.filter(search_vector=search_query).annotate(
+            search_rank=SearchRank(F("search_vector"), search_query)
+        ).order_by(*ordering)
+
+    words = WORD_RE.findall(query)
+    if not words:
+        return queryset.none()
+    match = " ".join('"{0}"*'.format(word) for word in words)
+    table = Recipe._meta.db_table
+    return queryset.filter(
+        id__in=RawSQL(
+            f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s",
+            (match,),
+        )
+    ).annotate(
+        search_rank=RawSQL(
+            f"SELECT -bm25({FTS_TABLE}, 10.0, 1.0) FROM {FTS_TABLE} "
+            f"WHERE {FTS_TABLE}.rowid = {table}.id AND {FTS_TABLE} MATCH %s",
+            (match,),
+        )
+    ).order_by(*ordering)
@@ -1,10 +1,12 @@
 from django.core.validators import RegexValidator
 from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
 from djoser.serializers import UserCreateSerializer, UserSerializer
 from drf_extra_fields.fields import Base64ImageField
-from recipes.models import Ingredient, IngredientAmount
+from recipes.models import FeedEntry, Ingredient, IngredientAmount
 from recipes.models import Profile as User
-from recipes.models import ProfileFavorite, Recipe, RecipeTag, Tag
+from recipes.models import (ProfileFavorite, Recipe, RecipeTag,
+                            ShoppingListItem, Tag, tag_mask)
 from rest_framework import serializers
 from rest_framework.validators import UniqueValidator
 
@@ -12,8 +14,8 @@ from .constants import (MAX_EMAIL_LENGTH, MAX_FIRST_NAME_LENGTH,
                         MAX_LAST_NAME_LENGTH, MAX_USERNAME_LENGTH,
                         USERNAME_REGEX)
 from .mixins import IngredientMixin
-from .validators import (check_amount, empty_values, nonexistent_values,
-                         repetitive_values)
+from .validators import (check_amount, empty_values, nonexistent_tags,
+                         nonexistent_values, repetitive_values)
 
 
 class ProfileSerializer(UserSerializer):
@@ -43,6 +45,10 @@ class ProfileSerializer(UserSerializer):
         extra_kwargs = {"password": {"write_only": True}}
 
     def get_is_subscribed(self, obj):
+        following_ids = self.context.get("following_ids")
+        if following_ids is not None:
+            return obj.id in following_ids
+
         request = self.context.get("request")
         if request:
             current_user = request.user
@@ -123,6 +129,19 @@ class IngredientinRecipeSerializer(
         ).amount
 
 
+class IngredientAmountReadSerializer(serializers.ModelSerializer):
+
+    id = serializers.ReadOnlyField(source="ingredient.id")
+    name = serializers.ReadOnlyField(source="ingredient.name")
+    measurement_unit = serializers.ReadOnlyField(
+        source="ingredient.measurement_unit"
+    )
+
+    class Meta:
+        fields = ("id", "name", "measurement_unit", "amount")
+        model = IngredientAmount
+
+
 class IngredientWriteSerializer(serializers.ModelSerializer, IngredientMixin):
 
     amount = serializers.IntegerField(required=True, write_only=True)
@@ -136,6 +155,7 @@ class RecipeReadSerializer(serializers.ModelSerializer):
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
     image = Base64ImageField(required=False, allow_null=True)
+    image_variants = serializers.SerializerMethodField()
 
     def __init__(self, *args, **kwargs):
         fields = kwargs.pop("fields", None)
@@ -151,9 +171,21 @@ class RecipeReadSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Recipe
-        exclude = ("pub_date",)
+        exclude = (
+            "pub_date",
+            "image_card",
+            "image_detail",
+            "image_webp",
+            "image_variants_source",
+            "search_vector",
+            "tag_mask",
+        )
 
     def get_is_favorited(self, obj):
+        favorite_ids = self.context.get("favorite_ids")
+        if favorite_ids is not None:
+            return obj.id in favorite_ids
+
         request = self.context.get("request")
         if request:
             current_user = request.user
@@ -161,13 +193,41 @@ class RecipeReadSerializer(serializers.ModelSerializer):
         return obj.is_favorited.filter(id=current_user.id).exists()
 
     def get_is_in_shopping_cart(self, obj):
+        shopping_cart_ids = self.context.get("shopping_cart_ids")
+        if shopping_cart_ids is not None:
+            return obj.id in shopping_cart_ids
+
         request = self.context.get("request")
         if request:
             current_user = request.user
 
         return obj.is_in_shopping_cart.filter(id=current_user.id).exists()
 
+    def get_image_variants(self, obj):
+        if not (obj.image and obj.image_variants_source == obj.image.name):
+            return None
+
+        request = self.context.get("request")
+        variants = {}
+        for name, image in (
+            ("card", obj.image_card),
+            ("detail", obj.image_detail),
+            ("webp", obj.image_webp),
+        ):
+            if not image:
+                return None
+            variants[name] = (
+                request.build_absolute_uri(image.url) if request
+                else image.url
+            )
+        return variants
+
     def get_ingredients(self, obj):
+        if hasattr(obj, "ingredient_amounts"):
+            return IngredientAmountReadSerializer(
+                obj.ingredient_amounts, many=True
+            ).data
+
         context = {"recipe_id": obj.id}
         if self.context.get("request"):
             context.update({"method": self.context.get("request").method})
@@ -177,11 +237,30 @@ class RecipeReadSerializer(serializers.ModelSerializer):
         ).data
 
 
-class RecipeWriteSerializer(serializers.ModelSerializer):
+class CookableRecipeSerializer(RecipeReadSerializer):
+    """Рецепт с долей ингредиентов, которые уже есть у пользователя."""
+
+    coverage = serializers.SerializerMethodField()
+    missing_count = serializers.SerializerMethodField()
+
+    def get_coverage(self, obj):
+        available, total = self.context["coverage"][obj.id]
+        return round(available / total, 2)
 
-    tags = serializers.PrimaryKeyRelatedField(
-        many=True, queryset=Tag.objects.all()
+    def get_missing_count(self, obj):
+        available, total = self.context["coverage"][obj.id]
+        return total - available
+
+
+class CookableQuerySerializer(serializers.Serializer):
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), allow_empty=False
     )
+
+
+class RecipeWriteSerializer(serializers.ModelSerializer):
+
+    tags = serializers.ListField(child=serializers.IntegerField())
     ingredients = IngredientWriteSerializer(many=True)
     image = Base64ImageField(required=True)
 
@@ -196,41 +275,111 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
             "cooking_time"
         )
 
+    def validate_tags(self, value):
+        return nonexistent_tags(value)
+
+    @staticmethod
+    def validate_ingredients_tags(ingredients, tags):
+        empty_values(ingredients, tags)
+        repetitive_values(ingredients, tags)
+        for ingredient in ingredients:
+            check_amount(ingredient["amount"])
+        nonexistent_values(ingredients)
+
     @staticmethod
     def add_ingredients_tags(ingredients, tags, recipe):
-        bulk_ingredientamount_list = list()
-        bulk_recipetag_list = list()
-        for ingredient, tag in zip(ingredients, tags):
-            amount = ingredient.pop("amount")
-            check_amount(amount)
-            nonexistent_values(ingredient)
-            current_ingredient = Ingredient.objects.get(
-                id=ingredient.pop("id")
+        IngredientAmount.objects.bulk_create(
+            IngredientAmount(
+                ingredient_id=ingredient["id"],
+                recipe=recipe,
+                amount=ingredient["amount"],
             )
+            for ingredient in ingredients
+        )
+        RecipeTag.objects.bulk_create(
+            RecipeTag(tag=tag, recipe=recipe) for tag in tags
+        )
 
-            bulk_ingredientamount_list.append(
-                IngredientAmount(
-                    ingredient=current_ingredient, recipe=recipe, amount=amount
-                )
+    @staticmethod
+    def update_ingredients(recipe, ingredients):
+        """Применяет к рецепту только изменившиеся ингредиенты.
+
+        Возвращает прежние количества {ingredient_id: amount}.
+        """
+        current = {
+            ingredient_amount.ingredient_id: ingredient_amount
+            for ingredient_amount in IngredientAmount.objects.filter(
+                recipe=recipe
             )
-            bulk_recipetag_list.append(
-                RecipeTag(tag=tag, recipe=recipe)
+        }
+        old_amounts = {
+            ingredient_id: ingredient_amount.amount
+            for ingredient_id, ingredient_amount in current.items()
+        }
+        new_amounts = {
+            ingredient["id"]: ingredient["amount"]
+            for ingredient in ingredients
+        }
+
+        removed = current.keys() - new_amounts.keys()
+        if removed:
+            IngredientAmount.objects.filter(
+                recipe=recipe, ingredient_id__in=removed
+            ).delete()
+
+        changed = []
+        for ingredient_id, ingredient_amount in current.items():
+            amount = new_amounts.get(ingredient_id)
+            if amount is not None and amount != ingredient_amount.amount:
+                ingredient_amount.amount = amount
+                changed.append(ingredient_amount)
+        if changed:
+            IngredientAmount.objects.bulk_update(changed, ("amount",))
+
+        added = [
+            IngredientAmount(
+                ingredient_id=ingredient_id, recipe=recipe, amount=amount
+            )
+            for ingredient_id, amount in new_amounts.items()
+            if ingredient_id not in current
+        ]
+        if added:
+            IngredientAmount.objects.bulk_create(added)
+
+        return old_amounts, new_amounts
+
+    @staticmethod
+    def update_tags(recipe, tags):
+        current = set(
+            RecipeTag.objects.filter(
+                recipe=recipe
+            ).values_list("tag_id", flat=True)
+        )
+        new = {tag.id for tag in tags}
+
+        if current - new:
+            RecipeTag.objects.filter(
+                recipe=recipe, tag_id__in=current - new
+            ).delete()
+        if new - current:
+            RecipeTag.objects.bulk_create(
+                RecipeTag(tag_id=tag_id, recipe=recipe)
+                for tag_id in new - current
             )
-        IngredientAmount.objects.bulk_create(bulk_ingredientamount_list)
-        RecipeTag.objects.bulk_create(bulk_recipetag_list)
 
     @transaction.atomic
     def create(self, validated_data):
         ingredients = validated_data.pop("ingredients", None)
         tags = validated_data.pop("tags", None)
-        empty_values(ingredients, tags)
-        repetitive_values(ingredients, tags)
+        self.validate_ingredients_tags(ingredients, tags)
 
         request = self.context.get("request")
-        validated_data["author_id"] = request.user.id
+        validated_data["author"] = request.user
+        validated_data["tag_mask"] = tag_mask(tag.id for tag in tags)
         recipe = Recipe.objects.create(**validated_data)
 
         self.add_ingredients_tags(ingredients, tags, recipe)
+        FeedEntry.objects.fan_out(recipe)
 
         return recipe
 
@@ -238,25 +387,44 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
     def update(self, instance, validated_data):
         ingredients = validated_data.pop("ingredients", None)
         tags = validated_data.pop("tags", None)
-
-        empty_values(ingredients, tags)
-        repetitive_values(ingredients, tags)
+        self.validate_ingredients_tags(ingredients, tags)
 
         request = self.context.get("request", None)
-        validated_data["author_id"] = request.user.id
-
-        IngredientAmount.objects.filter(recipe=instance).delete()
-        RecipeTag.objects.filter(recipe=instance).delete()
+        validated_data["author"] = request.user
+        validated_data["tag_mask"] = tag_mask(tag.id for tag in tags)
 
         super().update(instance, validated_data)
 
-        instance.save()
-
-        self.add_ingredients_tags(ingredients, tags, instance)
+        old_amounts, new_amounts = self.update_ingredients(
+            instance, ingredients
+        )
+        self.update_tags(instance, tags)
+
+        ShoppingListItem.objects.apply_delta(
+            instance.is_in_shopping_cart.values_list("id", flat=True),
+            {
+                ingredient_id: (
+                    new_amounts.get(ingredient_id, 0)
+                    - old_amounts.get(ingredient_id, 0)
+                )
+                for ingredient_id in old_amounts.keys() | new_amounts.keys()
+            }
+        )
 
         return instance
 
     def to_representation(self, data):
+        prefetch_related_objects(
+            [data],
+            "tags",
+            Prefetch(
+                "ingredientamount_set",
+                queryset=IngredientAmount.objects.select_related(
+                    "ingredient"
+                ),
+                to_attr="ingredient_amounts",
+            ),
+        )
         return RecipeReadSerializer(
             context=self.context
         ).to_representation(data)
@@ -323,11 +491,15 @@ class SubscriptionsSerializer(serializers.ModelSerializer):
         return ProfileSerializer.get_is_subscribed(self, obj)
 
     def get_recipes(self, obj):
-        request = self.context.get("request")
-        limit = request.GET.get("recipes_limit")
-        recipes = obj.recipes.all()
-        if limit:
-            recipes = recipes[:int(limit)]
+        recipes_by_author = self.context.get("recipes_by_author")
+        if recipes_by_author is not None:
+            recipes = recipes_by_author.get(obj.id, [])
+        else:
+            request = self.context.get("request")
+            limit = request.GET.get("recipes_limit")
+            recipes = obj.recipes.all()
+            if limit is not None:
+                recipes = recipes[:int(limit)]
         serializer = RecipeReadSerializer(
             recipes, many=True, read_only=True,
             fields=["id", "image", "name", "cooking_time"]
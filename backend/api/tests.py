@@ -0,0 +1,1541 @@
+import base64
+import io
+import json
+import re
+import tempfile
+from datetime import timedelta
+from functools import partial
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import skipUnless
+from unittest.mock import patch
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import (RequestFactory, SimpleTestCase, TestCase,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from foodgram.db.pool import ConnectionPool, PoolTimeout, get_pool, pools
+from PIL import Image
+from psycopg2 import OperationalError, extensions
+from recipes.models import (FeedEntry, Ingredient, IngredientAmount, Profile,
+                            ProfileFavorite, Recipe, RecipeChange, RecipeTag,
+                            ShoppingListItem, Tag, tag_mask)
+from reportlab.pdfgen import canvas
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.test import APIClient
+
+from .constants import COOKABLE_INDEX_PRUNE_INTERVAL
+from .cookable_index import CookableIndex
+from .db_routing import PIN_COOKIE
+from .filters import (TAG_SLUGS_KEY, TAG_SLUGS_RELOAD_KEY, RecipeFilterSet,
+                      get_tag_ids_by_slug)
+from .ingredient_index import ingredient_index
+from .querystats import (QueryBudgetExceeded, capture_queries, get_view_budget,
+                         query_budget)
+from .recipe_sets import favorite_ids, shopping_cart_ids
+from .response_cache import recipe_response_cache
+from .search import search_recipes
+from .views import IngredientViewSet, ProfileViewSet, RecipeViewSet, TagViewSet
+
+
+def create_user(username="user"):
+    return Profile.objects.create_user(
+        username=username, email=f"{username}@example.com", password="pw"
+    )
+
+
+def create_recipe(author, name="рецепт", **fields):
+    return Recipe.objects.create(
+        author=author, name=name, text="текст", cooking_time=5,
+        image="recipes/image.png", **fields,
+    )
+
+
+def recipe_data(tags, amounts, image=True, **fields):
+    """Тело запроса на запись рецепта; amounts — {id ингредиента: n}."""
+    data = {
+        "tags": list(tags),
+        "ingredients": [
+            {"id": ingredient_id, "amount": amount}
+            for ingredient_id, amount in amounts.items()
+        ],
+        "name": "новый",
+        "text": "текст",
+        "cooking_time": 10,
+        **fields,
+    }
+    if image:
+        buffer = io.BytesIO()
+        Image.new("RGB", (1, 1), "red").save(buffer, "PNG")
+        data["image"] = "data:image/png;base64," + base64.b64encode(
+            buffer.getvalue()
+        ).decode()
+    return data
+
+
+def use_temporary_media(test):
+    media = tempfile.TemporaryDirectory()
+    test.addCleanup(media.cleanup)
+    media_settings = override_settings(MEDIA_ROOT=media.name)
+    media_settings.enable()
+    test.addCleanup(media_settings.disable)
+
+
+def token_client(user):
+    """Клиент с токеном пользователя, как у фронтенда."""
+    token, _ = Token.objects.get_or_create(user=user)
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+    return client
+
+
+class RecipeQueryCountTest(TestCase):
+    """Число запросов списка и страницы рецепта не зависит от данных.
+
+    Кеш очищается перед каждым запросом, поэтому считаются и запросы,
+    заполняющие его.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user("author")
+        cls.user = create_user("user")
+        tags = [
+            Tag.objects.create(name=slug, slug=slug)
+            for slug in ("breakfast", "lunch", "dinner")
+        ]
+        ingredients = [
+            Ingredient.objects.create(
+                name=f"ингредиент {number}", measurement_unit="г"
+            )
+            for number in range(5)
+        ]
+        for number in range(6):
+            recipe = create_recipe(cls.author, f"рецепт {number}")
+            RecipeTag.objects.bulk_create(
+                RecipeTag(recipe=recipe, tag=tag) for tag in tags
+            )
+            IngredientAmount.objects.bulk_create(
+                IngredientAmount(
+                    recipe=recipe, ingredient=ingredient, amount=2
+                )
+                for ingredient in ingredients
+            )
+        cls.recipe = Recipe.objects.first()
+        cls.user.following.add(cls.author)
+        cls.user.favorite_recipes.add(cls.recipe)
+        cls.user.shopping_cart.add(cls.recipe)
+
+    def setUp(self):
+        cache.clear()
+        self.anonymous = APIClient()
+        self.authenticated = token_client(self.user)
+
+    def assert_queries(self, client, url, expected):
+        cache.clear()
+        with self.assertNumQueries(expected):
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    @staticmethod
+    def list_queries(expected):
+        # На PostgreSQL число рецептов без фильтров берётся из pg_class.
+        return expected + (connection.vendor == "postgresql")
+
+    def test_list_anonymous(self):
+        for limit in (1, 6):
+            with self.subTest(limit=limit):
+                response = self.assert_queries(
+                    self.anonymous, f"/api/recipes/?limit={limit}",
+                    self.list_queries(4),
+                )
+                self.assertEqual(len(response.data["results"]), limit)
+
+    def test_list_authenticated(self):
+        # Бюджет list рассчитан на запрос к pg_class.
+        budget = RecipeViewSet.query_budgets["list"]
+        for limit in (1, 6):
+            with self.subTest(limit=limit):
+                response = self.assert_queries(
+                    self.authenticated, f"/api/recipes/?limit={limit}",
+                    self.list_queries(budget - 1),
+                )
+                self.assertEqual(len(response.data["results"]), limit)
+
+    def test_detail_anonymous(self):
+        self.assert_queries(
+            self.anonymous, f"/api/recipes/{self.recipe.id}/", 3
+        )
+
+    def test_detail_authenticated(self):
+        response = self.assert_queries(
+            self.authenticated, f"/api/recipes/{self.recipe.id}/",
+            RecipeViewSet.query_budgets["retrieve"],
+        )
+        self.assertTrue(response.data["is_favorited"])
+        self.assertTrue(response.data["is_in_shopping_cart"])
+        self.assertTrue(response.data["author"]["is_subscribed"])
+
+
+class QueryBudgetTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        Tag.objects.create(name="обед", slug="lunch")
+
+    def setUp(self):
+        cache.clear()
+
+    def test_query_budget(self):
+        with query_budget(1) as stats:
+            list(Tag.objects.all())
+        self.assertEqual(stats.count, 1)
+        with self.assertRaises(QueryBudgetExceeded):
+            with query_budget(1):
+                list(Tag.objects.all())
+                list(Tag.objects.all())
+
+    def test_nested_capture(self):
+        with capture_queries() as outer:
+            list(Tag.objects.all())
+            with capture_queries() as inner:
+                list(Tag.objects.all())
+        self.assertEqual((outer.count, inner.count), (2, 1))
+
+    def test_response_headers(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/api/recipes/")
+        self.assertEqual(int(response["X-DB-Query-Count"]), len(queries))
+        self.assertIn("X-DB-Query-Time", response)
+
+    def test_enforced(self):
+        budgets = {**RecipeViewSet.query_budgets, "list": 0}
+        with patch.object(RecipeViewSet, "query_budgets", budgets):
+            with override_settings(QUERY_BUDGET_ENFORCE=True):
+                with self.assertRaises(QueryBudgetExceeded), \
+                        self.assertLogs("django.request", "ERROR"):
+                    self.client.get("/api/recipes/")
+            with override_settings(QUERY_BUDGET_ENFORCE=False):
+                self.assertEqual(
+                    self.client.get("/api/recipes/").status_code, 200
+                )
+
+
+@override_settings(QUERY_BUDGET_ENFORCE=True)
+class QueryBudgetCoverageTest(TestCase):
+    """Каждое действие с бюджетом укладывается в него на холодном кеше."""
+
+    viewsets = (RecipeViewSet, ProfileViewSet, TagViewSet, IngredientViewSet)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user("author")
+        cls.user = create_user("user")
+        cls.tag = Tag.objects.create(name="обед", slug="lunch")
+        cls.ingredient = Ingredient.objects.create(
+            name="мука", measurement_unit="г"
+        )
+        cls.recipe = create_recipe(cls.author)
+        cls.recipe.tags.add(cls.tag)
+        IngredientAmount.objects.create(
+            recipe=cls.recipe, ingredient=cls.ingredient, amount=1
+        )
+
+    def setUp(self):
+        use_temporary_media(self)
+        # Индекс строится при старте процесса (warm), а не в запросе.
+        index = CookableIndex()
+        index.build()
+        index_patch = patch("api.views.cookable_index", index)
+        index_patch.start()
+        self.addCleanup(index_patch.stop)
+        self.covered = set()
+
+    def call(self, client, method, url, data=None):
+        cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = getattr(client, method)(url, data, format="json")
+        self.assertLess(response.status_code, 400, url)
+        view, budget = get_view_budget(
+            response.wsgi_request.resolver_match.func, method
+        )
+        self.assertIsNotNone(budget, view)
+        self.assertLessEqual(int(response["X-DB-Query-Count"]), budget, view)
+        self.covered.add(view)
+        return response
+
+    def test_budgeted_actions(self):
+        user, author = token_client(self.user), token_client(self.author)
+        users = f"/api/users/{self.author.id}/"
+        recipe = f"/api/recipes/{self.recipe.id}/"
+
+        self.call(user, "get", "/api/users/me/")
+        self.call(user, "get", users)
+        self.call(user, "post", f"{users}subscribe/")
+        self.call(user, "get", "/api/users/subscriptions/")
+        self.call(user, "get", "/api/recipes/feed/")
+        self.call(user, "get", "/api/recipes/")
+        self.call(user, "get", recipe)
+        self.call(
+            user, "get",
+            f"/api/recipes/cookable/?ingredients={self.ingredient.id}",
+        )
+        self.call(user, "post", f"{recipe}favorite/")
+        self.call(user, "delete", f"{recipe}favorite/")
+        self.call(user, "post", f"{recipe}shopping_cart/")
+        self.call(user, "get", "/api/recipes/download_shopping_cart/")
+        self.call(user, "delete", f"{recipe}shopping_cart/")
+        self.call(user, "delete", f"{users}subscribe/")
+
+        tags = [self.tag.id]
+        created = self.call(
+            author, "post", "/api/recipes/",
+            recipe_data(tags, {self.ingredient.id: 2}),
+        ).data["id"]
+        self.call(
+            author, "put", f"/api/recipes/{created}/",
+            recipe_data(tags, {self.ingredient.id: 2}, name="другой"),
+        )
+        self.call(
+            author, "patch", f"/api/recipes/{created}/",
+            recipe_data(tags, {self.ingredient.id: 3}, image=False),
+        )
+
+        for catalog, pk in (
+            ("tags", self.tag.id), ("ingredients", self.ingredient.id)
+        ):
+            self.call(user, "get", f"/api/{catalog}/")
+            self.call(user, "get", f"/api/{catalog}/{pk}/")
+
+        self.assertEqual(self.covered, {
+            f"{viewset.__name__}.{action}"
+            for viewset in self.viewsets
+            for action in viewset.query_budgets
+        })
+
+
+class SubscriptionsTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user("user")
+        for number in range(3):
+            author = create_user(f"author{number}")
+            for recipe_number in range(number + 1):
+                create_recipe(author, f"рецепт {recipe_number}")
+            cls.user.following.add(author)
+
+    def setUp(self):
+        cache.clear()
+        self.client = token_client(self.user)
+
+    def get_recipe_counts(self, query=""):
+        response = self.client.get(f"/api/users/subscriptions/{query}")
+        self.assertEqual(response.status_code, 200)
+        return sorted(
+            len(author["recipes"]) for author in response.data["results"]
+        )
+
+    def test_recipes_limit(self):
+        self.assertEqual(self.get_recipe_counts(), [1, 2, 3])
+        self.assertEqual(
+            self.get_recipe_counts("?recipes_limit=2"), [1, 2, 2]
+        )
+        self.assertEqual(
+            self.get_recipe_counts("?recipes_limit=0"), [0, 0, 0]
+        )
+
+    def test_latest_recipes_first(self):
+        response = self.client.get(
+            "/api/users/subscriptions/?recipes_limit=1"
+        )
+        latest = Recipe.objects.filter(author__username="author2").first()
+        recipes = {
+            author["username"]: author["recipes"]
+            for author in response.data["results"]
+        }
+        self.assertEqual(recipes["author2"][0]["id"], latest.id)
+
+    def test_invalid_recipes_limit(self):
+        for limit in ("-1", "", "2.5", "два"):
+            with self.subTest(limit=limit):
+                response = self.client.get(
+                    "/api/users/subscriptions/",
+                    {"recipes_limit": limit},
+                )
+                self.assertEqual(response.status_code, 400)
+                self.assertIn("recipes_limit", response.data)
+
+
+class ShoppingListTest(TestCase):
+    """ShoppingListItem совпадает с суммой по корзине после каждой записи."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user("author")
+        cls.user = create_user("user")
+        cls.tag = Tag.objects.create(name="обед", slug="lunch")
+        cls.flour, cls.eggs, cls.milk = (
+            Ingredient.objects.create(name=name, measurement_unit="г").id
+            for name in ("мука", "яйца", "молоко")
+        )
+
+    def setUp(self):
+        use_temporary_media(self)
+        self.client = token_client(self.user)
+        self.author_client = token_client(self.author)
+
+    def create_recipe(self, amounts):
+        response = self.author_client.post(
+            "/api/recipes/", recipe_data([self.tag.id], amounts),
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201)
+        return response.data["id"]
+
+    def assert_list(self, expected):
+        items = dict(
+            ShoppingListItem.objects.filter(user=self.user).values_list(
+                "ingredient_id", "amount"
+            )
+        )
+        self.assertEqual(items, expected)
+        self.assertEqual(
+            ShoppingListItem.objects.expected([self.user.id]),
+            {
+                (self.user.id, ingredient_id): amount
+                for ingredient_id, amount in expected.items()
+            },
+        )
+
+    def test_maintained_through_api(self):
+        pancakes = self.create_recipe({self.flour: 100, self.eggs: 2})
+        bread = self.create_recipe({self.flour: 50})
+
+        self.client.post(f"/api/recipes/{pancakes}/shopping_cart/")
+        self.assert_list({self.flour: 100, self.eggs: 2})
+        self.client.post(f"/api/recipes/{bread}/shopping_cart/")
+        self.assert_list({self.flour: 150, self.eggs: 2})
+
+        response = self.author_client.patch(
+            f"/api/recipes/{pancakes}/",
+            recipe_data(
+                [self.tag.id], {self.flour: 200, self.milk: 1}, image=False
+            ),
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assert_list({self.flour: 250, self.milk: 1})
+
+        self.client.delete(f"/api/recipes/{bread}/shopping_cart/")
+        self.assert_list({self.flour: 200, self.milk: 1})
+
+        response = self.author_client.delete(f"/api/recipes/{pancakes}/")
+        self.assertEqual(response.status_code, 204)
+        self.assert_list({})
+
+    def test_verify_reports_drift(self):
+        pancakes = self.create_recipe({self.flour: 100, self.eggs: 2})
+        self.client.post(f"/api/recipes/{pancakes}/shopping_cart/")
+        call_command(
+            "rebuild_shopping_lists", "--verify", stdout=io.StringIO()
+        )
+
+        ShoppingListItem.objects.filter(ingredient_id=self.eggs).delete()
+        ShoppingListItem.objects.filter(ingredient_id=self.flour).update(
+            amount=1
+        )
+        stderr = io.StringIO()
+        with self.assertRaisesMessage(CommandError, "расхождений: 2"):
+            call_command(
+                "rebuild_shopping_lists", "--verify",
+                stdout=io.StringIO(), stderr=stderr,
+            )
+        self.assertIn(
+            f"ingredient={self.flour} ожидается=100 сохранено=1",
+            stderr.getvalue(),
+        )
+
+        call_command("rebuild_shopping_lists", stdout=io.StringIO())
+        self.assert_list({self.flour: 100, self.eggs: 2})
+
+    def test_admin_changes_rebuild_lists(self):
+        pancakes = self.create_recipe({self.flour: 100, self.eggs: 2})
+        self.client.post(f"/api/recipes/{pancakes}/shopping_cart/")
+        admin = Profile.objects.create_superuser(
+            username="admin", email="admin@example.com", password="pw"
+        )
+        self.client.force_login(admin)
+
+        amount = IngredientAmount.objects.get(
+            recipe_id=pancakes, ingredient_id=self.flour
+        )
+        response = self.client.post(
+            f"/admin/recipes/ingredientamount/{amount.id}/change/",
+            {"recipe": pancakes, "ingredient": self.flour, "amount": 300},
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assert_list({self.flour: 300, self.eggs: 2})
+
+        response = self.client.post(
+            f"/admin/recipes/recipe/{pancakes}/delete/", {"post": "yes"}
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assert_list({})
+
+
+class RecipeUpdateTest(TestCase):
+    """Запись рецепта меняет только изменившиеся ингредиенты и теги."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user("author")
+        cls.breakfast, cls.lunch, cls.dinner = (
+            Tag.objects.create(name=slug, slug=slug).id
+            for slug in ("breakfast", "lunch", "dinner")
+        )
+        cls.flour, cls.eggs, cls.milk, cls.salt = (
+            Ingredient.objects.create(name=name, measurement_unit="г").id
+            for name in ("мука", "яйца", "молоко", "соль")
+        )
+        cls.recipe = create_recipe(cls.author)
+        RecipeTag.objects.bulk_create(
+            RecipeTag(recipe=cls.recipe, tag_id=tag_id)
+            for tag_id in (cls.breakfast, cls.lunch)
+        )
+        IngredientAmount.objects.bulk_create(
+            IngredientAmount(
+                recipe=cls.recipe, ingredient_id=ingredient_id, amount=amount
+            )
+            for ingredient_id, amount in (
+                (cls.flour, 100), (cls.eggs, 2), (cls.milk, 1)
+            )
+        )
+        create_user("user").shopping_cart.add(cls.recipe)
+
+    def setUp(self):
+        self.client = token_client(self.author)
+        self.url = f"/api/recipes/{self.recipe.id}/"
+
+    def patch(self, tags, amounts):
+        return self.client.patch(
+            self.url, recipe_data(tags, amounts, image=False), format="json"
+        )
+
+    def get_rows(self):
+        amounts = IngredientAmount.objects.filter(recipe=self.recipe)
+        return (
+            {
+                ingredient_id: (pk, amount)
+                for pk, ingredient_id, amount in amounts.values_list(
+                    "pk", "ingredient_id", "amount"
+                )
+            },
+            dict(
+                RecipeTag.objects.filter(recipe=self.recipe).values_list(
+                    "tag_id", "pk"
+                )
+            ),
+        )
+
+    def test_applies_difference(self):
+        amounts, tags = self.get_rows()
+        response = self.patch(
+            [self.lunch, self.dinner],
+            {self.flour: 100, self.eggs: 3, self.salt: 5},
+        )
+        self.assertEqual(response.status_code, 200)
+
+        new_amounts, new_tags = self.get_rows()
+        self.assertEqual(new_amounts[self.flour], amounts[self.flour])
+        self.assertEqual(new_amounts[self.eggs], (amounts[self.eggs][0], 3))
+        self.assertEqual(new_amounts[self.salt][1], 5)
+        self.assertNotIn(self.milk, new_amounts)
+        self.assertEqual(new_tags[self.lunch], tags[self.lunch])
+        self.assertEqual(new_tags.keys(), {self.lunch, self.dinner})
+
+    def test_unknown_ids(self):
+        rows = self.get_rows()
+        for tags, amounts in (
+            ([self.lunch, 999], {self.flour: 100}),
+            ([self.lunch], {self.flour: 100, 999: 1}),
+        ):
+            with self.subTest(tags=tags, amounts=amounts):
+                self.assertEqual(self.patch(tags, amounts).status_code, 400)
+                self.assertEqual(self.get_rows(), rows)
+
+    def test_patch_queries(self):
+        # Худший случай, на который рассчитан бюджет partial_update.
+        with self.assertNumQueries(
+            RecipeViewSet.query_budgets["partial_update"]
+            - (connection.vendor != "sqlite")
+        ):
+            response = self.patch(
+                [self.lunch, self.dinner],
+                {self.flour: 100, self.eggs: 3, self.salt: 5},
+            )
+        self.assertEqual(response.status_code, 200)
+
+
+class FeedTest(TestCase):
+    """Лента подписок раскладывается при записи рецептов и подписок."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user("author")
+        cls.other_author = create_user("other")
+        cls.user = create_user("user")
+        cls.recipes = [
+            create_recipe(cls.author, f"рецепт {number}")
+            for number in range(3)
+        ]
+        cls.other_recipe = create_recipe(cls.other_author)
+
+    def setUp(self):
+        use_temporary_media(self)
+        self.client = token_client(self.user)
+
+    def subscribe(self, author, method="post"):
+        response = getattr(self.client, method)(
+            f"/api/users/{author.id}/subscribe/"
+        )
+        self.assertLess(response.status_code, 300)
+
+    def get_feed(self, client=None):
+        response = (client or self.client).get("/api/recipes/feed/")
+        self.assertEqual(response.status_code, 200)
+        return [recipe["id"] for recipe in response.data["results"]]
+
+    def test_backfill_on_subscribe(self):
+        self.assertEqual(self.get_feed(), [])
+        self.subscribe(self.author)
+        self.assertEqual(
+            self.get_feed(),
+            [recipe.id for recipe in reversed(self.recipes)],
+        )
+
+    def test_fan_out_on_create(self):
+        self.subscribe(self.author)
+        response = token_client(self.author).post(
+            "/api/recipes/", recipe_data(
+                [Tag.objects.create(name="обед", slug="lunch").id],
+                {Ingredient.objects.create(
+                    name="мука", measurement_unit="г"
+                ).id: 100},
+            ),
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.get_feed()[0], response.data["id"])
+        self.assertEqual(self.get_feed(token_client(self.other_author)), [])
+
+    def test_unsubscribe_removes_entries(self):
+        self.subscribe(self.author)
+        self.subscribe(self.other_author)
+        self.subscribe(self.author, "delete")
+        self.assertEqual(self.get_feed(), [self.other_recipe.id])
+
+    def test_backfill_limit(self):
+        FeedEntry.objects.backfill(self.user.id, self.author.id, limit=2)
+        self.assertEqual(
+            list(
+                FeedEntry.objects.filter(user=self.user).order_by(
+                    "-pub_date", "-recipe_id"
+                ).values_list("recipe_id", flat=True)
+            ),
+            [self.recipes[2].id, self.recipes[1].id],
+        )
+
+
+class ShoppingCartDownloadTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user("user")
+        author = create_user("author")
+        flour, eggs = (
+            Ingredient.objects.create(name=name, measurement_unit=unit)
+            for name, unit in (("мука", "г"), ("яйца", "шт"))
+        )
+        # Мука есть в обоих рецептах и выводится одной строкой.
+        for name, amounts in (
+            ("блины", ((flour, 100), (eggs, 2))), ("хлеб", ((flour, 50),))
+        ):
+            recipe = create_recipe(author, name)
+            IngredientAmount.objects.bulk_create(
+                IngredientAmount(
+                    recipe=recipe, ingredient=ingredient, amount=amount
+                )
+                for ingredient, amount in amounts
+            )
+            cls.user.shopping_cart.add(recipe)
+            ShoppingListItem.objects.add_recipe([cls.user.id], recipe.id)
+
+    def setUp(self):
+        self.client = token_client(self.user)
+
+    def download(self, format):
+        return self.client.get(
+            f"/api/recipes/download_shopping_cart/?format={format}"
+        )
+
+    def get_content(self, format):
+        response = self.download(format)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(
+            f"shopping_cart.{format}", response["Content-Disposition"]
+        )
+        return b"".join(response.streaming_content)
+
+    def test_text(self):
+        self.assertEqual(
+            self.get_content("txt").decode(),
+            "мука (г) — 150\nяйца (шт) — 2\n",
+        )
+
+    def test_csv(self):
+        self.assertEqual(
+            self.get_content("csv").decode(),
+            "name,measurement_unit,amount\r\nмука,г,150\r\nяйца,шт,2\r\n",
+        )
+
+    def test_json(self):
+        self.assertEqual(json.loads(self.get_content("json")), [
+            {"name": "мука", "measurement_unit": "г", "amount": 150},
+            {"name": "яйца", "measurement_unit": "шт", "amount": 2},
+        ])
+
+    def test_pdf(self):
+        with patch.object(
+            canvas.Canvas, "drawString", autospec=True,
+            side_effect=canvas.Canvas.drawString,
+        ) as draw_string:
+            content = self.get_content("pdf")
+        self.assertTrue(content.startswith(b"%PDF"))
+        self.assertEqual(
+            [call.args[3] for call in draw_string.call_args_list],
+            ["мука (г) — 150", "яйца (шт) — 2"],
+        )
+        self.assertEqual(re.findall(rb"/Count (\d+)", content), [b"1"])
+
+    def test_pdf_pages(self):
+        recipe = create_recipe(self.user, "салат")
+        IngredientAmount.objects.bulk_create(
+            IngredientAmount(
+                recipe=recipe, ingredient=Ingredient.objects.create(
+                    name=f"овощ {number}", measurement_unit="г"
+                ),
+                amount=1,
+            )
+            for number in range(60)
+        )
+        ShoppingListItem.objects.add_recipe([self.user.id], recipe.id)
+        self.assertEqual(
+            re.findall(rb"/Count (\d+)", self.get_content("pdf")), [b"2"]
+        )
+
+    @override_settings(SHOPPING_CART_PDF_FONT="/nonexistent/font.ttf")
+    def test_pdf_without_font(self):
+        with patch(
+            "api.renderers.pdfmetrics.getRegisteredFontNames", return_value=[]
+        ), self.assertRaises(ImproperlyConfigured), \
+                self.assertLogs("django.request", "ERROR"):
+            self.download("pdf")
+
+
+class TagCatalogTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        for slug in ("breakfast", "lunch"):
+            Tag.objects.create(name=slug, slug=slug)
+
+    def setUp(self):
+        cache.clear()
+
+    def get_slugs(self, query=""):
+        response = self.client.get(f"/api/tags/{query}")
+        self.assertEqual(response.status_code, 200)
+        return [tag["slug"] for tag in response.json()]
+
+    def test_search_bypasses_catalog(self):
+        self.assertEqual(self.get_slugs(), ["breakfast", "lunch"])
+        self.assertEqual(self.get_slugs("?search=lu"), ["lunch"])
+
+    def test_invalidated_on_change(self):
+        self.assertEqual(self.get_slugs(), ["breakfast", "lunch"])
+        with self.captureOnCommitCallbacks(execute=True):
+            Tag.objects.create(name="dinner", slug="dinner")
+        self.assertEqual(self.get_slugs(), ["breakfast", "lunch", "dinner"])
+
+    def test_invalidated_after_commit(self):
+        self.get_slugs()
+        with self.captureOnCommitCallbacks() as callbacks:
+            Tag.objects.create(name="dinner", slug="dinner")
+            self.assertEqual(self.get_slugs(), ["breakfast", "lunch"])
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self.get_slugs(), ["breakfast", "lunch", "dinner"])
+
+    def test_weak_etag(self):
+        etags = {
+            self.client.get(
+                "/api/tags/", HTTP_ACCEPT_ENCODING=encoding
+            )["ETag"]
+            for encoding in ("gzip", "identity")
+        }
+        self.assertEqual(len(etags), 1)
+        etag = etags.pop()
+        self.assertTrue(etag.startswith('W/"'))
+        for if_none_match in (etag, etag[2:], f'"other", {etag}'):
+            with self.subTest(if_none_match=if_none_match):
+                response = self.client.get(
+                    "/api/tags/", HTTP_IF_NONE_MATCH=if_none_match
+                )
+                self.assertEqual(response.status_code, 304)
+
+    @override_settings(CATALOG_CACHE_TIMEOUT=0)
+    def test_finite_timeout(self):
+        # Изменения без сигналов (другой процесс) видны по таймауту.
+        self.get_slugs()
+        Tag.objects.bulk_create([Tag(name="dinner", slug="dinner")])
+        self.assertEqual(self.get_slugs(), ["breakfast", "lunch", "dinner"])
+
+
+class LoadIngredientsTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = Path(directory.name) / "ingredients.csv"
+
+    def load(self, *rows):
+        self.path.write_text(
+            "".join(f"{name},{unit}\n" for name, unit in rows),
+            encoding="utf-8",
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command(
+                "load_ingredients", str(self.path), stdout=io.StringIO()
+            )
+
+    def test_skips_duplicates(self):
+        self.load(("соль", "г"), ("соль", "г"), ("сахар", "г"))
+        self.load(("соль", "г"), ("сахар", "кг"))
+        self.assertEqual(
+            sorted(Ingredient.objects.values_list(
+                "name", "measurement_unit"
+            )),
+            [("сахар", "г"), ("сахар", "кг"), ("соль", "г")],
+        )
+
+    def test_refreshes_index_and_catalog(self):
+        self.load(("соль", "г"))
+        self.assertEqual(len(ingredient_index.search("с")), 1)
+        self.assertEqual(len(self.client.get("/api/ingredients/").json()), 1)
+        self.load(("сахар", "г"))
+        self.assertEqual(len(ingredient_index.search("с")), 2)
+        self.assertEqual(len(self.client.get("/api/ingredients/").json()), 2)
+
+
+class IngredientIndexTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        Ingredient.objects.bulk_create(
+            Ingredient(name=name, measurement_unit="г")
+            for name in ("Соус медовый", "Сыр твёрдый", "мёд", "Ёжевика",
+                         "свёкла", "Медовик")
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def search(self, query):
+        return [
+            ingredient["name"] for ingredient in self.client.get(
+                "/api/ingredients/", {"name": query}
+            ).json()
+        ]
+
+    def test_prefix_before_substring(self):
+        self.assertEqual(
+            self.search("мед"), ["мёд", "Медовик", "Соус медовый"]
+        )
+        self.assertEqual(
+            self.search("ВЕ"), ["свёкла", "Сыр твёрдый"]
+        )
+
+    def test_yo_folded(self):
+        self.assertEqual(self.search("МЁД"), self.search("мед"))
+        self.assertEqual(self.search("ТВЕР"), ["Сыр твёрдый"])
+        self.assertEqual(
+            self.search("ё"),
+            ["Ёжевика", "мёд", "Медовик", "свёкла", "Соус медовый",
+             "Сыр твёрдый"],
+        )
+
+
+class CursorPaginationTest(TestCase):
+
+    def test_cursor_with_search_rejected(self):
+        response = self.client.get("/api/recipes/?cursor=&search=суп")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("cursor", response.json())
+
+    def test_cursor_without_search(self):
+        response = self.client.get("/api/recipes/?cursor=")
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("count", response.json())
+
+
+class CachedCountTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user("user")
+        cls.recipes = [
+            create_recipe(cls.user, f"рецепт {number}")
+            for number in range(7)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.client = token_client(self.user)
+
+    def test_personal_filters_not_cached(self):
+        for query in ("is_favorited=1", "is_in_shopping_cart=1"):
+            with self.subTest(query=query):
+                response = self.client.get(f"/api/recipes/?{query}")
+                self.assertEqual(response.data["count"], 0)
+                with self.captureOnCommitCallbacks(execute=True):
+                    self.user.favorite_recipes.set(self.recipes)
+                    self.user.shopping_cart.set(self.recipes)
+                response = self.client.get(
+                    f"/api/recipes/?{query}&page=2&limit=6"
+                )
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.data["count"], 7)
+                self.assertEqual(len(response.data["results"]), 1)
+                with self.captureOnCommitCallbacks(execute=True):
+                    self.user.favorite_recipes.clear()
+                    self.user.shopping_cart.clear()
+
+    def test_own_recipes_not_cached(self):
+        query = f"/api/recipes/?author={self.user.id}"
+        self.assertEqual(self.client.get(query).data["count"], 7)
+        create_recipe(self.user, "новый")
+        self.assertEqual(self.client.get(query).data["count"], 8)
+
+    def test_count_invalidated_on_create(self):
+        # Ответы авторизованным не кешируются, счётчик — кешируется.
+        self.assertEqual(self.client.get("/api/recipes/").data["count"], 7)
+        with self.captureOnCommitCallbacks(execute=True):
+            create_recipe(create_user("author"), "новый")
+        self.assertEqual(self.client.get("/api/recipes/").data["count"], 8)
+
+    def test_feed_count_not_cached(self):
+        author = create_user("author")
+        self.user.following.add(author)
+        self.assertEqual(
+            self.client.get("/api/recipes/feed/?count=1").data["count"], 0
+        )
+        FeedEntry.objects.fan_out(create_recipe(author))
+        self.assertEqual(
+            self.client.get("/api/recipes/feed/?count=1").data["count"], 1
+        )
+
+    @skipUnless(connection.vendor == "postgresql", "оценка есть в PostgreSQL")
+    def test_estimate_cached(self):
+        anonymous = APIClient()
+        anonymous.get("/api/recipes/")
+        with CaptureQueriesContext(connection) as queries:
+            anonymous.get("/api/recipes/?page=2")
+        self.assertFalse([
+            query for query in queries.captured_queries
+            if "pg_class" in query["sql"]
+        ])
+
+
+class RecipeResponseCacheTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.request = RequestFactory().get("/api/recipes/1/")
+        self.request.user = AnonymousUser()
+        self.data = {"id": 1, "author": {"id": 1}}
+
+    def respond(self, render=None):
+        return recipe_response_cache.response(
+            self.request, render or (lambda: Response(self.data)), ()
+        )
+
+    def test_hit_after_miss(self):
+        self.assertEqual(self.respond()["X-Cache"], "MISS")
+        self.assertEqual(self.respond()["X-Cache"], "HIT")
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe_response_cache.invalidate_recipe(1)
+        self.assertEqual(self.respond()["X-Cache"], "MISS")
+
+    def test_change_during_render_not_cached(self):
+        def render():
+            # Рецепт изменён после того, как данные прочитаны из базы.
+            with self.captureOnCommitCallbacks(execute=True):
+                recipe_response_cache.invalidate_recipe(1)
+            return Response(self.data)
+
+        self.assertEqual(self.respond(render)["X-Cache"], "MISS")
+        self.assertEqual(self.respond()["X-Cache"], "MISS")
+
+
+class FastRecipeListTest(TestCase):
+    """Список рецептов совпадает с RecipeReadSerializer байт в байт."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = create_user("author")
+        cls.user = create_user("user")
+        tags = [
+            Tag.objects.create(name=slug, slug=slug)
+            for slug in ("breakfast", "lunch")
+        ]
+        ingredient = Ingredient.objects.create(
+            name="мука", measurement_unit="г"
+        )
+        plain = create_recipe(author, "блины")
+        with_variants = create_recipe(
+            author, "хлеб",
+            image_variants_source="recipes/image.png",
+            image_card="recipes/card.jpg",
+            image_detail="recipes/detail.jpg",
+            image_webp="recipes/image.webp",
+        )
+        for recipe in (plain, with_variants):
+            recipe.tags.set(tags)
+            IngredientAmount.objects.create(
+                recipe=recipe, ingredient=ingredient, amount=100
+            )
+        cls.user.following.add(author)
+        cls.user.favorite_recipes.add(plain)
+        cls.user.shopping_cart.add(with_variants)
+
+    def setUp(self):
+        cache.clear()
+
+    def assert_matches_detail(self, client):
+        response = client.get("/api/recipes/")
+        self.assertEqual(response.status_code, 200)
+        results = response.json()["results"]
+        self.assertEqual(len(results), 2)
+        for recipe in results:
+            with self.subTest(recipe=recipe["name"]):
+                detail = client.get(f"/api/recipes/{recipe['id']}/")
+                self.assertEqual(
+                    JSONRenderer().render(recipe), detail.content
+                )
+        return results
+
+    def test_anonymous(self):
+        results = self.assert_matches_detail(APIClient())
+        self.assertFalse(any(
+            recipe["is_favorited"] or recipe["is_in_shopping_cart"]
+            for recipe in results
+        ))
+
+    def test_authenticated(self):
+        results = self.assert_matches_detail(token_client(self.user))
+        self.assertEqual(
+            [
+                (
+                    recipe["is_favorited"], recipe["is_in_shopping_cart"],
+                    recipe["author"]["is_subscribed"],
+                    recipe["image_variants"] is not None,
+                )
+                for recipe in results
+            ],
+            [(False, True, True, True), (True, False, True, False)],
+        )
+
+
+class UserRecipeIdsTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user("user")
+        cls.recipes = [
+            create_recipe(cls.user, f"рецепт {number}")
+            for number in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def test_invalidated_on_write(self):
+        first, second, third = self.recipes
+        self.assertEqual(favorite_ids.get(self.user.id), frozenset())
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.favorite_recipes.add(first, second)
+        self.assertEqual(
+            favorite_ids.get(self.user.id), {first.id, second.id}
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            first.is_favorited.remove(self.user)
+            ProfileFavorite.objects.create(user=self.user, recipe=third)
+        self.assertEqual(
+            favorite_ids.get(self.user.id), {second.id, third.id}
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            second.is_favorited.clear()
+        self.assertEqual(favorite_ids.get(self.user.id), {third.id})
+
+    def test_load_before_write_not_cached(self):
+        recipe = self.recipes[0]
+        key = shopping_cart_ids.get_key(self.user.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.shopping_cart.add(recipe)
+        # Загрузка, начатая до записи, сохраняется под старым ключом.
+        cache.set(key, shopping_cart_ids.pack(()))
+        self.assertEqual(shopping_cart_ids.get(self.user.id), {recipe.id})
+
+
+class RecipeSearchTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        author = create_user("author")
+        for name in ("щи", "ёжики", "блины"):
+            create_recipe(author, name)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_search(self):
+        response = self.client.get("/api/recipes/?search=ежики")
+        self.assertEqual(
+            [recipe["name"] for recipe in response.data["results"]],
+            ["ёжики"],
+        )
+
+    def test_backend_of_queryset_database(self):
+        queryset = search_recipes(Recipe.objects.using("default"), "щи")
+        self.assertEqual(queryset.db, "default")
+        self.assertEqual([recipe.name for recipe in queryset], ["щи"])
+
+
+class CookableIndexTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        author = create_user("author")
+        cls.ingredients = [
+            Ingredient.objects.create(name=name, measurement_unit="г")
+            for name in ("мука", "яйца", "молоко")
+        ]
+        cls.recipe = create_recipe(author, "блины")
+        IngredientAmount.objects.create(
+            recipe=cls.recipe, ingredient=cls.ingredients[0], amount=1
+        )
+
+    def setUp(self):
+        self.index = CookableIndex()
+        self.flour, self.eggs, self.milk = (
+            ingredient.id for ingredient in self.ingredients
+        )
+
+    def test_changes_applied_incrementally(self):
+        self.assertEqual(self.index.search([self.flour]), [
+            (self.recipe.id, 1, 1)
+        ])
+        with self.captureOnCommitCallbacks(execute=True):
+            IngredientAmount.objects.create(
+                recipe=self.recipe, ingredient_id=self.eggs, amount=2
+            )
+        with patch.object(self.index, "warm") as warm:
+            self.assertEqual(self.index.search([self.flour, self.milk]), [
+                (self.recipe.id, 1, 2)
+            ])
+        warm.assert_not_called()
+
+    def test_invalidate_rebuilds_in_background(self):
+        self.index.build()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.index.invalidate()
+        with patch.object(self.index, "warm") as warm:
+            self.assertEqual(len(self.index.search([self.flour])), 1)
+        warm.assert_called_once_with()
+
+    def test_recent_gap_reread(self):
+        self.index.build()
+        sequence = self.index._bitsets.sequence
+        RecipeChange.objects.create(id=sequence + 2, recipe_id=self.recipe.id)
+        self.index.search([self.flour])
+        self.assertEqual(self.index._bitsets.sequence, sequence)
+
+        RecipeChange.objects.filter(id=sequence + 2).update(
+            created=timezone.now() - timedelta(minutes=1)
+        )
+        self.index.search([self.flour])
+        self.assertEqual(self.index._bitsets.sequence, sequence + 2)
+
+    def test_recipe_delete_records_one_change(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            IngredientAmount.objects.create(
+                recipe=self.recipe, ingredient_id=self.eggs, amount=2
+            )
+        last = RecipeChange.objects.latest("id").id
+        recipe_id = self.recipe.id
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipe.delete()
+        self.assertEqual(
+            list(
+                RecipeChange.objects.filter(id__gt=last).values_list(
+                    "recipe_id", flat=True
+                )
+            ),
+            [recipe_id],
+        )
+
+    def test_sync_prunes_applied_changes(self):
+        self.index.build()
+        old = timezone.now() - timedelta(days=2)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.index.invalidate()
+        stale = RecipeChange.objects.latest("id")
+        RecipeChange.objects.filter(id=stale.id).update(created=old)
+        self.index.build()
+        with self.captureOnCommitCallbacks(execute=True):
+            IngredientAmount.objects.create(
+                recipe=self.recipe, ingredient_id=self.eggs, amount=2
+            )
+        fresh = RecipeChange.objects.latest("id")
+        RecipeChange.objects.filter(id=fresh.id).update(created=old)
+        self.index._bitsets.pruned_at -= COOKABLE_INDEX_PRUNE_INTERVAL + 1
+
+        self.index.search([self.flour])
+        self.assertEqual(self.index._bitsets.sequence, fresh.id)
+        self.assertFalse(RecipeChange.objects.filter(id__lte=fresh.id))
+
+    def test_endpoint(self):
+        pancakes = create_recipe(self.recipe.author, "оладьи")
+        IngredientAmount.objects.bulk_create(
+            IngredientAmount(recipe=pancakes, ingredient_id=ingredient_id,
+                             amount=1)
+            for ingredient_id in (self.flour, self.eggs)
+        )
+        with patch("api.views.cookable_index", self.index):
+            response = self.client.get(
+                "/api/recipes/cookable/",
+                {"ingredients": f"{self.flour},{self.milk}"},
+            )
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(
+                [
+                    (recipe["id"], recipe["coverage"], recipe["missing_count"])
+                    for recipe in response.data["results"]
+                ],
+                [(self.recipe.id, 1, 0), (pancakes.id, 0.5, 1)],
+            )
+            for query in ("", "?ingredients=мука", "?ingredients=0"):
+                with self.subTest(query=query):
+                    self.assertEqual(
+                        self.client.get(
+                            f"/api/recipes/cookable/{query}"
+                        ).status_code,
+                        400,
+                    )
+
+
+class TagFilterTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        author = create_user("author")
+        cls.tag = Tag.objects.create(name="обед", slug="lunch")
+        cls.recipe = create_recipe(author, "суп")
+        RecipeTag.objects.create(recipe=cls.recipe, tag=cls.tag)
+        Recipe.objects.refresh_tag_masks([cls.recipe.id])
+
+    def setUp(self):
+        cache.clear()
+
+    def get_ids(self, query):
+        response = self.client.get(f"/api/recipes/?{query}")
+        self.assertEqual(response.status_code, 200)
+        return [recipe["id"] for recipe in response.data["results"]]
+
+    def test_unknown_slug_reloaded(self):
+        # Словарь, закешированный до создания тега в другом процессе.
+        cache.set(TAG_SLUGS_KEY, {}, None)
+        self.assertEqual(self.get_ids("tags=lunch"), [self.recipe.id])
+        self.assertEqual(cache.get(TAG_SLUGS_KEY), {"lunch": [self.tag.id]})
+
+    def test_missing_slug_matches_nothing(self):
+        queryset = RecipeFilterSet().get_tags(
+            Recipe.objects.all(), "tags", ["lunch", "deleted"]
+        )
+        self.assertEqual(list(queryset), [self.recipe])
+
+    def test_unknown_slug_reloads_once_per_interval(self):
+        get_tag_ids_by_slug()
+        with self.assertNumQueries(1):
+            for _ in range(3):
+                self.assertEqual(
+                    get_tag_ids_by_slug(["deleted"]),
+                    {"lunch": [self.tag.id]},
+                )
+
+        cache.delete(TAG_SLUGS_RELOAD_KEY)
+        with self.assertNumQueries(1):
+            get_tag_ids_by_slug(["deleted"])
+
+    def test_admin_move_refreshes_both_recipes(self):
+        dinner = create_recipe(self.recipe.author, "плов")
+        admin = Profile.objects.create_superuser(
+            username="admin", email="admin@example.com", password="pw"
+        )
+        self.client.force_login(admin)
+        recipe_tag = RecipeTag.objects.get(recipe=self.recipe)
+
+        response = self.client.post(
+            f"/admin/recipes/recipetag/{recipe_tag.id}/change/",
+            {"recipe": dinner.id, "tag": self.tag.id},
+        )
+        self.assertEqual(response.status_code, 302)
+        self.recipe.refresh_from_db()
+        dinner.refresh_from_db()
+        self.assertEqual(self.recipe.tag_mask, 0)
+        self.assertEqual(dinner.tag_mask, tag_mask([self.tag.id]))
+        self.assertEqual(self.get_ids("tags=lunch"), [dinner.id])
+
+
+def seq_scans(node, under_limit=False):
+    """Seq Scan с фильтром или под Limit: (таблица, описание узла)."""
+    under_limit = under_limit or node["Node Type"] == "Limit"
+    if node["Node Type"] == "Seq Scan" and (
+        "Filter" in node or under_limit
+    ):
+        reason = node.get("Filter") or "под Limit"
+        yield node["Relation Name"], f"Seq Scan ({reason})"
+    for child in node.get("Plans", ()):
+        yield from seq_scans(child, under_limit)
+
+
+@skipUnless(
+    connection.vendor == "postgresql",
+    "планы запросов проверяются на PostgreSQL",
+)
+class QueryPlanTest(TestCase):
+    """Основные запросы API не просматривают таблицы целиком.
+
+    С enable_seqscan = off планировщик берёт индекс, если он есть,
+    поэтому Seq Scan с фильтром или под Limit значит, что подходящего
+    индекса нет.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user("author")
+        cls.user = create_user("user")
+        cls.user.following.add(cls.author)
+        cls.tag = Tag.objects.create(name="обед", slug="lunch")
+        ingredient = Ingredient.objects.create(
+            name="мука", measurement_unit="г"
+        )
+        cls.recipe = create_recipe(cls.author, "блины")
+        RecipeTag.objects.create(recipe=cls.recipe, tag=cls.tag)
+        IngredientAmount.objects.create(
+            recipe=cls.recipe, ingredient=ingredient, amount=1
+        )
+        cls.user.favorite_recipes.add(cls.recipe)
+        cls.user.shopping_cart.add(cls.recipe)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+
+    def get_cases(self):
+        """(URL, таблицы, где полный просмотр допустим)."""
+        return (
+            ("/api/recipes/", ()),
+            # Маска тегов не индексируется; COUNT(*) кешируется.
+            (f"/api/recipes/?tags={self.tag.slug}", ("recipes_recipe",)),
+            (f"/api/recipes/?author={self.author.id}", ()),
+            ("/api/recipes/?is_favorited=1", ()),
+            ("/api/recipes/?is_favorited=0", ()),
+            ("/api/recipes/?is_in_shopping_cart=1", ()),
+            ("/api/recipes/?is_in_shopping_cart=0", ()),
+            ("/api/recipes/?search=блины", ()),
+            (f"/api/recipes/{self.recipe.id}/", ()),
+            ("/api/recipes/feed/", ()),
+            ("/api/recipes/download_shopping_cart/?format=txt", ()),
+            ("/api/users/subscriptions/?recipes_limit=3", ()),
+        )
+
+    def get_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+            if response.streaming:
+                b"".join(response.streaming_content)
+        self.assertEqual(response.status_code, 200)
+        return [
+            query["sql"] for query in context.captured_queries
+            if query["sql"].lstrip().upper().startswith("SELECT")
+        ]
+
+    def test_no_seq_scans(self):
+        for url, allowed in self.get_cases():
+            for sql in self.get_queries(url):
+                with self.subTest(url=url, sql=sql):
+                    with connection.cursor() as cursor:
+                        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}")
+                        plan = cursor.fetchone()[0]
+                    if isinstance(plan, str):
+                        plan = json.loads(plan)
+                    self.assertEqual([
+                        problem
+                        for problem in seq_scans(plan[0]["Plan"])
+                        if problem[0] not in allowed
+                    ], [])
+
+
+@override_settings(DATABASE_REPLICAS=["default"])
+class ReplicaPinTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user("user")
+        cls.recipe = create_recipe(cls.user, "блины")
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get_recipes(self):
+        with patch(
+            "api.mixins.choose_replica", return_value="default"
+        ) as choose_replica:
+            self.assertEqual(
+                self.client.get("/api/recipes/").status_code, 200
+            )
+        return choose_replica.called
+
+    def test_write_pins_reads_to_primary(self):
+        self.assertTrue(self.get_recipes())
+        response = self.client.post(f"/api/recipes/{self.recipe.id}/favorite/")
+        self.assertEqual(response.status_code, 201)
+        self.assertIn(PIN_COOKIE, response.cookies)
+        self.assertFalse(self.get_recipes())
+
+    def test_pin_of_other_user_ignored(self):
+        other = create_user("other")
+        self.client.post(f"/api/recipes/{self.recipe.id}/favorite/")
+        self.client.force_authenticate(other)
+        self.assertTrue(self.get_recipes())
+
+    @override_settings(REPLICA_PIN_SECONDS=0)
+    def test_pin_expires(self):
+        self.client.post(f"/api/recipes/{self.recipe.id}/favorite/")
+        self.assertTrue(self.get_recipes())
+
+
+class FakeConnection:
+    """Соединение psycopg2 ровно настолько, насколько его видит пул."""
+
+    def __init__(self, status=extensions.TRANSACTION_STATUS_IDLE):
+        self.closed = False
+        self.info = SimpleNamespace(transaction_status=status)
+        self.rolled_back = False
+
+    def rollback(self):
+        self.rolled_back = True
+        self.info.transaction_status = extensions.TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPoolTest(SimpleTestCase):
+
+    def test_timeout_when_exhausted(self):
+        pool = ConnectionPool(max_size=1, timeout=0.05)
+        pool.acquire(FakeConnection)
+        with self.assertRaises(PoolTimeout):
+            pool.acquire(FakeConnection)
+        self.assertEqual(pool.get_stats()["timeouts"], 1)
+
+    def test_released_connection_reused(self):
+        pool = ConnectionPool(max_size=1, timeout=0.05)
+        connection = pool.acquire(FakeConnection)
+        pool.release(connection)
+        self.assertIs(pool.acquire(FakeConnection), connection)
+
+    def test_idle_expiry(self):
+        pool = ConnectionPool(max_size=1, idle_timeout=300)
+        connection = pool.acquire(FakeConnection)
+        with patch("foodgram.db.pool.time.monotonic", return_value=1000):
+            pool.release(connection)
+        with patch("foodgram.db.pool.time.monotonic", return_value=1301):
+            fresh = pool.acquire(FakeConnection)
+        self.assertIsNot(fresh, connection)
+        self.assertTrue(connection.closed)
+        self.assertEqual(pool.get_stats()["expired"], 1)
+
+    def test_failed_connect_frees_slot(self):
+        pool = ConnectionPool(max_size=1, timeout=0.05)
+
+        def connect():
+            raise OperationalError("нет соединения")
+
+        with self.assertRaises(OperationalError):
+            pool.acquire(connect)
+        self.assertEqual(pool.get_stats()["size"], 0)
+        self.assertIsInstance(pool.acquire(FakeConnection), FakeConnection)
+
+    def test_release_rolls_back(self):
+        pool = ConnectionPool(max_size=2)
+        for status in (
+            extensions.TRANSACTION_STATUS_INTRANS,
+            extensions.TRANSACTION_STATUS_INERROR,
+        ):
+            with self.subTest(status=status):
+                connection = pool.acquire(
+                    partial(FakeConnection, status)
+                )
+                pool.release(connection)
+                self.assertTrue(connection.rolled_back)
+                self.assertFalse(connection.closed)
+                self.assertIs(pool.acquire(FakeConnection), connection)
+
+    def test_release_discards_broken(self):
+        pool = ConnectionPool(max_size=1)
+        connection = pool.acquire(
+            partial(FakeConnection, extensions.TRANSACTION_STATUS_UNKNOWN)
+        )
+        pool.release(connection)
+        self.assertTrue(connection.closed)
+        self.assertEqual(pool.get_stats()["size"], 0)
+
+    def test_recreated_after_fork(self):
+        self.addCleanup(pools.pop, "fork-test", None)
+        options = {"max_size": 1}
+        pool = get_pool("fork-test", options)
+        self.assertIs(get_pool("fork-test", options), pool)
+        with patch(
+            "foodgram.db.pool.os.getpid", return_value=pool.pid + 1
+        ):
+            child = get_pool("fork-test", options)
+        self.assertIsNot(child, pool)
+        self.assertEqual(child.pid, pool.pid + 1)
@@ -1,5 +1,6 @@
-from recipes.models import Ingredient, Recipe
+from recipes.models import Ingredient, Recipe, Tag
 from rest_framework import serializers, status
+from rest_framework.relations import PrimaryKeyRelatedField
 
 
 class NotFoundError(serializers.ValidationError):
@@ -21,18 +22,32 @@ def repetitive_values(ingredients, tags):
         )
 
 
-def nonexistent_values(ingredient):
-    existent_ingredient = Ingredient.objects.filter(
-        id=ingredient["id"]
-    ).exists()
+def nonexistent_values(ingredients):
+    ingredient_ids = {ingredient["id"] for ingredient in ingredients}
+    existent_ingredients = Ingredient.objects.filter(
+        id__in=ingredient_ids
+    ).count()
 
-    if not existent_ingredient:
+    if existent_ingredients < len(ingredient_ids):
         raise serializers.ValidationError(
             {"error": "Несуществующий ингредиент."},
             code=status.HTTP_400_BAD_REQUEST
         )
 
 
+def nonexistent_tags(tag_ids):
+    tags = Tag.objects.in_bulk(tag_ids)
+    for tag_id in tag_ids:
+        if tag_id not in tags:
+            raise serializers.ValidationError(
+                PrimaryKeyRelatedField.default_error_messages[
+                    "does_not_exist"
+                ].format(pk_value=tag_id),
+                code="does_not_exist",
+            )
+    return [tags[tag_id] for tag_id in tag_ids]
+
+
 def nonexistent_recipe(pk):
     if not Recipe.objects.filter(id=pk).exists():
         raise serializers.ValidationError(
@@ -1,34 +1,96 @@
-from django.db.models import Sum
-from django.http import HttpResponse
+from collections import defaultdict
+from functools import partial
+
+from django.db import transaction
+from django.db.models import F, OuterRef, Prefetch, Subquery
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from djoser.views import UserViewSet
-from recipes.models import Ingredient
+from recipes.models import FeedEntry, Ingredient, IngredientAmount
 from recipes.models import Profile as User
-from recipes.models import Recipe, Tag
-from rest_framework import status, viewsets
+from recipes.models import Recipe, ShoppingListItem, Tag
+from rest_framework import filters, serializers, status, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.pagination import LimitOffsetPagination
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
+from .catalog import CatalogResponseCache
+from .constants import ITERATOR_CHUNK_SIZE
+from .cookable_index import cookable_index
+from .fast_serializers import fast_recipe_list_serializer
 from .filters import IngredientSearchFilter, RecipeFilterSet
-from .mixins import TagIngredientMixin
-from .paginators import PageNumberAsLimitOffset
+from .ingredient_index import ingredient_index
+from .mixins import ReplicaReadMixin, TagIngredientMixin
+from .paginators import (CachedCountLimitOffsetPagination, FeedPagination,
+                         PageNumberOrCursorPagination, RankedListPagination)
 from .permissions import IsAuthorOrReadOnly, IsUserOrReadOnly
-from .serializers import (IngredientinRecipeSerializer, IngredientSerializer,
+from .recipe_sets import favorite_ids, shopping_cart_ids
+from .renderers import SHOPPING_CART_RENDERERS
+from .response_cache import recipe_response_cache
+from .serializers import (CookableQuerySerializer, CookableRecipeSerializer,
+                          IngredientinRecipeSerializer, IngredientSerializer,
                           ProfileFavoriteSerializer, ProfileSerializer,
                           RecipeReadSerializer, RecipeWriteSerializer,
                           ShoppingCartSerializer, SubscribeAuthorSerializer,
                           SubscriptionsSerializer, TagSerializer)
 
 
-class ProfileViewSet(UserViewSet):
+def get_latest_recipes(author_ids, limit=None):
+    """Последние рецепты авторов одним запросом.
+
+    При заданном limit рецепты каждого автора отсекаются в SQL
+    коррелированным подзапросом с LIMIT по индексу (author, -pub_date).
+    """
+    recipes_by_author = defaultdict(list)
+    if not author_ids or limit == 0:
+        return recipes_by_author
+
+    recipes = Recipe.objects.filter(author_id__in=author_ids)
+    if limit is not None:
+        # Django 3.2 не умеет фильтровать по Window(RowNumber()),
+        # поэтому первые limit рецептов автора выбирает подзапрос.
+        recipes = recipes.filter(
+            pk__in=Subquery(
+                Recipe.objects.filter(
+                    author_id=OuterRef("author_id")
+                ).order_by("-pub_date", "-id").values("pk")[:limit]
+            )
+        )
+
+    for recipe in recipes.order_by("author_id", "-pub_date", "-id"):
+        recipes_by_author[recipe.author_id].append(recipe)
+    return recipes_by_author
+
+
+def get_recipes_limit(request):
+    """Параметр recipes_limit: None или неотрицательное целое."""
+    limit = request.GET.get("recipes_limit")
+    if limit is None:
+        return None
+    try:
+        return serializers.IntegerField(min_value=0).run_validation(limit)
+    except ValidationError:
+        raise ValidationError(
+            {"recipes_limit": "Ожидается неотрицательное целое число."}
+        )
+
+
+class ProfileViewSet(ReplicaReadMixin, UserViewSet):
 
     http_method_names = ["get", "post"]
-    pagination_class = LimitOffsetPagination
+    pagination_class = CachedCountLimitOffsetPagination
     serializer_class = ProfileSerializer
     permission_classes = (IsUserOrReadOnly,)
-
+    query_budgets = {
+        "me": 2,
+        "retrieve": 3,
+        "subscribe": 9,
+        "subscriptions": 4,
+    }
+
+    # Подписки меняет сам пользователь, поэтому их число не кешируется.
     @action(
         detail=False, methods=["get"],
         permission_classes=(IsAuthenticated,),
@@ -37,9 +99,16 @@ class ProfileViewSet(UserViewSet):
     def subscriptions(self, request):
         queryset = request.user.following.all()
         page = self.paginate_queryset(queryset)
+        author_ids = [author.id for author in page]
         serializer = SubscriptionsSerializer(
             page, many=True,
-            context={"request": request}
+            context={
+                "request": request,
+                "following_ids": set(author_ids),
+                "recipes_by_author": get_latest_recipes(
+                    author_ids, get_recipes_limit(request)
+                ),
+            }
         )
         return self.get_paginated_response(serializer.data)
 
@@ -61,7 +130,9 @@ class ProfileViewSet(UserViewSet):
                 }
             )
             serializer.is_valid(raise_exception=True)
-            request.user.following.add(author)
+            with transaction.atomic():
+                request.user.following.add(author)
+                FeedEntry.objects.backfill(request.user.id, author.id)
             return Response(
                 serializer.data,
                 status=status.HTTP_201_CREATED
@@ -71,7 +142,9 @@ class ProfileViewSet(UserViewSet):
             get_object_or_404(
                 User, id=request.user.id, following=author
             )
-            request.user.following.remove(author)
+            with transaction.atomic():
+                request.user.following.remove(author)
+                FeedEntry.objects.trim(request.user.id, author.id)
             return Response(
                 {"detail": "Вы отписались от данного пользователя."},
                 status=status.HTTP_204_NO_CONTENT
@@ -91,15 +164,31 @@ class ProfileViewSet(UserViewSet):
         return Response(serializer.data)
 
 
+TAG_SEARCH_PARAM = filters.SearchFilter.search_param
+
+tag_catalog = CatalogResponseCache(
+    "tags", lambda: TagSerializer(Tag.objects.all(), many=True).data
+)
+ingredient_catalog = CatalogResponseCache(
+    "ingredients",
+    lambda: IngredientSerializer(Ingredient.objects.all(), many=True).data
+)
+
+
 class TagViewSet(
-    TagIngredientMixin
+    ReplicaReadMixin, TagIngredientMixin
 ):
     serializer_class = TagSerializer
     queryset = Tag.objects.all()
 
+    def list(self, request, *args, **kwargs):
+        if request.GET.get(TAG_SEARCH_PARAM):
+            return super().list(request, *args, **kwargs)
+        return tag_catalog.response(request)
+
 
 class IngredientViewSet(
-    TagIngredientMixin
+    ReplicaReadMixin, TagIngredientMixin
 ):
     queryset = Ingredient.objects.all()
     filter_backends = (IngredientSearchFilter,)
@@ -109,6 +198,14 @@ class IngredientViewSet(
             return IngredientinRecipeSerializer
         return IngredientSerializer
 
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get(IngredientSearchFilter.search_param)
+        if request.GET.get("recipe"):
+            return super().list(request, *args, **kwargs)
+        if name:
+            return Response(ingredient_index.search(name))
+        return ingredient_catalog.response(request)
+
     def get_serializer_context(self):
         context = {"request": self.request}
         recipe = self.request.GET.get("recipe")
@@ -117,18 +214,172 @@ class IngredientViewSet(
         return context
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
-    queryset = Recipe.objects.all().order_by('-pub_date')
-    pagination_class = PageNumberAsLimitOffset
+class RecipeViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
+    queryset = Recipe.objects.all().order_by('-pub_date', '-id')
+    pagination_class = PageNumberOrCursorPagination
     serializer_class = RecipeReadSerializer
     filterset_class = RecipeFilterSet
     permission_classes = (IsAuthorOrReadOnly,)
+    read_actions = ("list", "retrieve", "feed", "cookable")
+    # Число рецептов без фильтров на PostgreSQL оценивается по pg_class,
+    # отсюда лишний запрос в list. Строки списка покупок читаются уже
+    # при отдаче потока и в бюджет download_shopping_cart не входят.
+    # update — худший случай: ингредиенты и теги и удалены, и добавлены,
+    # количества изменены, а рецепт лежит в корзинах; в SQLite поисковый
+    # индекс FTS обновляется двумя запросами вместо одного. create —
+    # с раскладкой рецепта по лентам подписчиков автора. cookable —
+    # с догрузкой изменённых рецептов и периодической чисткой журнала.
+    query_budgets = {
+        "list": 9,
+        "retrieve": 7,
+        "feed": 8,
+        "cookable": 10,
+        "create": 17,
+        "update": 27,
+        "partial_update": 27,
+        "download_shopping_cart": 1,
+        "shopping_cart": 11,
+        "remove_from_shopping_cart": 9,
+        "favorite": 6,
+        "delete_from_favorite": 6,
+    }
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action not in self.read_actions:
+            return queryset
+
+        return queryset.select_related("author").prefetch_related(
+            "tags",
+            Prefetch(
+                "ingredientamount_set",
+                queryset=IngredientAmount.objects.select_related(
+                    "ingredient"
+                ),
+                to_attr="ingredient_amounts",
+            ),
+        )
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.action in self.read_actions:
+            user = self.request.user
+            context["following_ids"] = (
+                set(user.following.values_list("id", flat=True))
+                if user.is_authenticated else set()
+            )
+            context["favorite_ids"] = favorite_ids.get(user.id)
+            context["shopping_cart_ids"] = shopping_cart_ids.get(user.id)
+        return context
 
     def get_serializer_class(self):
-        if self.action in ("list", "retrieve"):
+        if self.action in self.read_actions:
             return RecipeReadSerializer
         return RecipeWriteSerializer
 
+    def list_rows(self, request):
+        """list() на строках values() и FastRecipeListSerializer."""
+        queryset = fast_recipe_list_serializer.get_queryset(
+            self.filter_queryset(self.get_queryset())
+        )
+        page = self.paginate_queryset(queryset)
+        rows = list(queryset if page is None else page)
+        data = fast_recipe_list_serializer.serialize(
+            rows, self.get_serializer_context()
+        )
+        if page is None:
+            return Response(data)
+        return self.get_paginated_response(data)
+
+    def list(self, request, *args, **kwargs):
+        return recipe_response_cache.response(
+            request,
+            partial(self.list_rows, request),
+            (
+                *self.filterset_class.base_filters,
+                *self.paginator.pagination_params,
+            ),
+            lists=True,
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return recipe_response_cache.response(
+            request, partial(super().retrieve, request, *args, **kwargs), ()
+        )
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        ShoppingListItem.objects.remove_recipe(
+            instance.is_in_shopping_cart.values_list("id", flat=True),
+            instance.id
+        )
+        instance.delete()
+
+    @action(
+        detail=False,
+        methods=("get",),
+        permission_classes=(IsAuthenticated,),
+        pagination_class=FeedPagination,
+    )
+    def feed(self, request):
+        entries = self.paginate_queryset(
+            FeedEntry.objects.filter(user=request.user)
+        )
+        recipes = self.get_queryset().in_bulk(
+            [entry.recipe_id for entry in entries]
+        )
+        serializer = self.get_serializer(
+            [
+                recipes[entry.recipe_id] for entry in entries
+                if entry.recipe_id in recipes
+            ],
+            many=True,
+        )
+        return self.get_paginated_response(serializer.data)
+
+    @action(
+        detail=False,
+        methods=("get",),
+        pagination_class=RankedListPagination,
+    )
+    def cookable(self, request):
+        """Что приготовить из имеющихся ингредиентов.
+
+        Ингредиенты передаются как ?ingredients=1,2 или повтором
+        параметра. Рецепты упорядочены по доле имеющихся ингредиентов.
+        """
+        query = CookableQuerySerializer(
+            data={
+                "ingredients": [
+                    value
+                    for values in request.query_params.getlist("ingredients")
+                    for value in values.split(",") if value
+                ]
+            }
+        )
+        query.is_valid(raise_exception=True)
+
+        matches = self.paginate_queryset(
+            cookable_index.search(query.validated_data["ingredients"])
+        )
+        recipes = self.get_queryset().in_bulk(
+            [recipe_id for recipe_id, _, _ in matches]
+        )
+        context = self.get_serializer_context()
+        context["coverage"] = {
+            recipe_id: (available, total)
+            for recipe_id, available, total in matches
+        }
+        serializer = CookableRecipeSerializer(
+            [
+                recipes[recipe_id] for recipe_id, _, _ in matches
+                if recipe_id in recipes
+            ],
+            many=True,
+            context=context,
+        )
+        return self.get_paginated_response(serializer.data)
+
     @staticmethod
     def post_or_delete(
         request, pk, serializer_class,
@@ -197,26 +448,29 @@ class RecipeViewSet(viewsets.ModelViewSet):
         detail=False,
         methods=("get",),
         permission_classes=(IsAuthenticated,),
+        renderer_classes=SHOPPING_CART_RENDERERS,
     )
     def download_shopping_cart(self, request):
 
-        ingredients = request.user.shopping_cart.values(
-            "ingredients__name", "ingredients__measurement_unit"
-        ).annotate(
-            amount=Sum("ingredientamount__amount")
-        ).order_by()
-
-        content = ""
-
-        for ingredient in ingredients:
-            name = ingredient["ingredients__name"]
-            unit = ingredient["ingredients__measurement_unit"]
-            amount = ingredient["amount"]
-
-            content += f"{name} ({unit}) — {amount}\n"
-
-        filename = "shopping_cart.txt"
-        response = HttpResponse(content, content_type="text/plain")
+        ingredients = ShoppingListItem.objects.filter(
+            user=request.user
+        ).values(
+            "amount",
+            name=F("ingredient__name"),
+            measurement_unit=F("ingredient__measurement_unit"),
+        ).order_by("ingredient__name")
+
+        renderer = request.accepted_renderer
+        content_type = renderer.media_type
+        if renderer.charset:
+            content_type += f"; charset={renderer.charset}"
+        response = StreamingHttpResponse(
+            renderer.stream(
+                ingredients.iterator(chunk_size=ITERATOR_CHUNK_SIZE)
+            ),
+            content_type=content_type
+        )
+        filename = f"shopping_cart.{renderer.format}"
         response["Content-Disposition"] = (
             "attachment; filename={0}".format(filename)
         )
@@ -235,7 +489,9 @@ class RecipeViewSet(viewsets.ModelViewSet):
             request, pk, ShoppingCartSerializer
         )
 
-        request.user.shopping_cart.add(pk)
+        with transaction.atomic():
+            request.user.shopping_cart.add(pk)
+            ShoppingListItem.objects.add_recipe([request.user.id], pk)
 
         serializer = RecipeReadSerializer(
             recipe, fields=["id", "name", "image", "cooking_time"]
@@ -249,7 +505,9 @@ class RecipeViewSet(viewsets.ModelViewSet):
             request, pk, ShoppingCartSerializer
         )
 
-        request.user.shopping_cart.remove(pk)
+        with transaction.atomic():
+            request.user.shopping_cart.remove(pk)
+            ShoppingListItem.objects.remove_recipe([request.user.id], pk)
 
         return Response(
             {"message": "Рецепт успешно удален из списка покупок"},
@@ -5,3 +5,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
 
 application = get_asgi_application()
+
+from api.cookable_index import cookable_index  # noqa: E402
+
+# Индекс «что приготовить» строится до первых запросов.
+cookable_index.warm()
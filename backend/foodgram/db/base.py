@@ -0,0 +1,90 @@
+from functools import partial
+
+from django.db.backends.base.base import NO_DB_ALIAS
+from django.db.backends.postgresql import base
+
+from .pool import get_pool
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """Бэкенд PostgreSQL с пулом соединений и проверкой их исправности.
+
+    OPTIONS['pool'] — параметры ConnectionPool; при max_size больше 0
+    соединение берётся из пула процесса, а close() возвращает его
+    в пул. CONN_HEALTH_CHECKS повторяет одноимённую настройку
+    Django 4.1: постоянное соединение (CONN_MAX_AGE) проверяется
+    запросом перед первым обращением к базе в каждом HTTP-запросе,
+    а соединение из пула — при выдаче.
+    """
+
+    health_check_enabled = False
+    health_check_done = False
+
+    @property
+    def pool(self):
+        options = self.settings_dict['OPTIONS'].get('pool')
+        # Служебные соединения с базой postgres в пул не попадают.
+        if (
+            not options or not options.get('max_size')
+            or self.alias == NO_DB_ALIAS
+        ):
+            return None
+        return get_pool(
+            self.alias, options,
+            check=self.settings_dict.get('CONN_HEALTH_CHECKS', False),
+        )
+
+    def get_connection_params(self):
+        conn_params = super().get_connection_params()
+        conn_params.pop('pool', None)
+        return conn_params
+
+    def get_new_connection(self, conn_params):
+        pool = self.pool
+        if pool is None:
+            return super().get_new_connection(conn_params)
+        connection = pool.acquire(
+            partial(super().get_new_connection, conn_params)
+        )
+        self.isolation_level = self.settings_dict['OPTIONS'].get(
+            'isolation_level', connection.isolation_level
+        )
+        return connection
+
+    def connect(self):
+        super().connect()
+        self.health_check_enabled = self.settings_dict.get(
+            'CONN_HEALTH_CHECKS', False
+        )
+        self.health_check_done = True
+
+    def _close(self):
+        pool = self.pool
+        if pool is None or self.connection is None:
+            return super()._close()
+        # Закрытое внутри atomic соединение остаётся у обёртки до конца
+        # блока, поэтому отдавать его другим потокам нельзя.
+        with self.wrap_database_errors:
+            if self.in_atomic_block:
+                pool.discard(self.connection)
+            else:
+                pool.release(self.connection)
+
+    def close_if_unusable_or_obsolete(self):
+        if self.connection is not None:
+            self.health_check_done = False
+        super().close_if_unusable_or_obsolete()
+
+    def close_if_health_check_failed(self):
+        if (
+            self.connection is None or not self.health_check_enabled
+            or self.health_check_done
+        ):
+            return
+        if not self.is_usable():
+            self.close()
+        self.health_check_done = True
+
+    def _cursor(self, name=None):
+        self.close_if_health_check_failed()
+        return super()._cursor(name)
@@ -0,0 +1,230 @@
+import os
+import threading
+import time
+from collections import deque
+
+import psycopg2 as Database
+from psycopg2 import extensions
+
+# Пулы процесса по алиасам баз. После fork дочерний процесс создаёт
+# свои пулы: соединения родителя ему использовать нельзя.
+pools = {}
+pools_lock = threading.Lock()
+
+
+class PoolTimeout(Database.OperationalError):
+    pass
+
+
+class ConnectionPool:
+    """Пул соединений с PostgreSQL, общий для потоков процесса.
+
+    Не больше max_size открытых соединений: когда все выданы, acquire()
+    ждёт освобождения до timeout секунд. Свободное соединение выдаётся
+    последним вернувшееся, поэтому лишние после пика простаивают
+    и закрываются через idle_timeout секунд. При check свободное
+    соединение перед выдачей проверяется запросом.
+    """
+
+    def __init__(self, max_size, idle_timeout=300, timeout=30, check=False):
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.check = check
+        self.pid = os.getpid()
+        self.condition = threading.Condition()
+        self.idle = deque()
+        self.size = 0
+        self.waiting = 0
+        self.counters = dict.fromkeys(
+            (
+                'requests', 'reused', 'created', 'waits', 'timeouts',
+                'health_check_failures', 'expired', 'discarded',
+            ),
+            0,
+        )
+        self.timings = dict.fromkeys(
+            ('acquire', 'wait', 'wait_max', 'connect', 'connect_max'), 0.0
+        )
+
+    def pop_expired(self):
+        expired = []
+        deadline = time.monotonic() - self.idle_timeout
+        while self.idle and self.idle[0][1] < deadline:
+            expired.append(self.idle.popleft()[0])
+        self.size -= len(expired)
+        self.counters['expired'] += len(expired)
+        return expired
+
+    def take(self, deadline):
+        """Свободное соединение или None, если можно открыть новое."""
+        expired = []
+        waited = False
+        with self.condition:
+            while True:
+                expired += self.pop_expired()
+                if self.idle:
+                    connection = self.idle.pop()[0]
+                    break
+                if self.size < self.max_size:
+                    self.size += 1
+                    connection = None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.counters['timeouts'] += 1
+                    raise PoolTimeout(
+                        f'Все {self.max_size} соединений пула заняты '
+                        f'дольше {self.timeout} с.'
+                    )
+                if not waited:
+                    waited = True
+                    self.counters['waits'] += 1
+                self.waiting += 1
+                try:
+                    self.condition.wait(remaining)
+                finally:
+                    self.waiting -= 1
+        for expired_connection in expired:
+            close_quietly(expired_connection)
+        return connection, waited
+
+    def acquire(self, connect):
+        """Соединение из пула; connect() открывает новое."""
+        start = time.monotonic()
+        deadline = start + self.timeout
+        waited = False
+        while True:
+            connection, waited_now = self.take(deadline)
+            waited = waited or waited_now
+            if connection is None:
+                break
+            if not self.check or is_usable(connection):
+                self.finish_acquire(start, waited)
+                return connection
+            self.discard(connection, 'health_check_failures')
+        connect_start = time.monotonic()
+        try:
+            connection = connect()
+        except BaseException:
+            self.discard(None)
+            raise
+        self.finish_acquire(start, waited, connect_start)
+        return connection
+
+    def finish_acquire(self, start, waited, connect_start=None):
+        now = time.monotonic()
+        with self.condition:
+            self.counters['requests'] += 1
+            self.timings['acquire'] += now - start
+            if connect_start is None:
+                self.counters['reused'] += 1
+            else:
+                connected = now - connect_start
+                self.counters['created'] += 1
+                self.timings['connect'] += connected
+                self.timings['connect_max'] = max(
+                    self.timings['connect_max'], connected
+                )
+            if waited:
+                wait = (connect_start or now) - start
+                self.timings['wait'] += wait
+                self.timings['wait_max'] = max(self.timings['wait_max'], wait)
+
+    def release(self, connection):
+        """Возвращает соединение в пул.
+
+        Незавершённая транзакция откатывается, сломанное или закрытое
+        соединение закрывается и освобождает место.
+        """
+        if connection.closed or not reset(connection):
+            self.discard(connection)
+            return
+        with self.condition:
+            self.idle.append((connection, time.monotonic()))
+            self.condition.notify()
+
+    def discard(self, connection, counter='discarded'):
+        """Закрывает соединение и освобождает его место в пуле.
+
+        None — место, для которого не удалось открыть соединение.
+        """
+        if connection is not None:
+            close_quietly(connection)
+        with self.condition:
+            self.size -= 1
+            if connection is not None:
+                self.counters[counter] += 1
+            self.condition.notify()
+
+    def get_stats(self):
+        with self.condition:
+            expired = self.pop_expired()
+            stats = {
+                'max_size': self.max_size,
+                'size': self.size,
+                'in_use': self.size - len(self.idle),
+                'idle': len(self.idle),
+                'waiting': self.waiting,
+                **self.counters,
+                **{
+                    f'{name}_ms': round(value * 1000, 2)
+                    for name, value in self.timings.items()
+                },
+            }
+        for connection in expired:
+            close_quietly(connection)
+        stats['acquire_ms_avg'] = average(
+            stats['acquire_ms'], stats['requests']
+        )
+        stats['connect_ms_avg'] = average(
+            stats['connect_ms'], stats['created']
+        )
+        return stats
+
+
+def average(total, count):
+    return round(total / count, 2) if count else 0.0
+
+
+def close_quietly(connection):
+    try:
+        connection.close()
+    except Database.Error:
+        pass
+
+
+def is_usable(connection):
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+    except Database.Error:
+        return False
+    return reset(connection)
+
+
+def reset(connection):
+    status = connection.info.transaction_status
+    if status == extensions.TRANSACTION_STATUS_IDLE:
+        return True
+    if status in (
+        extensions.TRANSACTION_STATUS_INTRANS,
+        extensions.TRANSACTION_STATUS_INERROR,
+    ):
+        try:
+            connection.rollback()
+        except Database.Error:
+            return False
+        return True
+    return False
+
+
+def get_pool(alias, options, check=False):
+    pool = pools.get(alias)
+    if pool is not None and pool.pid == os.getpid():
+        return pool
+    with pools_lock:
+        pool = pools.get(alias)
+        if pool is None or pool.pid != os.getpid():
+            pool = pools[alias] = ConnectionPool(check=check, **options)
+        return pool
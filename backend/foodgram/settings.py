@@ -1,8 +1,14 @@
 import os
+import sys
 from pathlib import Path
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+
+def env_bool(name, default=False):
+    return os.getenv(name, str(default)).lower() in ('1', 'true', 'yes', 'on')
+
+
 SECRET_KEY = os.getenv('SECRET_KEY', '0')
 
 DEBUG = os.getenv('DEBUG', False)
@@ -28,6 +34,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.QueryStatsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -92,17 +99,108 @@ DJOSER = {
     'LOGIN_FIELD': 'email',
 }
 
+SHOPPING_CART_PDF_FONT = os.getenv(
+    'SHOPPING_CART_PDF_FONT', '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+)
+
+# Кеш общий для всех процессов (веб-воркеров, image_worker, команд
+# manage.py): в нём версии и журналы изменений, по которым процессы
+# сбрасывают свои данные. LocMemCache годится только для разработки.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+
+PAGINATION_COUNT_CACHE_TIMEOUT = int(
+    os.getenv('PAGINATION_COUNT_CACHE_TIMEOUT', 30)
+)
+PAGINATION_COUNT_ESTIMATE_THRESHOLD = int(
+    os.getenv('PAGINATION_COUNT_ESTIMATE_THRESHOLD', 100000)
+)
+PAGINATION_COUNT_ESTIMATE_TIMEOUT = int(
+    os.getenv('PAGINATION_COUNT_ESTIMATE_TIMEOUT', 300)
+)
+
+CATALOG_CACHE_TIMEOUT = int(os.getenv('CATALOG_CACHE_TIMEOUT', 300))
+
+INGREDIENT_INDEX_TTL = int(os.getenv('INGREDIENT_INDEX_TTL', 300))
+
+RESPONSE_CACHE_TIMEOUT = int(os.getenv('RESPONSE_CACHE_TIMEOUT', 300))
+
+USER_RECIPE_IDS_TIMEOUT = int(os.getenv('USER_RECIPE_IDS_TIMEOUT', 300))
+
+SEARCH_CONFIG = os.getenv('SEARCH_CONFIG', 'russian')
+
+TESTING = sys.argv[1:2] == ['test']
+
+# Превышение бюджета запросов роняет запрос в тестах (manage.py test);
+# в продакшене запись к этому моменту уже зафиксирована, поэтому там
+# оно по умолчанию лишь пишется в лог.
+QUERY_BUDGET_ENFORCE = env_bool('QUERY_BUDGET_ENFORCE', TESTING)
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'api.queries': {
+            'handlers': ['console'],
+            'level': os.getenv('QUERY_LOG_LEVEL', 'INFO'),
+        },
+    },
+}
+
+# DB_POOL_SIZE > 0 включает пул соединений процесса (foodgram.db),
+# соединение возвращается в пул в конце каждого запроса.
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': 'foodgram.db',
         'NAME': os.getenv('POSTGRES_DB', 'django'),
         'USER': os.getenv('POSTGRES_USER', 'django'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
         'HOST': os.getenv('DB_HOST', ''),
-        'PORT': os.getenv('DB_PORT', 5432)
+        'PORT': os.getenv('DB_PORT', 5432),
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 0)),
+        'CONN_HEALTH_CHECKS': env_bool('DB_CONN_HEALTH_CHECKS'),
+        'OPTIONS': {
+            'pool': {
+                'max_size': int(os.getenv('DB_POOL_SIZE', 0)),
+                'idle_timeout': int(os.getenv('DB_POOL_IDLE_TIMEOUT', 300)),
+                'timeout': int(os.getenv('DB_POOL_TIMEOUT', 30)),
+            },
+        },
     }
 }
 
+# Реплики для чтения: DB_REPLICAS=host[:port],... с теми же базой
+# и пользователем, что у основной.
+DATABASE_REPLICAS = []
+for number, address in enumerate(
+    filter(None, os.getenv('DB_REPLICAS', '').split(',')), 1
+):
+    host, _, port = address.strip().partition(':')
+    DATABASES[f'replica_{number}'] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'PORT': port or DATABASES['default']['PORT'],
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica_{number}')
+
+DATABASE_ROUTERS = ['api.db_routing.ReplicaRouter']
+
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', 10))
+
+REPLICA_RETRY_SECONDS = int(os.getenv('REPLICA_RETRY_SECONDS', 30))
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -1,7 +1,21 @@
 from django.contrib import admin
 
-from .models import (Ingredient, IngredientAmount, Profile, ProfileFavorite,
-                     Recipe, RecipeTag, Tag)
+from .models import (FeedEntry, Ingredient, IngredientAmount, Profile,
+                     ProfileFavorite, Recipe, RecipeTag, ShoppingListItem, Tag)
+
+
+def cart_user_ids(recipe_ids):
+    return list(
+        Profile.objects.filter(
+            shopping_cart__in=recipe_ids
+        ).values_list("id", flat=True).distinct()
+    )
+
+
+def rebuild_shopping_lists(user_ids):
+    """Админка меняет рецепты в обход инкрементального обновления."""
+    if user_ids:
+        ShoppingListItem.objects.rebuild(user_ids)
 
 
 @admin.register(Tag)
@@ -45,6 +59,22 @@ class RecipeAdmin(admin.ModelAdmin):
     )
     list_display_links = ("name",)
 
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        Recipe.objects.refresh_tag_masks([form.instance.pk])
+        if change:
+            rebuild_shopping_lists(cart_user_ids([form.instance.pk]))
+
+    def delete_model(self, request, obj):
+        user_ids = cart_user_ids([obj.pk])
+        super().delete_model(request, obj)
+        rebuild_shopping_lists(user_ids)
+
+    def delete_queryset(self, request, queryset):
+        user_ids = cart_user_ids(queryset)
+        super().delete_queryset(request, queryset)
+        rebuild_shopping_lists(user_ids)
+
     def show_number_favorite(self, obj):
         return obj.is_favorited.count()
 
@@ -53,14 +83,64 @@ class RecipeAdmin(admin.ModelAdmin):
 
 @admin.register(IngredientAmount)
 class IngredientAmountAdmin(admin.ModelAdmin):
-    pass
+
+    def save_model(self, request, obj, form, change):
+        recipe_ids = {obj.recipe_id}
+        if change:
+            recipe_ids.update(
+                IngredientAmount.objects.filter(
+                    pk=obj.pk
+                ).values_list("recipe_id", flat=True)
+            )
+        super().save_model(request, obj, form, change)
+        rebuild_shopping_lists(cart_user_ids(recipe_ids))
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        rebuild_shopping_lists(cart_user_ids([obj.recipe_id]))
+
+    def delete_queryset(self, request, queryset):
+        recipe_ids = set(queryset.values_list("recipe_id", flat=True))
+        super().delete_queryset(request, queryset)
+        rebuild_shopping_lists(cart_user_ids(recipe_ids))
 
 
 @admin.register(RecipeTag)
 class RecipeTagAdmin(admin.ModelAdmin):
-    pass
+
+    def save_model(self, request, obj, form, change):
+        recipe_ids = {obj.recipe_id}
+        if change:
+            recipe_ids.update(
+                RecipeTag.objects.filter(
+                    pk=obj.pk
+                ).values_list("recipe_id", flat=True)
+            )
+        super().save_model(request, obj, form, change)
+        Recipe.objects.refresh_tag_masks(recipe_ids)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        Recipe.objects.refresh_tag_masks([obj.recipe_id])
+
+    def delete_queryset(self, request, queryset):
+        recipe_ids = set(queryset.values_list("recipe_id", flat=True))
+        super().delete_queryset(request, queryset)
+        Recipe.objects.refresh_tag_masks(recipe_ids)
 
 
 @admin.register(ProfileFavorite)
 class ProfileFavorite(admin.ModelAdmin):
     pass
+
+
+@admin.register(ShoppingListItem)
+class ShoppingListItemAdmin(admin.ModelAdmin):
+    list_display = ("user", "ingredient", "amount")
+    list_filter = ("user",)
+
+
+@admin.register(FeedEntry)
+class FeedEntryAdmin(admin.ModelAdmin):
+    list_display = ("user", "recipe", "pub_date")
+    list_filter = ("user",)
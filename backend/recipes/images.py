@@ -0,0 +1,110 @@
+import io
+import logging
+from pathlib import Path
+
+from api.constants import CARD_IMAGE_SIZE, DETAIL_IMAGE_SIZE, IMAGE_QUALITY
+from api.response_cache import recipe_response_cache
+from django.core.files.base import ContentFile
+from django.db.models import F
+from PIL import Image, ImageOps
+
+from .models import Recipe
+
+logger = logging.getLogger(__name__)
+
+VARIANTS = (
+    ("image_card", "card", CARD_IMAGE_SIZE, "JPEG", "jpg"),
+    ("image_detail", "detail", DETAIL_IMAGE_SIZE, "JPEG", "jpg"),
+    ("image_webp", "detail", DETAIL_IMAGE_SIZE, "WEBP", "webp"),
+)
+
+
+def pending_recipes():
+    """Рецепты, чья текущая картинка ещё не нарезана на варианты."""
+    return Recipe.objects.exclude(image="").exclude(
+        image_variants_source=F("image")
+    )
+
+
+def render_variant(image, size, image_format):
+    variant = image.copy()
+    variant.thumbnail(size, Image.LANCZOS)
+    if image_format == "JPEG" and variant.mode not in ("RGB", "L"):
+        variant = variant.convert("RGB")
+    buffer = io.BytesIO()
+    variant.save(buffer, image_format, quality=IMAGE_QUALITY, optimize=True)
+    return ContentFile(buffer.getvalue())
+
+
+def mark_failed(recipe, source):
+    """Помечает картинку обработанной без вариантов.
+
+    Рецепт отдаётся с исходной картинкой и больше не попадает
+    в очередь, пока картинку не заменят.
+    """
+    updated = Recipe.objects.filter(pk=recipe.pk, image=source).update(
+        image_variants_source=source,
+        **{field: "" for field, *_ in VARIANTS},
+    )
+    if updated:
+        recipe_response_cache.invalidate_recipe(recipe.pk)
+    return bool(updated)
+
+
+def render_variants(recipe, source):
+    """Сохраняет файлы вариантов, возвращает {поле: имя файла}.
+
+    При ошибке уже сохранённые файлы удаляются.
+    """
+    with recipe.image.open("rb") as file:
+        image = ImageOps.exif_transpose(Image.open(file))
+        image.load()
+
+    stem = Path(source).stem
+    names = {}
+    try:
+        for field, suffix, size, image_format, extension in VARIANTS:
+            file_field = getattr(recipe, field)
+            names[field] = file_field.storage.save(
+                file_field.field.generate_filename(
+                    recipe, f"{stem}_{suffix}.{extension}"
+                ),
+                render_variant(image, size, image_format),
+            )
+    except BaseException:
+        for name in names.values():
+            recipe.image.storage.delete(name)
+        raise
+    return names
+
+
+def process_recipe_image(recipe):
+    """Сохраняет варианты картинки рецепта.
+
+    Поля обновляются, только если картинка не сменилась за время
+    обработки; иначе созданные файлы удаляются. Картинку, которую
+    не удалось открыть, нарезать или сохранить, рецепт получает
+    без вариантов. Возвращает True, если поля рецепта обновлены.
+    """
+    source = recipe.image.name
+    previous = [
+        getattr(recipe, field).name for field, *_ in VARIANTS
+        if getattr(recipe, field)
+    ]
+    try:
+        names = render_variants(recipe, source)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        logger.exception(
+            "Не удалось нарезать картинку рецепта %s", recipe.pk
+        )
+        return mark_failed(recipe, source)
+
+    updated = Recipe.objects.filter(pk=recipe.pk, image=source).update(
+        image_variants_source=source, **names
+    )
+    if updated:
+        recipe_response_cache.invalidate_recipe(recipe.pk)
+    storage = recipe.image.storage
+    for name in (previous if updated else names.values()):
+        storage.delete(name)
+    return bool(updated)
@@ -0,0 +1,177 @@
+import csv
+import json
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from recipes.models import Ingredient
+from recipes.signals import ingredients_loaded
+
+READ_CHUNK_SIZE = 64 * 1024
+
+
+def read_csv(file):
+    for row in csv.reader(file):
+        if len(row) >= 2:
+            yield row[0], row[1]
+
+
+def read_json(file):
+    """Потоково читает массив объектов, не загружая файл целиком."""
+    decoder = json.JSONDecoder()
+    buffer = ""
+    position = 0
+    started = False
+    while True:
+        chunk = file.read(READ_CHUNK_SIZE)
+        buffer = buffer[position:] + chunk
+        position = 0
+        while True:
+            while position < len(buffer) and buffer[position] in " \t\r\n,":
+                position += 1
+            if not started and position < len(buffer):
+                if buffer[position] != "[":
+                    raise CommandError("Ожидается JSON-массив ингредиентов.")
+                started = True
+                position += 1
+                continue
+            if position < len(buffer) and buffer[position] == "]":
+                return
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                break
+            yield item["name"], item["measurement_unit"]
+        if not chunk:
+            if buffer[position:].strip():
+                raise CommandError("Некорректный JSON-файл ингредиентов.")
+            return
+
+
+READERS = {"csv": read_csv, "json": read_json}
+
+
+class CSVStream:
+    """Файлоподобный объект для COPY FROM STDIN.
+
+    Строки превращаются в CSV по мере чтения, поэтому файл целиком
+    в памяти не собирается. count — сколько строк уже прочитано.
+    """
+
+    def __init__(self, rows):
+        self.rows = iter(rows)
+        self.writer = csv.writer(self)
+        self.buffer = ""
+        self.count = 0
+
+    def write(self, line):
+        self.buffer += line
+
+    def read(self, size=-1):
+        for row in self.rows:
+            self.writer.writerow(row)
+            self.count += 1
+            if 0 <= size <= len(self.buffer):
+                break
+        if size < 0:
+            size = len(self.buffer)
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+
+class Command(BaseCommand):
+    help = (
+        "Загружает справочник ингредиентов из CSV или JSON. "
+        "Дубликаты по (name, measurement_unit) пропускаются."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "path", help="путь к ingredients.csv или ingredients.json",
+        )
+        parser.add_argument(
+            "--format", choices=READERS, dest="file_format",
+            help="формат файла; по умолчанию определяется по расширению",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=5000,
+            help="размер пакета вставки",
+        )
+
+    def handle(self, *args, path, file_format=None, batch_size=5000,
+               **options):
+        path = Path(path)
+        file_format = file_format or path.suffix.lstrip(".").lower()
+        if file_format not in READERS:
+            raise CommandError(f"Неизвестный формат файла: {path}")
+        if not path.exists():
+            raise CommandError(f"Файл не найден: {path}")
+
+        start = time.perf_counter()
+        with path.open(encoding="utf-8") as file, transaction.atomic():
+            rows = READERS[file_format](file)
+            if connection.vendor == "postgresql":
+                read, created = self.copy_postgresql(rows)
+            else:
+                read, created = self.bulk_insert(rows, batch_size)
+        elapsed = time.perf_counter() - start
+
+        ingredients_loaded.send(sender=Ingredient)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Прочитано {read}, добавлено {created} ингредиентов "
+            f"за {elapsed:.2f} с ({read / elapsed:.0f} строк/с)."
+        ))
+
+    @staticmethod
+    def normalize(rows):
+        for name, measurement_unit in rows:
+            name, measurement_unit = name.strip(), measurement_unit.strip()
+            if name and measurement_unit:
+                yield name, measurement_unit
+
+    def bulk_insert(self, rows, batch_size):
+        seen = set(Ingredient.objects.values_list("name", "measurement_unit"))
+        read = created = 0
+        batch = []
+        for key in self.normalize(rows):
+            read += 1
+            if key in seen:
+                continue
+            seen.add(key)
+            batch.append(Ingredient(name=key[0], measurement_unit=key[1]))
+            if len(batch) >= batch_size:
+                Ingredient.objects.bulk_create(batch)
+                created += len(batch)
+                batch = []
+        Ingredient.objects.bulk_create(batch)
+        return read, created + len(batch)
+
+    def copy_postgresql(self, rows):
+        """COPY во временную таблицу и одна вставка недостающих строк."""
+        table = Ingredient._meta.db_table
+        stream = CSVStream(self.normalize(rows))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "CREATE TEMPORARY TABLE ingredient_import "
+                "(name text, measurement_unit text)"
+            )
+            cursor.copy_expert(
+                "COPY ingredient_import (name, measurement_unit) "
+                "FROM STDIN WITH (FORMAT csv)",
+                stream,
+            )
+            cursor.execute(
+                f"INSERT INTO {table} (name, measurement_unit) "
+                "SELECT DISTINCT i.name, i.measurement_unit "
+                "FROM ingredient_import i "
+                f"WHERE NOT EXISTS (SELECT 1 FROM {table} t "
+                "WHERE t.name = i.name "
+                "AND t.measurement_unit = i.measurement_unit)"
+            )
+            created = cursor.rowcount
+            # Не ON COMMIT DROP: команду могут вызвать внутри внешней
+            # транзакции, и повторная загрузка не должна падать.
+            cursor.execute("DROP TABLE ingredient_import")
+        return stream.count, created
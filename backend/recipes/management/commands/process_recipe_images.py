@@ -0,0 +1,68 @@
+import logging
+import time
+
+from api.constants import IMAGE_WORKER_BATCH_SIZE, IMAGE_WORKER_INTERVAL
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from recipes.images import mark_failed, pending_recipes, process_recipe_image
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        "Фоновый обработчик картинок рецептов: нарезает загруженные "
+        "картинки на варианты для карточки, страницы рецепта и WebP."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once", action="store_true",
+            help="обработать очередь один раз и завершиться",
+        )
+        parser.add_argument(
+            "--interval", type=float, default=IMAGE_WORKER_INTERVAL,
+            help="пауза между проверками очереди, секунд",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=IMAGE_WORKER_BATCH_SIZE,
+            help="сколько рецептов брать за один проход",
+        )
+
+    def process_batch(self, batch_size):
+        with transaction.atomic():
+            recipes = list(
+                pending_recipes().select_for_update(
+                    skip_locked=True
+                ).order_by("pk")[:batch_size]
+            )
+            for recipe in recipes:
+                self.process_recipe(recipe)
+        return len(recipes)
+
+    @staticmethod
+    def process_recipe(recipe):
+        """Обрабатывает рецепт в точке сохранения.
+
+        Непредвиденная ошибка не роняет обработчик и не возвращает
+        рецепт в очередь: иначе он падал бы на нём снова и снова.
+        """
+        try:
+            with transaction.atomic():
+                process_recipe_image(recipe)
+        except Exception:
+            logger.exception(
+                "Ошибка обработки картинки рецепта %s", recipe.pk
+            )
+            mark_failed(recipe, recipe.image.name)
+
+    def handle(self, *args, once=False, interval=IMAGE_WORKER_INTERVAL,
+               batch_size=IMAGE_WORKER_BATCH_SIZE, **options):
+        while True:
+            processed = self.process_batch(batch_size)
+            if processed:
+                self.stdout.write(f"Обработано картинок: {processed}")
+            if once and processed < batch_size:
+                return
+            if not processed:
+                time.sleep(interval)
@@ -0,0 +1,64 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from recipes.models import ShoppingListItem
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересобирает агрегированные списки покупок по корзинам "
+        "пользователей или, с --verify, только сверяет их."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--user", type=int, action="append", dest="user_ids",
+            help="id пользователя (можно указать несколько раз)",
+        )
+        parser.add_argument(
+            "--verify", action="store_true",
+            help="только проверить расхождения, ничего не меняя",
+        )
+
+    def handle(self, *args, user_ids=None, verify=False, **options):
+        if verify:
+            self.verify(user_ids)
+            return
+
+        with transaction.atomic():
+            count = ShoppingListItem.objects.rebuild(user_ids)
+        self.stdout.write(
+            self.style.SUCCESS(f"Списки покупок пересобраны: {count} строк.")
+        )
+
+    def verify(self, user_ids):
+        expected = ShoppingListItem.objects.expected(user_ids)
+        items = ShoppingListItem.objects.all()
+        if user_ids is not None:
+            items = items.filter(user_id__in=user_ids)
+        actual = {
+            (user_id, ingredient_id): amount
+            for user_id, ingredient_id, amount in items.values_list(
+                "user_id", "ingredient_id", "amount"
+            )
+        }
+
+        mismatches = [
+            (key, expected.get(key), actual.get(key))
+            for key in expected.keys() | actual.keys()
+            if expected.get(key) != actual.get(key)
+        ]
+        for (user_id, ingredient_id), want, got in sorted(
+            mismatches, key=lambda mismatch: mismatch[0]
+        ):
+            self.stderr.write(
+                f"user={user_id} ingredient={ingredient_id} "
+                f"ожидается={want} сохранено={got}"
+            )
+        if mismatches:
+            raise CommandError(
+                f"Найдено расхождений: {len(mismatches)}. "
+                "Запустите команду без --verify для пересборки."
+            )
+        self.stdout.write(
+            self.style.SUCCESS(f"Расхождений нет: {len(actual)} строк.")
+        )
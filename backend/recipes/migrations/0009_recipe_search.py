@@ -0,0 +1,64 @@
+# Generated by Django 3.2.16 on 2026-10-18 06:22
+
+from django.conf import settings
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+def fold(value):
+    return value.casefold().replace('ё', 'е')
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE INDEX recipe_search_vector_idx ON recipes_recipe '
+            'USING gin (search_vector)'
+        )
+        schema_editor.execute(
+            'UPDATE recipes_recipe SET search_vector = '
+            "setweight(to_tsvector(%s::regconfig, "
+            "replace(lower(name), 'ё', 'е')), 'A') || "
+            "setweight(to_tsvector(%s::regconfig, "
+            "replace(lower(text), 'ё', 'е')), 'B')",
+            (settings.SEARCH_CONFIG, settings.SEARCH_CONFIG),
+        )
+    elif schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(
+            'CREATE VIRTUAL TABLE recipes_recipe_fts USING fts5('
+            "name, text, tokenize = 'unicode61 remove_diacritics 2')"
+        )
+        Recipe = apps.get_model('recipes', 'Recipe')
+        schema_editor.connection.cursor().executemany(
+            'INSERT INTO recipes_recipe_fts (rowid, name, text) '
+            'VALUES (%s, %s, %s)',
+            [
+                (recipe_id, fold(name), fold(text))
+                for recipe_id, name, text in Recipe.objects.values_list(
+                    'id', 'name', 'text'
+                )
+            ],
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX recipe_search_vector_idx')
+    elif schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE recipes_recipe_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_feedentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='Поисковый вектор'),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
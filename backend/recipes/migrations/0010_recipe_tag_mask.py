@@ -0,0 +1,41 @@
+# Generated by Django 3.2.16 on 2026-10-18 06:25
+
+from collections import defaultdict
+
+from django.db import migrations, models
+
+MAX_TAG_MASK_ID = 62
+
+
+def fill_tag_masks(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    RecipeTag = apps.get_model('recipes', 'RecipeTag')
+    masks = defaultdict(int)
+    for recipe_id, tag_id in RecipeTag.objects.filter(
+        tag_id__lte=MAX_TAG_MASK_ID
+    ).values_list('recipe_id', 'tag_id').iterator():
+        masks[recipe_id] |= 1 << tag_id
+    Recipe.objects.bulk_update(
+        [
+            Recipe(id=recipe_id, tag_mask=mask)
+            for recipe_id, mask in masks.items()
+        ],
+        ('tag_mask',),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_recipe_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='tag_mask',
+            field=models.BigIntegerField(default=0, editable=False, verbose_name='Маска тегов'),
+        ),
+        migrations.RunPython(fill_tag_masks, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 3.2.16 on 2026-10-18 06:31
+
+from django.db import migrations, models
+from django.db.models import Min
+
+
+def remove_duplicate_favorites(apps, schema_editor):
+    ProfileFavorite = apps.get_model('recipes', 'ProfileFavorite')
+    keep = ProfileFavorite.objects.values('user', 'recipe').annotate(
+        keep_id=Min('id')
+    ).values('keep_id')
+    ProfileFavorite.objects.exclude(id__in=keep).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_recipe_tag_mask'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            remove_duplicate_favorites, migrations.RunPython.noop
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-pub_date', '-id'], name='recipe_pub_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['author', '-pub_date'], name='recipe_author_pub_date_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='profilefavorite',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique_profile_favorite'),
+        ),
+        migrations.RunSQL(
+            'CREATE INDEX profile_following_to_from_idx '
+            'ON recipes_profile_following (to_profile_id, from_profile_id)',
+            'DROP INDEX profile_following_to_from_idx',
+        ),
+        migrations.RunSQL(
+            'CREATE INDEX profile_cart_recipe_profile_idx '
+            'ON recipes_profile_shopping_cart (recipe_id, profile_id)',
+            'DROP INDEX profile_cart_recipe_profile_idx',
+        ),
+    ]
@@ -1,8 +1,13 @@
-from api.constants import MAX_NAME_LENGTH, MIN_AMOUNT, MIN_COOKING_TIME
+from collections import defaultdict
+
+from api.constants import (FEED_BACKFILL_LIMIT, MAX_NAME_LENGTH,
+                           MAX_TAG_MASK_ID, MIN_AMOUNT, MIN_COOKING_TIME)
 from colorfield.fields import ColorField
 from django.contrib.auth.models import AbstractUser
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator
 from django.db import models
+from django.db.models import Case, F, Sum, Value, When
 
 
 class Profile(AbstractUser):
@@ -40,6 +45,32 @@ class Profile(AbstractUser):
         verbose_name_plural = "Пользователи"
 
 
+def tag_mask(tag_ids):
+    """Битовая маска тегов: бит N означает тег с id N.
+
+    Теги с id больше MAX_TAG_MASK_ID в маску не попадают.
+    """
+    mask = 0
+    for tag_id in tag_ids:
+        if tag_id <= MAX_TAG_MASK_ID:
+            mask |= 1 << tag_id
+    return mask
+
+
+class RecipeManager(models.Manager):
+
+    def refresh_tag_masks(self, recipe_ids):
+        tag_ids = defaultdict(list)
+        for recipe_id, tag_id in RecipeTag.objects.filter(
+            recipe_id__in=recipe_ids
+        ).values_list("recipe_id", "tag_id"):
+            tag_ids[recipe_id].append(tag_id)
+        for recipe_id in recipe_ids:
+            self.filter(pk=recipe_id).update(
+                tag_mask=tag_mask(tag_ids[recipe_id])
+            )
+
+
 class Recipe(models.Model):
     author = models.ForeignKey(
         Profile,
@@ -62,6 +93,31 @@ class Recipe(models.Model):
         verbose_name="Картинка"
     )
 
+    image_card = models.ImageField(
+        upload_to="recipes/variants/",
+        blank=True,
+        verbose_name="Картинка для карточки",
+    )
+
+    image_detail = models.ImageField(
+        upload_to="recipes/variants/",
+        blank=True,
+        verbose_name="Картинка для страницы рецепта",
+    )
+
+    image_webp = models.ImageField(
+        upload_to="recipes/variants/",
+        blank=True,
+        verbose_name="Картинка в WebP",
+    )
+
+    image_variants_source = models.CharField(
+        max_length=100,
+        blank=True,
+        editable=False,
+        verbose_name="Картинка, из которой сделаны варианты",
+    )
+
     text = models.TextField(
         help_text="Добавьте описание рецепта", verbose_name="Описание рецепта"
     )
@@ -85,6 +141,20 @@ class Recipe(models.Model):
         validators=[MinValueValidator(MIN_COOKING_TIME)],
     )
 
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False,
+        verbose_name="Поисковый вектор",
+    )
+
+    tag_mask = models.BigIntegerField(
+        default=0,
+        editable=False,
+        verbose_name="Маска тегов",
+    )
+
+    objects = RecipeManager()
+
     def __str__(self):
         return f"{self.name} от {self.author}"
 
@@ -92,6 +162,15 @@ class Recipe(models.Model):
         verbose_name = "Рецепт"
         verbose_name_plural = "Рецепты"
         ordering = ("-pub_date",)
+        indexes = (
+            models.Index(
+                fields=("-pub_date", "-id"), name="recipe_pub_date_id_idx"
+            ),
+            models.Index(
+                fields=("author", "-pub_date"),
+                name="recipe_author_pub_date_idx",
+            ),
+        )
 
 
 class Ingredient(models.Model):
@@ -142,6 +221,11 @@ class ProfileFavorite(models.Model):
         return f"{self.user}-{self.recipe}"
 
     class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=("user", "recipe"), name="unique_profile_favorite"
+            ),
+        )
         verbose_name = "Профиль — избранный рецепт"
         verbose_name_plural = "Профили — избранные рецепты"
 
@@ -185,3 +269,205 @@ class RecipeTag(models.Model):
         unique_together = ("recipe", "tag")
         verbose_name = "Рецепт — тег"
         verbose_name_plural = "Рецепты — теги"
+
+
+class ShoppingListManager(models.Manager):
+    """Инкрементальное обновление агрегированных списков покупок."""
+
+    @staticmethod
+    def recipe_amounts(recipe_id):
+        return dict(
+            IngredientAmount.objects.filter(
+                recipe_id=recipe_id
+            ).values_list("ingredient_id", "amount")
+        )
+
+    def apply_delta(self, user_ids, delta):
+        """Прибавляет к спискам пользователей delta {ingredient_id: amount}.
+
+        Отрицательные значения вычитаются, строки с нулевым
+        количеством удаляются.
+        """
+        user_ids = list(user_ids)
+        delta = {
+            ingredient_id: amount
+            for ingredient_id, amount in delta.items() if amount
+        }
+        if not (user_ids and delta):
+            return
+
+        self.bulk_create(
+            [
+                self.model(user_id=user_id, ingredient_id=ingredient_id)
+                for user_id in user_ids
+                for ingredient_id, amount in delta.items() if amount > 0
+            ],
+            ignore_conflicts=True,
+        )
+        items = self.filter(user_id__in=user_ids)
+        items.filter(ingredient_id__in=delta).update(
+            amount=F("amount") + Case(
+                *(
+                    When(ingredient_id=ingredient_id, then=Value(amount))
+                    for ingredient_id, amount in delta.items()
+                ),
+                default=Value(0),
+            )
+        )
+        items.filter(amount__lte=0).delete()
+
+    def add_recipe(self, user_ids, recipe_id):
+        self.apply_delta(user_ids, self.recipe_amounts(recipe_id))
+
+    def remove_recipe(self, user_ids, recipe_id):
+        amounts = self.recipe_amounts(recipe_id)
+        self.apply_delta(
+            user_ids,
+            {
+                ingredient_id: -amount
+                for ingredient_id, amount in amounts.items()
+            }
+        )
+
+    def expected(self, user_ids=None):
+        """Списки, посчитанные заново по корзинам: {(user, ingredient): n}."""
+        amounts = IngredientAmount.objects.all()
+        if user_ids is not None:
+            amounts = amounts.filter(
+                recipe__is_in_shopping_cart__in=user_ids
+            )
+        rows = amounts.values_list(
+            "recipe__is_in_shopping_cart", "ingredient_id"
+        ).annotate(total=Sum("amount")).order_by()
+        return {
+            (user_id, ingredient_id): total
+            for user_id, ingredient_id, total in rows
+            if user_id is not None and total
+        }
+
+    def rebuild(self, user_ids=None):
+        expected = self.expected(user_ids)
+        items = self.all()
+        if user_ids is not None:
+            items = items.filter(user_id__in=user_ids)
+        items.delete()
+        self.bulk_create(
+            (
+                self.model(
+                    user_id=user_id, ingredient_id=ingredient_id, amount=total
+                )
+                for (user_id, ingredient_id), total in expected.items()
+            ),
+            batch_size=1000,
+        )
+        return len(expected)
+
+
+class ShoppingListItem(models.Model):
+    """Сумма ингредиента по всем рецептам в корзине пользователя."""
+
+    user = models.ForeignKey(
+        Profile,
+        on_delete=models.CASCADE,
+        related_name="shopping_list",
+        verbose_name="Пользователь",
+    )
+
+    ingredient = models.ForeignKey(
+        Ingredient, on_delete=models.CASCADE, verbose_name="Ингредиент"
+    )
+
+    amount = models.IntegerField(default=0, verbose_name="Количество")
+
+    objects = ShoppingListManager()
+
+    def __str__(self):
+        return f"{self.user}-{self.ingredient}-{self.amount}"
+
+    class Meta:
+        unique_together = ("user", "ingredient")
+        verbose_name = "Список покупок — ингредиент"
+        verbose_name_plural = "Списки покупок — ингредиенты"
+
+
+class FeedManager(models.Manager):
+    """Раскладка рецептов по лентам подписчиков при записи."""
+
+    def fan_out(self, recipe):
+        follower_ids = recipe.author.followers.values_list("id", flat=True)
+        self.bulk_create(
+            (
+                self.model(
+                    user_id=user_id, recipe=recipe, pub_date=recipe.pub_date
+                )
+                for user_id in follower_ids.iterator()
+            ),
+            batch_size=1000,
+            ignore_conflicts=True,
+        )
+
+    def backfill(self, user_id, author_id, limit=FEED_BACKFILL_LIMIT):
+        recipes = Recipe.objects.filter(author_id=author_id).order_by(
+            "-pub_date", "-id"
+        ).values_list("id", "pub_date")[:limit]
+        self.bulk_create(
+            (
+                self.model(
+                    user_id=user_id, recipe_id=recipe_id, pub_date=pub_date
+                )
+                for recipe_id, pub_date in recipes
+            ),
+            ignore_conflicts=True,
+        )
+
+    def trim(self, user_id, author_id):
+        self.filter(user_id=user_id, recipe__author_id=author_id).delete()
+
+
+class FeedEntry(models.Model):
+    """Рецепт автора в ленте подписчика."""
+
+    user = models.ForeignKey(
+        Profile,
+        on_delete=models.CASCADE,
+        related_name="feed",
+        verbose_name="Подписчик",
+    )
+
+    recipe = models.ForeignKey(
+        Recipe, on_delete=models.CASCADE, verbose_name="Рецепт"
+    )
+
+    pub_date = models.DateTimeField("Дата публикации рецепта")
+
+    objects = FeedManager()
+
+    def __str__(self):
+        return f"{self.user}-{self.recipe}"
+
+    class Meta:
+        unique_together = ("user", "recipe")
+        indexes = (
+            models.Index(
+                fields=("user", "-pub_date", "-id"),
+                name="feed_user_pub_date_idx",
+            ),
+        )
+        verbose_name = "Лента — рецепт"
+        verbose_name_plural = "Ленты — рецепты"
+
+
+class RecipeChange(models.Model):
+    """Журнал изменённых рецептов для индексов в памяти процессов.
+
+    Номер записи задаёт порядок изменений, recipe_id None — изменились
+    все рецепты.
+    """
+
+    recipe_id = models.BigIntegerField("Рецепт", null=True)
+
+    created = models.DateTimeField("Время изменения", auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Изменение рецепта"
+        verbose_name_plural = "Изменения рецептов"
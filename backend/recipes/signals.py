@@ -0,0 +1,5 @@
+from django.dispatch import Signal
+
+# Массовая загрузка ингредиентов (load_ingredients) обходит post_save,
+# поэтому о ней сообщает отдельный сигнал, отправляемый после фиксации.
+ingredients_loaded = Signal()
@@ -0,0 +1,76 @@
+import io
+import tempfile
+from unittest.mock import patch
+
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from PIL import Image
+
+from .images import pending_recipes
+from .models import Profile, Recipe
+
+
+def png(size=(800, 600)):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, "red").save(buffer, "PNG")
+    return ContentFile(buffer.getvalue(), name="image.png")
+
+
+class ProcessRecipeImagesTest(TestCase):
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings = override_settings(MEDIA_ROOT=media.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        author = Profile.objects.create_user(
+            username="author", email="author@example.com", password="pw"
+        )
+        self.recipe = Recipe.objects.create(
+            author=author, name="рецепт", text="текст", cooking_time=5,
+            image=png(),
+        )
+
+    def process(self):
+        with self.assertLogs("recipes", "ERROR") as logs:
+            call_command(
+                "process_recipe_images", "--once", stdout=io.StringIO()
+            )
+        self.recipe.refresh_from_db()
+        self.assertFalse(pending_recipes().exists())
+        self.assertEqual(
+            self.recipe.image_variants_source, self.recipe.image.name
+        )
+        self.assertFalse(self.recipe.image_card)
+        return logs
+
+    def test_variants(self):
+        call_command("process_recipe_images", "--once", stdout=io.StringIO())
+        self.recipe.refresh_from_db()
+        self.assertFalse(pending_recipes().exists())
+        self.assertTrue(self.recipe.image_card)
+        self.assertTrue(self.recipe.image_webp)
+
+    def test_decompression_bomb(self):
+        with patch(
+            "recipes.images.Image.open",
+            side_effect=Image.DecompressionBombError("bomb"),
+        ):
+            self.process()
+
+    def test_storage_error(self):
+        with patch(
+            "django.core.files.storage.FileSystemStorage.save",
+            side_effect=OSError("disk full"),
+        ):
+            self.process()
+
+    def test_unexpected_error(self):
+        with patch(
+            "recipes.images.render_variant", side_effect=RuntimeError("boom")
+        ):
+            logs = self.process()
+        self.assertIn("Ошибка обработки картинки", logs.output[0])